@@ -1,28 +1,131 @@
-from flask import Blueprint, render_template, session, redirect, url_for, flash, request
+from flask import Blueprint, render_template, session, redirect, url_for, flash, request, current_app, jsonify
 from app import db
-from app.models import User, Feedback, CandidateCV, JobRequirement, UserSkills, Shortlist, SavedJob, Application, Message, Notification
+from app.models import User, Feedback, CandidateCV, JobRequirement, Shortlist, SavedJob, Application, DeletionJob
+from app.utils.vector_indexes import unindex_documents
+from app.utils.counters import adjust_grouped
+from app.utils.rollups import activity_totals
+from app.utils.deletion import enqueue_user_deletion, wake_worker, remove_upload_files, progress
+from sqlalchemy import or_, func
+from sqlalchemy.orm import contains_eager
+from ai_logic.tracing import get_tracer
 
 admin_bp = Blueprint('admin', __name__, template_folder='templates')
 
+# Window of the dashboard's activity numbers
+ACTIVITY_DAYS = 7
+
+# Deletion jobs listed on the dashboard
+RECENT_DELETIONS = 10
+
 @admin_bp.route('/admin', methods=['GET'])
 def admin_dashboard():
     if 'role' not in session or session['role'] != 'admin':
         flash("You must be an admin to access this page.", "error")
         return redirect(url_for('auth.login'))  
-    users = User.query.all()
-    jobs = JobRequirement.query.all()
-    cvs = CandidateCV.query.all()
-    return render_template('admin/dashboard.html', users=users, jobs=jobs, cvs=cvs)
+    users = _table('users', User, User.query,
+                   search=[User.username, User.company_name, User.role],
+                   sort={'id': User.id, 'username': User.username, 'role': User.role, 'created_at': User.created_at})
+    jobs = _table('jobs', JobRequirement,
+                  JobRequirement.query.outerjoin(User).options(contains_eager(JobRequirement.user)),
+                  search=[JobRequirement.filename, JobRequirement.domain, User.username],
+                  sort={'id': JobRequirement.id, 'filename': JobRequirement.filename, 'domain': JobRequirement.domain,
+                        'username': User.username, 'upload_date': JobRequirement.upload_date})
+    cvs = _table('cvs', CandidateCV,
+                 CandidateCV.query.outerjoin(User).options(contains_eager(CandidateCV.user)),
+                 search=[CandidateCV.filename, CandidateCV.domain, User.username],
+                 sort={'id': CandidateCV.id, 'filename': CandidateCV.filename, 'domain': CandidateCV.domain,
+                       'username': User.username, 'upload_date': CandidateCV.upload_date})
+    deletions = DeletionJob.query.order_by(DeletionJob.id.desc()).limit(RECENT_DELETIONS).all()
+    return render_template('admin/dashboard.html', users=users, jobs=jobs, cvs=cvs, deletions=deletions,
+                           stats=_dashboard_stats(), table_url=_table_url)
+
+def _table(prefix, model, query, search, sort, default_sort='id'):
+    """
+    One page of an admin table, filtered and ordered by the request's
+    <prefix>_q, <prefix>_sort ('-' prefix for descending) and
+    <prefix>_page arguments. Sort keys are limited to the given columns.
+    """
+    q = request.args.get(f'{prefix}_q', '').strip()
+    sort_key = request.args.get(f'{prefix}_sort', default_sort)
+    if sort_key.lstrip('-') not in sort:
+        sort_key = default_sort
+    column = sort[sort_key.lstrip('-')]
+    if q:
+        query = query.filter(or_(*(c.contains(q, autoescape=True) for c in search)))
+    # id breaks ties so rows do not move between pages
+    if sort_key.startswith('-'):
+        query = query.order_by(column.desc(), model.id.desc())
+    else:
+        query = query.order_by(column.asc(), model.id.asc())
+    per_page = current_app.config['ADMIN_PAGE_SIZE']
+    page = query.paginate(page=request.args.get(f'{prefix}_page', 1, type=int), per_page=per_page, error_out=False)
+    if page.page > 1 and not page.items and page.pages:
+        # Past the end, e.g. after deleting the last row of the last page
+        page = query.paginate(page=page.pages, per_page=per_page, error_out=False)
+    return {'prefix': prefix, 'q': q, 'sort': sort_key, 'page': page}
+
+def _table_url(changes):
+    """
+    The current page's URL with some query arguments changed; empty
+    values are dropped.
+    """
+    args = request.args.to_dict()
+    args.update(changes)
+    return url_for(request.endpoint, **{k: v for k, v in args.items() if v not in ('', None)})
+
+def _dashboard_stats():
+    """
+    Headline numbers, all from GROUP BY queries and the activity rollups.
+    """
+    users_by_role = dict(db.session.query(User.role, func.count()).filter(User.locked_at.is_(None)).group_by(User.role).all())
+    count = func.count()
+    cvs_by_domain = db.session.query(CandidateCV.domain, count).group_by(CandidateCV.domain).order_by(count.desc()).all()
+    jobs_by_domain = db.session.query(JobRequirement.domain, count).group_by(JobRequirement.domain).order_by(count.desc()).all()
+    applications = func.count(Application.id)
+    top_jobs = db.session.query(JobRequirement.id, JobRequirement.filename, applications).join(
+        Application, Application.job_id == JobRequirement.id
+    ).group_by(JobRequirement.id, JobRequirement.filename).order_by(applications.desc()).limit(10).all()
+    return {
+        'users_by_role': users_by_role,
+        'total_users': sum(users_by_role.values()),
+        'cvs_by_domain': cvs_by_domain,
+        'total_cvs': sum(n for _, n in cvs_by_domain),
+        'jobs_by_domain': jobs_by_domain,
+        'total_jobs': sum(n for _, n in jobs_by_domain),
+        'top_jobs': top_jobs,
+        'activity_days': ACTIVITY_DAYS,
+        'activity': activity_totals(ACTIVITY_DAYS),
+    }
+
+MATCH_TRACES = ('match_candidates', 'match_jobs')
+
+@admin_bp.route('/admin/traces', methods=['GET'])
+def view_traces():
+    if 'role' not in session or session['role'] != 'admin':
+        flash("You must be an admin to access this page.", "error")
+        return redirect(url_for('auth.login'))  
+    threshold = request.args.get('slow_ms', current_app.config['TRACE_SLOW_MS'], type=float)
+    tracer = get_tracer()
+    return render_template(
+        'admin/traces.html',
+        stats=tracer.stage_percentiles(MATCH_TRACES),
+        slow=tracer.slowest(MATCH_TRACES, threshold_ms=threshold),
+        threshold=threshold,
+        total=len(tracer.traces(MATCH_TRACES))
+    )
 
 @admin_bp.route('/admin/feedback', methods=['GET'])
 def view_feedback():
     if 'role' not in session or session['role'] != 'admin':
         flash("You must be an admin to access this page.", "error")
         return redirect(url_for('auth.login'))  
-    feedback_list = Feedback.query.join(User).with_entities(
+    feedback = _table('feedback', Feedback, Feedback.query.join(User).with_entities(
         Feedback.id, Feedback.message, Feedback.submitted_at, User.username
-    ).order_by(Feedback.submitted_at.desc()).all()
-    return render_template('admin/feedback.html', feedback_list=feedback_list)
+    ), search=[Feedback.message, User.username],
+        sort={'id': Feedback.id, 'submitted_at': Feedback.submitted_at, 'username': User.username},
+        default_sort='-submitted_at')
+    return render_template('admin/feedback.html', feedback=feedback, feedback_list=feedback['page'].items,
+                           table_url=_table_url)
 
 @admin_bp.route('/admin/feedback/delete/<int:feedback_id>', methods=['POST'])
 def delete_feedback(feedback_id):
@@ -54,39 +157,24 @@ def delete_user(user_id):
         flash("The primary admin account cannot be deleted for system security.", "error")
         return redirect(url_for('admin.admin_dashboard'))
     
-    # Delete all associated data to maintain referential integrity
-    try:
-        # Delete user skills
-        UserSkills.query.filter_by(user_id=user_id).delete()
-        
-        # Delete candidate-related data
-        CandidateCV.query.filter_by(user_id=user_id).delete()
-        SavedJob.query.filter_by(candidate_id=user_id).delete()
-        Application.query.filter_by(candidate_id=user_id).delete()
-        
-        # Delete jobgiver-related data  
-        JobRequirement.query.filter_by(user_id=user_id).delete()
-        Shortlist.query.filter_by(jobgiver_id=user_id).delete()
-        
-        # Delete messages and notifications
-        Message.query.filter_by(sender_id=user_id).delete()
-        Message.query.filter_by(receiver_id=user_id).delete()
-        Notification.query.filter_by(user_id=user_id).delete()
-        
-        # Delete feedback
-        Feedback.query.filter_by(user_id=user_id).delete()
-        
-        # Delete the user
-        db.session.delete(user)
-        db.session.commit()
-        flash(f"User '{user.username}' deleted successfully!", "success")
-        
-    except Exception as e:
-        db.session.rollback()
-        flash(f"Error deleting user: {str(e)}", "error")
+    # Everything the user owns goes in bounded batches in the background;
+    # the account is locked right away
+    enqueue_user_deletion(user, requested_by=current_user_id)
+    db.session.commit()
+    wake_worker()
+    flash(f"User '{user.username}' is being deleted. Progress is shown under Deletion Jobs.", "success")
     
     return redirect(url_for('admin.admin_dashboard'))
 
+@admin_bp.route('/admin/deletions/<int:job_id>', methods=['GET'])
+def deletion_progress(job_id):
+    if session.get('role') != 'admin':
+        return jsonify({"error": "Unauthorized"}), 403
+    job = db.session.get(DeletionJob, job_id)
+    if job is None:
+        return jsonify({"error": "Not found"}), 404
+    return jsonify(progress(job))
+
 @admin_bp.route('/admin/cv/delete/<int:cv_id>', methods=['POST'])
 def delete_cv(cv_id):
     if 'role' not in session or session['role'] != 'admin':
@@ -96,10 +184,14 @@ def delete_cv(cv_id):
     cv = CandidateCV.query.get_or_404(cv_id)
     
     # Also delete related shortlists
+    adjust_grouped('shortlisted_cvs', Shortlist.jobgiver_id, Shortlist.cv_id == cv_id)
     Shortlist.query.filter_by(cv_id=cv_id).delete()
+    unindex_documents('cv', [cv])
     
+    filename = cv.filename
     db.session.delete(cv)
     db.session.commit()
+    remove_upload_files('cv', [filename])
     flash("Candidate CV deleted successfully!", "success")
     return redirect(url_for('admin.admin_dashboard'))
 
@@ -113,10 +205,14 @@ def delete_job(job_id):
     
     # Also delete related applications and saved jobs
     Application.query.filter_by(job_id=job_id).delete()
+    adjust_grouped('saved_jobs', SavedJob.candidate_id, SavedJob.job_id == job_id)
     SavedJob.query.filter_by(job_id=job_id).delete()
+    unindex_documents('job', [job])
     
+    filename = job.filename
     db.session.delete(job)
     db.session.commit()
+    remove_upload_files('job', [filename])
     flash("Job requirement deleted successfully!", "success")
     return redirect(url_for('admin.admin_dashboard'))
 
@@ -1,84 +1,70 @@
 import re
 import numpy as np
 from collections import Counter
+from sklearn.feature_extraction.text import CountVectorizer
+from .skill_taxonomy import DOMAIN_SKILLS, SOFT_SKILLS
 import logging
 
 logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# Experience level -> (min years, max years)
+EXPERIENCE_RANGES = {
+    'entry': (0, 2),
+    'mid': (2, 5),
+    'senior': (5, 50)
+}
+
+def _words(text):
+    # Same tokens calculate_skill_match compares
+    return text.lower().split()
+
+def _user_text(user_skills):
+    return " ".join([f"{skill['name']} {skill['proficiency']}" for skill in user_skills])
+
+def _career_text(career_requirements):
+    return " ".join([f"{skill} {level}" for skill, level in career_requirements.items()])
+
 class CareerPathPredictor:
     def __init__(self):
         self.career_paths = []
+        self._vectorized = None
         
-        # Domain-specific skills for reference (not used in extraction anymore)
-        self.domain_skills = {
-            'Engineering': [
-                'programming', 'cad', 'engineering design', 'mechanical', 'electrical', 'civil',
-                'structural analysis', 'thermodynamics', 'circuit design', 'manufacturing',
-                'project management', 'technical documentation', 'solidworks', 'autocad',
-                'matlab', 'simulation', 'prototyping', 'quality control', 'safety standards'
-            ],
-            'Information Technology': [
-                'python', 'javascript', 'java', 'sql', 'react', 'node.js', 'aws', 'docker',
-                'kubernetes', 'linux', 'networking', 'cybersecurity', 'devops', 'ci/cd',
-                'database', 'api', 'web development', 'mobile development', 'cloud computing',
-                'troubleshooting', 'system administration', 'it support'
-            ],
-            'Healthcare': [
-                'patient care', 'medical knowledge', 'healthcare', 'nursing', 'medical terminology',
-                'emergency response', 'medical documentation', 'healthcare administration',
-                'clinical skills', 'patient assessment', 'medication administration',
-                'healthcare regulations', 'medical research', 'laboratory techniques'
-            ],
-            'Education': [
-                'teaching', 'curriculum development', 'classroom management', 'lesson planning',
-                'student assessment', 'educational technology', 'instructional design',
-                'student counseling', 'educational leadership', 'training', 'mentoring',
-                'academic advising', 'education policy'
-            ],
-            'Finance': [
-                'financial analysis', 'accounting', 'excel', 'financial modeling', 'budgeting',
-                'forecasting', 'investment', 'banking', 'taxation', 'auditing', 'risk management',
-                'financial reporting', 'quickbooks', 'sap', 'compliance', 'portfolio management'
-            ],
-            'Marketing': [
-                'digital marketing', 'seo', 'social media', 'content creation', 'brand management',
-                'market research', 'analytics', 'advertising', 'campaign management',
-                'email marketing', 'content strategy', 'public relations', 'customer acquisition',
-                'google analytics', 'marketing automation'
-            ],
-            'Design': [
-                'ui/ux design', 'graphic design', 'adobe creative suite', 'figma', 'sketch',
-                'typography', 'layout design', 'brand identity', 'web design', 'print design',
-                'motion graphics', '3d modeling', 'user research', 'prototyping', 'wireframing'
-            ],
-            'Sales': [
-                'sales', 'negotiation', 'customer relationship', 'account management',
-                'business development', 'lead generation', 'client acquisition', 'presentation',
-                'persuasion', 'closing deals', 'sales strategy', 'territory management',
-                'customer service', 'relationship building'
-            ],
-            'Legal': [
-                'legal research', 'contract law', 'litigation', 'legal writing', 'compliance',
-                'corporate law', 'intellectual property', 'legal documentation', 'case management',
-                'regulatory compliance', 'dispute resolution', 'legal advice', 'paralegal'
-            ],
-            'Operations / Management': [
-                'operations management', 'project management', 'process improvement',
-                'supply chain', 'logistics', 'team leadership', 'strategic planning',
-                'budget management', 'performance management', 'quality assurance',
-                'inventory management', 'six sigma', 'lean manufacturing', 'business operations'
-            ]
-        }
-        
-        self.soft_skills = [
-            'communication', 'leadership', 'teamwork', 'problem solving', 'critical thinking',
-            'creativity', 'adaptability', 'time management', 'project management',
-            'analytical skills', 'research', 'presentation', 'negotiation', 'collaboration'
-        ]
+        # Domain-specific skills, also used by the CV skill extractor
+        self.domain_skills = DOMAIN_SKILLS
+        self.soft_skills = SOFT_SKILLS
 
     def load_career_paths(self, career_paths_data):
-        """Load career paths data"""
+        """Load career paths data and vectorize their requirements"""
         self.career_paths = career_paths_data
+        self._vectorize()
+
+    def _vectorize(self):
+        """
+        Turn the catalog into a sparse binary career x word matrix, the
+        word sets calculate_skill_match builds one career at a time.
+        """
+        requirements = [career.get('required_skills', {}) for career in self.career_paths]
+        texts = [_career_text(req) if req else '' for req in requirements]
+        self._vectorizer = CountVectorizer(analyzer=_words, binary=True, dtype=np.int32)
+        try:
+            self._career_matrix = self._vectorizer.fit_transform(texts).tocsr()
+        except ValueError:
+            # Not a single word in the whole catalog
+            self._career_matrix = None
+        if self._career_matrix is not None:
+            self._career_sizes = np.asarray(self._career_matrix.sum(axis=1)).ravel()
+        else:
+            self._career_sizes = np.zeros(len(texts), dtype=np.int64)
+        # Careers without requirements (or words) always score 0
+        self._scorable = np.array([bool(req) for req in requirements], dtype=bool) & (self._career_sizes > 0)
+        self._career_domains = np.array([career.get('domain', '') for career in self.career_paths], dtype=object)
+        levels = [(career.get('experience_level') or '').lower() for career in self.career_paths]
+        self._level_names = list(EXPERIENCE_RANGES) + [None]
+        self._career_levels = np.array([
+            self._level_names.index(level) if level in EXPERIENCE_RANGES else len(EXPERIENCE_RANGES)
+            for level in levels
+        ], dtype=np.int64)
+        self._vectorized = self.career_paths
 
     def calculate_skill_match(self, user_skills, career_requirements, user_domain, career_domain):
         """Calculate match percentage with domain consideration"""
@@ -88,13 +74,9 @@ class CareerPathPredictor:
         # Domain match bonus
         domain_match_bonus = 1.2 if user_domain == career_domain else 1.0
         
-        # Convert skills to text for simple comparison
-        user_skills_text = " ".join([f"{skill['name']} {skill['proficiency']}" for skill in user_skills])
-        career_skills_text = " ".join([f"{skill} {level}" for skill, level in career_requirements.items()])
-        
         # Simple text-based similarity (removed embedding dependency)
-        user_words = set(user_skills_text.lower().split())
-        career_words = set(career_skills_text.lower().split())
+        user_words = set(_words(_user_text(user_skills)))
+        career_words = set(_words(_career_text(career_requirements)))
         
         if not career_words:
             return 0
@@ -116,48 +98,81 @@ class CareerPathPredictor:
 
     def predict_career_paths(self, user_skills, user_domain, user_experience_years=2):
         """Predict suitable career paths based on domain"""
+        return self.predict_career_paths_batch([(user_skills, user_domain, user_experience_years)])[0]
+
+    def predict_career_paths_batch(self, users, top_n=6, chunk_size=64):
+        """
+        Recommendations for many users against the whole catalog, e.g. for
+        an offline refresh. users is a list of (user_skills, user_domain,
+        user_experience_years); returns one list per user, the same as
+        predict_career_paths would. Users are scored chunk_size at a time
+        with one sparse product per chunk.
+        """
+        if self._vectorized is not self.career_paths:
+            self._vectorize()
+        results = []
+        for start in range(0, len(users), chunk_size):
+            chunk = users[start:start + chunk_size]
+            scores = self.skill_match_matrix([u[0] for u in chunk], [u[1] for u in chunk])
+            for (user_skills, user_domain, user_experience_years), match in zip(chunk, scores):
+                results.append(self._recommend(user_skills, user_domain, user_experience_years, match, top_n))
+        return results
+
+    def skill_match_matrix(self, users_skills, user_domains):
+        """
+        calculate_skill_match of every user against every career, as a
+        users x careers array: Jaccard similarity of the word sets times
+        100, with the domain bonus, capped at 100.
+        """
+        if self._vectorized is not self.career_paths:
+            self._vectorize()
+        scores = np.zeros((len(users_skills), len(self.career_paths)))
+        if self._career_matrix is None or not len(self.career_paths):
+            return scores
+        user_texts = [_user_text(skills) for skills in users_skills]
+        # Words outside the catalog vocabulary still count towards the union
+        user_sizes = np.array([len(set(_words(text))) for text in user_texts], dtype=np.int64)
+        user_matrix = self._vectorizer.transform(user_texts)
+        intersection = (user_matrix @ self._career_matrix.T).toarray()
+        union = user_sizes[:, None] + self._career_sizes[None, :] - intersection
+        scorable = self._scorable[None, :] & (union > 0)
+        similarity = np.divide(intersection, union, out=np.zeros(scores.shape), where=scorable)
+        for row, user_domain in enumerate(user_domains):
+            domain_match_bonus = np.where(self._career_domains == user_domain, 1.2, 1.0)
+            scores[row] = np.minimum(similarity[row] * 100 * domain_match_bonus, 100)
+        scores[~scorable] = 0
+        return scores
+
+    def _recommend(self, user_skills, user_domain, user_experience_years, match, top_n):
+        # Experience multiplier per level, then per career
+        multipliers = np.array([self._calculate_experience_match(user_experience_years, level or '')
+                                for level in self._level_names])
+        adjusted = match * multipliers[self._career_levels]
+        
+        # Show paths with at least 15% match
+        candidates = [(round(float(adjusted[i]), 1), i) for i in np.flatnonzero(adjusted > 15)]
+        # Stable sort keeps catalog order between equal scores
+        candidates.sort(key=lambda x: x[0], reverse=True)
+        
+        user_skill_names = {skill['name'].lower() for skill in user_skills}
         recommendations = []
-        
-        for career in self.career_paths:
-            # Only consider careers in the same domain or closely related
+        for match_percentage, i in candidates[:top_n]:
+            career = self.career_paths[i]
             career_domain = career.get('domain', '')
-            
-            match_percentage = self.calculate_skill_match(
-                user_skills, 
-                career.get('required_skills', {}),
-                user_domain,
-                career_domain
-            )
-            
-            # Adjust match based on experience
-            experience_match = self._calculate_experience_match(user_experience_years, career.get('experience_level', ''))
-            adjusted_match = match_percentage * experience_match
-            
-            if adjusted_match > 15:  # Show paths with at least 15% match
-                missing_skills = self._identify_missing_skills(user_skills, career.get('required_skills', {}))
-                
-                recommendations.append({
-                    'career_path': career,
-                    'match_percentage': round(adjusted_match, 1),
-                    'missing_skills': missing_skills,
-                    'estimated_salary': self._calculate_salary_estimate(career, user_experience_years),
-                    'domain_match': user_domain == career_domain
-                })
-        
-        # Sort by match percentage
-        recommendations.sort(key=lambda x: x['match_percentage'], reverse=True)
-        return recommendations[:6]  # Return top 6 recommendations
+            recommendations.append({
+                'career_path': career,
+                'match_percentage': match_percentage,
+                'missing_skills': self._identify_missing_skills(user_skills, career.get('required_skills', {}),
+                                                                user_skill_names),
+                'estimated_salary': self._calculate_salary_estimate(career, user_experience_years),
+                'domain_match': user_domain == career_domain
+            })
+        return recommendations
 
     def _calculate_experience_match(self, user_experience, required_level):
         """Calculate experience level match"""
-        experience_mapping = {
-            'entry': (0, 2),
-            'mid': (2, 5),
-            'senior': (5, 50)
-        }
-        
-        if required_level.lower() in experience_mapping:
-            min_exp, max_exp = experience_mapping[required_level.lower()]
+        if required_level.lower() in EXPERIENCE_RANGES:
+            min_exp, max_exp = EXPERIENCE_RANGES[required_level.lower()]
             if min_exp <= user_experience <= max_exp:
                 return 1.0
             elif user_experience < min_exp:
@@ -166,10 +181,11 @@ class CareerPathPredictor:
                 return 0.9
         return 0.8
 
-    def _identify_missing_skills(self, user_skills, required_skills):
+    def _identify_missing_skills(self, user_skills, required_skills, user_skill_names=None):
         """Identify skills user needs to develop"""
         missing = []
-        user_skill_names = [skill['name'].lower() for skill in user_skills]
+        if user_skill_names is None:
+            user_skill_names = [skill['name'].lower() for skill in user_skills]
         
         for skill, level in required_skills.items():
             if skill.lower() not in user_skill_names:
@@ -0,0 +1,174 @@
+import sqlite3
+import threading
+import time
+import os
+import logging
+
+logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Entries read per query while looking for the eviction cutoff
+EVICT_BATCH = 500
+
+class ExtractionCache:
+    """
+    Persistent cache for PDF text, keyed by the SHA-256 of the file bytes.
+
+    Raw text and the keyword-weighted sections derived from it are stored
+    separately, so a new section version (different keyword list) only
+    re-runs the cheap extraction step and never the PDF parser.
+    Entries are evicted least-recently-used once max_bytes is exceeded.
+    The total size is kept in a one-row table by triggers, so checking the
+    budget on a write is a primary-key read whatever the cache size.
+    """
+
+    def __init__(self, path, max_bytes=256 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        # Pool processes share the file, so wait on locks instead of failing
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # INSERT OR REPLACE only fires the delete triggers with this on
+        self._conn.execute("PRAGMA recursive_triggers=ON")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS raw_text (
+                file_hash TEXT PRIMARY KEY,
+                text TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_access REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS sections (
+                file_hash TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                version TEXT NOT NULL,
+                text TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_access REAL NOT NULL,
+                PRIMARY KEY (file_hash, kind, version)
+            );
+            CREATE INDEX IF NOT EXISTS idx_raw_text_access ON raw_text (last_access);
+            CREATE INDEX IF NOT EXISTS idx_sections_access ON sections (last_access);
+            CREATE TABLE IF NOT EXISTS cache_stats (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                total_bytes INTEGER NOT NULL
+            );
+        """)
+        # Caches created before the running total start from one full count;
+        # the write lock keeps other processes' writes out until the
+        # triggers exist
+        self._conn.executescript("""
+            BEGIN IMMEDIATE;
+            INSERT OR IGNORE INTO cache_stats (id, total_bytes)
+                SELECT 1, (SELECT COALESCE(SUM(size), 0) FROM raw_text) + (SELECT COALESCE(SUM(size), 0) FROM sections)
+                WHERE NOT EXISTS (SELECT 1 FROM cache_stats);
+            CREATE TRIGGER IF NOT EXISTS raw_text_added AFTER INSERT ON raw_text BEGIN
+                UPDATE cache_stats SET total_bytes = total_bytes + NEW.size WHERE id = 1;
+            END;
+            CREATE TRIGGER IF NOT EXISTS raw_text_removed AFTER DELETE ON raw_text BEGIN
+                UPDATE cache_stats SET total_bytes = total_bytes - OLD.size WHERE id = 1;
+            END;
+            CREATE TRIGGER IF NOT EXISTS sections_added AFTER INSERT ON sections BEGIN
+                UPDATE cache_stats SET total_bytes = total_bytes + NEW.size WHERE id = 1;
+            END;
+            CREATE TRIGGER IF NOT EXISTS sections_removed AFTER DELETE ON sections BEGIN
+                UPDATE cache_stats SET total_bytes = total_bytes - OLD.size WHERE id = 1;
+            END;
+            COMMIT;
+        """)
+        self._conn.commit()
+
+    def get_raw(self, file_hash):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT text FROM raw_text WHERE file_hash = ?", (file_hash,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE raw_text SET last_access = ? WHERE file_hash = ?", (time.time(), file_hash)
+            )
+            self._conn.commit()
+            return row[0]
+
+    def put_raw(self, file_hash, text):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO raw_text (file_hash, text, size, last_access) VALUES (?, ?, ?, ?)",
+                (file_hash, text, len(text.encode('utf-8')), time.time())
+            )
+            self._evict()
+            self._conn.commit()
+
+    def get_section(self, file_hash, kind, version):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT text FROM sections WHERE file_hash = ? AND kind = ? AND version = ?",
+                (file_hash, kind, version)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE sections SET last_access = ? WHERE file_hash = ? AND kind = ? AND version = ?",
+                (time.time(), file_hash, kind, version)
+            )
+            self._conn.commit()
+            return row[0]
+
+    def put_section(self, file_hash, kind, version, text):
+        with self._lock:
+            # Older versions of this section can never be read again
+            self._conn.execute(
+                "DELETE FROM sections WHERE file_hash = ? AND kind = ? AND version != ?",
+                (file_hash, kind, version)
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sections (file_hash, kind, version, text, size, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (file_hash, kind, version, text, len(text.encode('utf-8')), time.time())
+            )
+            self._evict()
+            self._conn.commit()
+
+    def delete(self, file_hash):
+        with self._lock:
+            self._conn.execute("DELETE FROM raw_text WHERE file_hash = ?", (file_hash,))
+            self._conn.execute("DELETE FROM sections WHERE file_hash = ?", (file_hash,))
+            self._conn.commit()
+
+    def total_bytes(self):
+        with self._lock:
+            return self._total_bytes()
+
+    def _total_bytes(self):
+        return self._conn.execute("SELECT total_bytes FROM cache_stats WHERE id = 1").fetchone()[0]
+
+    def _evict(self):
+        total = self._total_bytes()
+        if total <= self.max_bytes:
+            return
+        # Drop least recently used entries until we are back under 90% of the
+        # budget: find the last_access cutoff that frees enough, reading the
+        # oldest entries a batch at a time off the last_access indexes
+        excess = total - int(self.max_bytes * 0.9)
+        freed = 0
+        cutoff = -1.0
+        while freed < excess:
+            rows = self._conn.execute("""
+                SELECT size, last_access FROM raw_text WHERE last_access > ?
+                UNION ALL
+                SELECT size, last_access FROM sections WHERE last_access > ?
+                ORDER BY last_access LIMIT ?
+            """, (cutoff, cutoff, EVICT_BATCH)).fetchall()
+            if not rows:
+                break
+            for size, last_access in rows:
+                freed += size
+                cutoff = last_access
+                if freed >= excess:
+                    break
+        # Entries sharing the cutoff's last_access go too
+        evicted = self._conn.execute("DELETE FROM raw_text WHERE last_access <= ?", (cutoff,)).rowcount
+        evicted += self._conn.execute("DELETE FROM sections WHERE last_access <= ?", (cutoff,)).rowcount
+        logging.debug(f"Extraction cache evicted {evicted} entries, {self._total_bytes()} bytes remain")
@@ -0,0 +1,200 @@
+import concurrent.futures
+import concurrent.futures.process
+import multiprocessing
+import threading
+import signal
+import math
+import os
+import logging
+from collections import namedtuple
+from . import extract_text
+
+logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Extra time for the batch deadline, covering worker process start-up
+POOL_START_GRACE = 10
+
+ExtractionResult = namedtuple('ExtractionResult', ['key', 'path', 'kind', 'text', 'error'])
+
+class ExtractionTimeout(BaseException):
+    # BaseException so the parser's own `except Exception` cannot swallow it
+    pass
+
+def _raise_timeout(signum, frame):
+    raise ExtractionTimeout()
+
+def _init_worker(cache_path, cache_max_bytes, pids):
+    # Reported so the parent can terminate workers that hang
+    pids.put(os.getpid())
+    # Each process opens its own connection to the shared extraction cache
+    extract_text.configure_cache(cache_path, cache_max_bytes)
+
+def _extract_one(key, path, kind, timeout):
+    """
+    Runs in a pool process. PyPDF2 is pure Python, so a SIGALRM reliably
+    interrupts a parse that runs past its budget.
+    """
+    use_alarm = timeout and hasattr(signal, 'setitimer')
+    if use_alarm:
+        signal.signal(signal.SIGALRM, _raise_timeout)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        return ExtractionResult(key, path, kind, extract_text.extract_document_text(path, kind), None)
+    except ExtractionTimeout:
+        return ExtractionResult(key, path, kind, None, f"Timed out after {timeout}s")
+    except Exception as e:
+        return ExtractionResult(key, path, kind, None, str(e))
+    finally:
+        if use_alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+
+class ExtractionPool:
+    """
+    Bounded process pool for CPU-bound PDF extraction.
+
+    extract() yields results as files finish. Every file is isolated: a
+    corrupt PDF, a per-file timeout or a crashed worker only fails the
+    files involved, never the batch. Concurrent batches share the pool;
+    files they lose when a worker dies are retried, not failed.
+    """
+
+    def __init__(self, max_workers=None, timeout=60):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.timeout = timeout
+        self._executor = None
+        # Pids of the current executor's workers, reported as they start
+        self._pids = None
+        self._lock = threading.Lock()
+        # One retried file at a time across batches, so a crash during a
+        # retry can only come from that file
+        self._retry_lock = threading.Lock()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                cache = extract_text.get_cache()
+                # spawn: children must not inherit the parent's SQLite handles
+                context = multiprocessing.get_context('spawn')
+                self._pids = context.SimpleQueue()
+                self._executor = concurrent.futures.ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=context,
+                    initializer=_init_worker,
+                    initargs=(cache.path if cache else None, cache.max_bytes if cache else 0, self._pids)
+                )
+            return self._executor
+
+    def _reset(self, executor=None, terminate=False):
+        """
+        Replace the executor. Given the executor a batch found broken, only
+        that one is replaced: when several batches notice the same failure,
+        the first rebuilds the pool and the rest keep using the new one.
+        """
+        with self._lock:
+            if executor is not None and executor is not self._executor:
+                return
+            executor, self._executor = self._executor, None
+            pids, self._pids = self._pids, None
+        if executor is not None:
+            if terminate:
+                # Workers stuck in C code ignore SIGALRM; terminate them
+                # outright. Batches still running on them see
+                # BrokenProcessPool and retry their files on the new pool
+                while not pids.empty():
+                    try:
+                        os.kill(pids.get(), signal.SIGTERM)
+                    except OSError:
+                        pass
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _submit(self, items, timeout):
+        for _ in range(2):
+            executor = self._get_executor()
+            try:
+                return executor, {executor.submit(_extract_one, key, path, kind, timeout): (key, path, kind)
+                                  for key, path, kind in items}
+            except concurrent.futures.process.BrokenProcessPool:
+                # Broken by another batch that has not replaced it yet
+                self._reset(executor)
+        raise concurrent.futures.process.BrokenProcessPool("Extraction pool keeps breaking")
+
+    def _run(self, items, timeout, crashed):
+        """
+        Run items on the shared pool, yielding their results. Items lost
+        because a worker died are appended to crashed instead: any file in
+        flight at that moment, from this batch or another, may be the cause.
+        """
+        try:
+            executor, futures = self._submit(items, timeout)
+        except Exception as e:
+            for key, path, kind in items:
+                yield ExtractionResult(key, path, kind, None, f"Worker failed: {str(e)}")
+            return
+        # Backstop for hung workers: enough time for every wave of files to time out
+        deadline = timeout * math.ceil(len(items) / self.max_workers) + timeout + POOL_START_GRACE
+        broken = hung = False
+        try:
+            for future in concurrent.futures.as_completed(futures, timeout=deadline):
+                key, path, kind = futures.pop(future)
+                try:
+                    yield future.result()
+                except concurrent.futures.process.BrokenProcessPool:
+                    broken = True
+                    crashed.append((key, path, kind))
+                except Exception as e:
+                    yield ExtractionResult(key, path, kind, None, f"Worker failed: {str(e)}")
+        except concurrent.futures.TimeoutError:
+            hung = True
+            for key, path, kind in futures.values():
+                yield ExtractionResult(key, path, kind, None, "Batch deadline exceeded")
+        finally:
+            if hung:
+                # Other batches lose their running files too and retry them
+                self._reset(executor, terminate=True)
+            elif broken:
+                self._reset(executor)
+
+    def extract(self, items, timeout=None):
+        """
+        Extract many documents. items are (key, path, kind) tuples, kind being
+        'cv' or 'job'. Yields ExtractionResult in completion order.
+        """
+        items = list(items)
+        if not items:
+            return
+        timeout = timeout or self.timeout
+        crashed = []
+        yield from self._run(items, timeout, crashed)
+        # Retry files lost to a dead worker one at a time on the rebuilt
+        # pool, so only the file that actually kills a worker fails
+        for item in crashed:
+            again = []
+            with self._retry_lock:
+                results = list(self._run([item], timeout, again))
+            yield from results
+            for key, path, kind in again:
+                yield ExtractionResult(key, path, kind, None, "Worker crashed while extracting")
+
+    def shutdown(self):
+        self._reset(terminate=True)
+
+_pool = None
+
+def configure_pool(max_workers=None, timeout=60):
+    global _pool
+    if _pool is not None:
+        _pool.shutdown()
+    _pool = ExtractionPool(max_workers=max_workers, timeout=timeout)
+    return _pool
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        _pool = ExtractionPool()
+    return _pool
+
+def extract_many(items, timeout=None):
+    """
+    Extract (key, path, kind) items on the shared pool; yields ExtractionResult.
+    """
+    return get_pool().extract(items, timeout=timeout)
@@ -1,5 +1,33 @@
 import re
+import os
+import json
+import hashlib
+import logging
+from functools import lru_cache
 import PyPDF2
+from .extract_cache import ExtractionCache
+from .tracing import span
+
+# Bump when extract_relevant_text changes so cached sections are rebuilt
+EXTRACTION_VERSION = 1
+
+CV_KEYWORDS = [
+    "position", "skills", "experience", "education", "qualification", 
+    "summary", "profile", "technical skills", "work history", "employment",
+    "projects", "achievements", "certifications", "training", "objective",
+    "work experience", "professional experience", "technical", "technologies"
+]
+
+JOB_KEYWORDS = [
+    "job title", "requirement", "skills", "experience", "qualification", 
+    "responsibilities", "description", "duties", "must have", "required",
+    "looking for", "candidate should", "essential", "qualifications",
+    "about the role", "position overview", "key responsibilities", "what you'll do"
+]
+
+KEYWORD_WEIGHT = 2.0
+
+_cache = None
 
 def read_pdf_text(path):
     """
@@ -56,22 +84,105 @@ def extract_cv_text(text):
     """
     Extract relevant information from CV using flexible keywords.
     """
-    cv_keywords = [
-        "position", "skills", "experience", "education", "qualification", 
-        "summary", "profile", "technical skills", "work history", "employment",
-        "projects", "achievements", "certifications", "training", "objective",
-        "work experience", "professional experience", "technical", "technologies"
-    ]
-    return extract_relevant_text(text, cv_keywords, weight_multiplier=2.0)
+    return extract_relevant_text(text, CV_KEYWORDS, weight_multiplier=KEYWORD_WEIGHT)
 
 def extract_job_text(text):
     """
     Extract relevant information from Job Description using flexible keywords.
     """
-    job_keywords = [
-        "job title", "requirement", "skills", "experience", "qualification", 
-        "responsibilities", "description", "duties", "must have", "required",
-        "looking for", "candidate should", "essential", "qualifications",
-        "about the role", "position overview", "key responsibilities", "what you'll do"
-    ]
-    return extract_relevant_text(text, job_keywords, weight_multiplier=2.0)
\ No newline at end of file
+    return extract_relevant_text(text, JOB_KEYWORDS, weight_multiplier=KEYWORD_WEIGHT)
+
+SECTION_EXTRACTORS = {
+    'cv': (extract_cv_text, CV_KEYWORDS),
+    'job': (extract_job_text, JOB_KEYWORDS),
+}
+
+def configure_cache(path, max_bytes=256 * 1024 * 1024):
+    """
+    Enable the persistent extraction cache. Without it every call parses the PDF.
+    """
+    global _cache
+    _cache = ExtractionCache(path, max_bytes=max_bytes) if path else None
+    return _cache
+
+def get_cache():
+    return _cache
+
+def section_version(keywords, weight_multiplier=KEYWORD_WEIGHT):
+    """
+    Version stamp of a derived section: changes whenever the keyword list,
+    the weighting or the extraction logic changes.
+    """
+    payload = json.dumps([EXTRACTION_VERSION, list(keywords), weight_multiplier])
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+@lru_cache(maxsize=4096)
+def _hash_file(path, mtime_ns, size):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def file_sha256(path):
+    """
+    SHA-256 of the file bytes, memoized per (path, mtime, size).
+    """
+    stat = os.stat(path)
+    return _hash_file(os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+
+def read_pdf_text_cached(path, file_hash=None):
+    """
+    Same as read_pdf_text but served from the extraction cache when the
+    exact same bytes were parsed before.
+    """
+    with span('pdf_parse') as s:
+        if _cache is None:
+            s.set(cache='off')
+            return read_pdf_text(path)
+        file_hash = file_hash or file_sha256(path)
+        try:
+            text = _cache.get_raw(file_hash)
+        except Exception as e:
+            logging.error(f"Extraction cache read failed: {str(e)}")
+            text = None
+        if text is not None:
+            s.set(cache='hit')
+            return text
+        s.set(cache='miss')
+        text = read_pdf_text(path)
+        try:
+            _cache.put_raw(file_hash, text)
+        except Exception as e:
+            logging.error(f"Extraction cache write failed: {str(e)}")
+        return text
+
+def extract_document_text(path, kind):
+    """
+    Return the keyword-weighted text of a CV ('cv') or job description ('job').
+    Raw text and derived sections are both cached by file content.
+    """
+    extractor, keywords = SECTION_EXTRACTORS[kind]
+    with span('extract', kind=kind) as s:
+        if _cache is None:
+            s.set(cache='off')
+            return extractor(read_pdf_text_cached(path))
+
+        file_hash = file_sha256(path)
+        version = section_version(keywords)
+        try:
+            text = _cache.get_section(file_hash, kind, version)
+        except Exception as e:
+            logging.error(f"Extraction cache read failed: {str(e)}")
+            text = None
+        if text is not None:
+            s.set(cache='hit')
+            return text
+
+        s.set(cache='miss')
+        text = extractor(read_pdf_text_cached(path, file_hash))
+        try:
+            _cache.put_section(file_hash, kind, version, text)
+        except Exception as e:
+            logging.error(f"Extraction cache write failed: {str(e)}")
+        return text
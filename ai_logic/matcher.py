@@ -1,65 +1,143 @@
 import numpy as np
 from .vectorizer import get_embedding
+from .tracing import span
 import logging
 
 logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
 
-def match_documents(query_text, documents, document_names, embed_func):
+def match_documents(query_text, documents, document_names, embed_func, k=None, min_score=None):
     """
     Compare query_text with a list of documents using embeddings.
-    Returns sorted list of (filename, similarity_score) with scores in [0, 1].
-    Uses simple cosine similarity - proven and reliable.
+    Returns (indices, scores) arrays ordered by descending score, indices
+    pointing into documents and scores in [0, 1]; look names up only for
+    the returned indices. k keeps the best k, min_score drops scores at or
+    below it; both are optional. Empty documents (named in the log) are
+    never returned.
+    If embed_func has a batched variant (embed_func.batch), documents are
+    embedded with it in one call.
     """
-    # Embed the query
-    query_embedding = embed_func(query_text)
-    if query_embedding is None or not query_text.strip() or not np.isfinite(query_embedding).all():
+    empty = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32))
+    if not query_text.strip():
         logging.warning("Invalid query embedding or empty query text")
-        return []
-
-    # Normalize query embedding
-    query_norm = np.linalg.norm(query_embedding)
-    if query_norm == 0:
-        logging.warning("Query embedding has zero norm")
-        return []
-    query_embedding = query_embedding / query_norm
-    logging.debug(f"Query embedding norm: {np.linalg.norm(query_embedding):.4f}")
-    logging.debug(f"Query embedding sample: {query_embedding[:5]}")
+        return empty
 
-    # Embed all documents
-    doc_embeddings = []
-    valid_docs = []
-    valid_names = []
-    for doc, name in zip(documents, document_names):
+    positions = []
+    for i, (doc, name) in enumerate(zip(documents, document_names)):
         if doc.strip():
-            embedding = embed_func(doc)
-            if embedding is not None and np.isfinite(embedding).all() and np.linalg.norm(embedding) > 0:
-                norm = np.linalg.norm(embedding)
-                embedding = embedding / norm
-                logging.debug(f"Document {name} embedding norm: {np.linalg.norm(embedding):.4f}")
-                logging.debug(f"Document {name} embedding sample: {embedding[:5]}")
-                doc_embeddings.append(embedding)
-                valid_docs.append(doc)
-                valid_names.append(name)
-            else:
-                logging.warning(f"Invalid embedding for document {name}")
+            positions.append(i)
         else:
             logging.warning(f"Empty document {name}")
+    if not positions:
+        logging.warning("No valid document embeddings")
+        return empty
+    valid_docs = [documents[i] for i in positions]
 
-    if not doc_embeddings:
+    # Embed all documents
+    batch_func = getattr(embed_func, 'batch', None)
+    if batch_func is not None:
+        doc_embeddings = batch_func(valid_docs)
+    else:
+        doc_embeddings = [embed_func(doc) for doc in valid_docs]
+
+    indices, scores = score_embeddings(embed_func(query_text), as_matrix(doc_embeddings), k=k, min_score=min_score)
+    return np.asarray(positions, dtype=np.int64)[indices], scores
+
+def match_embeddings(query_embedding, doc_embeddings, document_names, k=None, min_score=None):
+    """
+    Score precomputed document embeddings against a query embedding.
+    Returns sorted list of (name, similarity_score) with scores in [0, 1],
+    limited to the best k and to scores above min_score when given.
+    """
+    if len(doc_embeddings) == 0:
         logging.warning("No valid document embeddings")
         return []
+    indices, scores = score_embeddings(query_embedding, as_matrix(doc_embeddings), k=k, min_score=min_score)
+    # Names are only looked up for the survivors
+    return [(document_names[i], float(score)) for i, score in zip(indices, scores)]
 
-    # Manual cosine similarity calculation - Simple and effective
-    similarities = []
-    for i, doc_embedding in enumerate(doc_embeddings):
-        similarity = np.dot(query_embedding, doc_embedding)
-        similarity = max(0.0, min(1.0, similarity))  # Ensure [0, 1]
-        similarities.append(similarity)
-        logging.debug(f"Similarity for {valid_names[i]}: {similarity:.4f}")
+def as_matrix(doc_embeddings):
+    """
+    Stack embeddings into a contiguous (N, dim) float32 matrix.
+    Missing embeddings become zero rows, which scoring treats as invalid.
+    """
+    if isinstance(doc_embeddings, np.ndarray):
+        return np.ascontiguousarray(doc_embeddings, dtype=np.float32)
+    if all(e is not None for e in doc_embeddings):
+        return np.ascontiguousarray(np.vstack(doc_embeddings), dtype=np.float32)
+    dim = next((len(e) for e in doc_embeddings if e is not None), 0)
+    matrix = np.zeros((len(doc_embeddings), dim), dtype=np.float32)
+    for i, embedding in enumerate(doc_embeddings):
+        if embedding is not None:
+            matrix[i] = embedding
+    return matrix
 
-    similarities = np.array(similarities)
-    logging.debug(f"All similarities: {similarities.tolist()}")
+def normalize_rows(matrix):
+    """
+    L2-normalize every row. Returns (normalized, valid) where valid marks
+    rows that were finite with a non-zero norm; invalid rows are zeroed.
+    """
+    matrix = np.asarray(matrix, dtype=np.float32)
+    finite = np.isfinite(matrix).all(axis=1)
+    norms = np.linalg.norm(np.where(finite[:, None], matrix, 0), axis=1)
+    valid = finite & (norms > 0)
+    normalized = np.zeros_like(matrix)
+    normalized[valid] = matrix[valid] / norms[valid, None]
+    return normalized, valid
+
+def normalize_query(query_embedding):
+    if query_embedding is None or not np.isfinite(query_embedding).all():
+        logging.warning("Invalid query embedding or empty query text")
+        return None
+    query_embedding = np.asarray(query_embedding, dtype=np.float32)
+    query_norm = np.linalg.norm(query_embedding)
+    if query_norm == 0:
+        logging.warning("Query embedding has zero norm")
+        return None
+    return query_embedding / query_norm
+
+def top_k(scores, candidates=None, k=None, min_score=None):
+    """
+    Select the best-scoring candidate indices without a full sort.
+    Returns (indices, scores) ordered by descending score.
+    """
+    if candidates is None:
+        candidates = np.arange(len(scores))
+    if min_score is not None:
+        candidates = candidates[scores[candidates] > min_score]
+    if k is not None and k < len(candidates):
+        if k <= 0:
+            candidates = candidates[:0]
+        else:
+            candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+    order = np.argsort(-scores[candidates], kind='stable')
+    candidates = candidates[order]
+    return candidates, scores[candidates]
+
+def score_embeddings(query_embedding, doc_matrix, k=None, min_score=None, normalized=False):
+    """
+    Cosine similarity of one query against an (N, dim) matrix in a single
+    matrix-vector product, clipped to [0, 1].
+    Pass normalized=True when the rows are already unit length.
+    Returns (indices, scores) arrays ordered by descending score.
+    """
+    empty = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32))
+    query_embedding = normalize_query(query_embedding)
+    if query_embedding is None or len(doc_matrix) == 0:
+        return empty
+
+    with span('score', docs=len(doc_matrix)) as s:
+        if normalized:
+            candidates = None
+        else:
+            doc_matrix, valid = normalize_rows(doc_matrix)
+            if not valid.any():
+                logging.warning("No valid document embeddings")
+                return empty
+            candidates = None if valid.all() else np.flatnonzero(valid)
 
-    results = list(zip(valid_names, similarities))
-    results.sort(key=lambda x: x[1], reverse=True)
-    return results
\ No newline at end of file
+        scores = doc_matrix @ query_embedding
+        np.clip(scores, 0.0, 1.0, out=scores)
+        indices, top_scores = top_k(scores, candidates, k=k, min_score=min_score)
+        s.set(kept=len(indices))
+    logging.debug(f"Scored {len(scores)} documents, kept {len(indices)} (k={k}, min_score={min_score})")
+    return indices, top_scores
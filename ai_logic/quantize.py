@@ -0,0 +1,152 @@
+import numpy as np
+import logging
+from .matcher import normalize_rows, normalize_query, top_k
+
+logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
+
+PRECISIONS = ('float32', 'float16', 'int8')
+
+# Rows cast back to float32 at a time while scoring compact codes
+SCORE_CHUNK = 65536
+
+class VectorCodec:
+    """
+    Compact storage for unit-normalized embeddings.
+
+    precision is 'float32', 'float16' or 'int8' (symmetric scalar
+    quantization with one scale per vector). An optional PCA projection,
+    fitted with fit(), reduces vectors to pca_dim dimensions first; the
+    projected vectors are re-normalized so scores stay cosine similarities.
+    """
+
+    def __init__(self, precision='float32', pca_dim=None):
+        if precision not in PRECISIONS:
+            raise ValueError(f"Unknown precision: {precision}")
+        self.precision = precision
+        self.pca_dim = pca_dim
+        self.mean = None
+        self.components = None
+
+    @property
+    def exact(self):
+        """True when scores on the codes equal exact float32 cosine scores."""
+        return self.precision == 'float32' and self.components is None
+
+    @property
+    def dtype(self):
+        return np.dtype(self.precision)
+
+    def code_dim(self, dim):
+        return self.components.shape[0] if self.components is not None else dim
+
+    def fit(self, vectors, max_samples=100000, seed=0):
+        """
+        Fit the PCA projection. Skipped when pca_dim is unset or there are
+        fewer vectors than pca_dim, in which case vectors keep full size.
+        """
+        if not self.pca_dim or len(vectors) < self.pca_dim or self.pca_dim >= vectors.shape[1]:
+            self.mean = self.components = None
+            return self
+        if len(vectors) > max_samples:
+            vectors = vectors[np.random.default_rng(seed).choice(len(vectors), max_samples, replace=False)]
+        self.mean = vectors.mean(axis=0).astype(np.float32)
+        _, _, vt = np.linalg.svd(vectors - self.mean, full_matrices=False)
+        self.components = np.ascontiguousarray(vt[:self.pca_dim], dtype=np.float32)
+        return self
+
+    def project(self, vectors):
+        """
+        Map unit vectors (one or many) into code space, re-normalized.
+        """
+        single = vectors.ndim == 1
+        vectors = np.atleast_2d(vectors).astype(np.float32)
+        if self.components is not None:
+            vectors, _ = normalize_rows((vectors - self.mean) @ self.components.T)
+        return vectors[0] if single else vectors
+
+    def encode(self, vectors):
+        """
+        Encode unit vectors. Returns (codes, scales); scales is None unless int8.
+        """
+        projected = self.project(vectors)
+        if self.precision == 'int8':
+            scales = np.abs(projected).max(axis=1) / 127.0
+            scales[scales == 0] = 1.0
+            codes = np.clip(np.rint(projected / scales[:, None]), -127, 127).astype(np.int8)
+            return codes, scales.astype(np.float32)
+        return np.ascontiguousarray(projected, dtype=self.dtype), None
+
+    def decode(self, codes, scales=None):
+        """
+        Approximate unit vectors in code space.
+        """
+        vectors = codes.astype(np.float32)
+        if scales is not None:
+            vectors *= scales[:, None]
+        return vectors
+
+    def score(self, codes, scales, query, rows=None):
+        """
+        Approximate cosine scores of a code-space query against stored codes,
+        optionally restricted to row positions.
+        """
+        if rows is not None:
+            codes = codes[rows]
+            scales = scales[rows] if scales is not None else None
+        if codes.dtype == np.float32:
+            return codes @ query
+        scores = np.empty(len(codes), dtype=np.float32)
+        for start in range(0, len(codes), SCORE_CHUNK):
+            block = codes[start:start + SCORE_CHUNK].astype(np.float32)
+            scores[start:start + SCORE_CHUNK] = block @ query
+        if scales is not None:
+            scores *= scales
+        return scores
+
+    def params(self):
+        return {'precision': self.precision, 'pca_dim': self.pca_dim}
+
+    def arrays(self):
+        if self.components is None:
+            return {}
+        return {'pca_mean': self.mean, 'pca_components': self.components}
+
+    def restore(self, arrays):
+        self.mean = arrays.get('pca_mean')
+        self.components = arrays.get('pca_components')
+
+def recall_at_k(vectors, codec, k=10, queries=100, rerank_factor=4, seed=0):
+    """
+    Measure how many of the exact float32 top-k neighbours survive a codec.
+    Corpus vectors double as queries. Returns recall of the compact scores
+    alone and after re-ranking k * rerank_factor candidates at full precision.
+    """
+    vectors, valid = normalize_rows(vectors)
+    vectors = vectors[valid]
+    if len(vectors) == 0:
+        return {'recall': None, 'recall_reranked': None, 'queries': 0}
+    k = min(k, len(vectors))
+    codec.fit(vectors)
+    codes, scales = codec.encode(vectors)
+    rng = np.random.default_rng(seed)
+    picks = rng.choice(len(vectors), min(queries, len(vectors)), replace=False)
+
+    hits = hits_reranked = 0
+    for i in picks:
+        query = normalize_query(vectors[i])
+        exact, _ = top_k(vectors @ query, k=k)
+        approx_scores = codec.score(codes, scales, codec.project(query))
+        approx, _ = top_k(approx_scores, k=k)
+        shortlist, _ = top_k(approx_scores, k=k * rerank_factor)
+        reranked, _ = top_k(vectors[shortlist] @ query, k=k)
+        hits += len(np.intersect1d(exact, approx))
+        hits_reranked += len(np.intersect1d(exact, shortlist[reranked]))
+
+    total = k * len(picks)
+    bytes_per_vector = codes.shape[1] * codes.dtype.itemsize + (4 if scales is not None else 0)
+    return {
+        'recall': hits / total,
+        'recall_reranked': hits_reranked / total,
+        'queries': len(picks),
+        'bytes_per_vector': bytes_per_vector,
+    }
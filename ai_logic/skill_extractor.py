@@ -0,0 +1,42 @@
+import re
+from functools import lru_cache
+from .skill_index import AhoCorasick
+from .skill_taxonomy import extractable_skills
+
+TOKEN = re.compile(r'[a-z0-9]+')
+
+def tokenize(text):
+    """Lowercase word tokens; punctuation only separates them."""
+    return TOKEN.findall(text.lower())
+
+class SkillExtractor:
+    """
+    Finds taxonomy skills in free text.
+
+    Every skill is compiled into one Aho-Corasick automaton over word
+    tokens, so a document is scanned once in a single pass however large
+    the taxonomy is, and skills only match whole words ('java' is not
+    found inside 'javascript'). Punctuation is ignored on both sides, so
+    'node.js' matches 'Node.js' and 'node js'.
+    """
+
+    def __init__(self, skills):
+        self.skills = list(dict.fromkeys(skill.lower() for skill in skills))
+        patterns = {}
+        for skill_id, skill in enumerate(self.skills):
+            tokens = tuple(tokenize(skill))
+            if tokens:
+                # Skills differing only in punctuation are reported once
+                patterns.setdefault(tokens, skill_id)
+        self._automaton = AhoCorasick(patterns)
+
+    def extract(self, text):
+        """Taxonomy skills occurring in text, in taxonomy order."""
+        if not text:
+            return []
+        return [self.skills[skill_id] for skill_id in sorted(self._automaton.search(tokenize(text)))]
+
+@lru_cache(maxsize=1)
+def get_extractor():
+    """Extractor over the skill taxonomy, compiled once per process."""
+    return SkillExtractor(extractable_skills())
@@ -0,0 +1,144 @@
+import numpy as np
+from bisect import bisect_right
+from collections import deque
+
+# Joins the terms into one string for reverse containment scans; cannot
+# appear in a skill name typed into a form
+SEPARATOR = '\x00'
+
+def normalize_skill(skill):
+    """Lowercase form used for every comparison."""
+    return str(skill).lower()
+
+class AhoCorasick:
+    """
+    Multi-pattern substring automaton: one pass over a text reports every
+    pattern occurring in it, however many patterns there are.
+    """
+
+    def __init__(self, patterns):
+        # patterns: {pattern: id}; empty patterns cannot be represented
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]
+        for pattern, pattern_id in patterns.items():
+            state = 0
+            for char in pattern:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][char] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                state = next_state
+            self._out[state].append(pattern_id)
+
+        # Breadth-first, so a state's fail target is finished before it
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                self._out[next_state] = self._out[next_state] + self._out[self._fail[next_state]]
+
+    def search(self, text):
+        """Ids of the patterns occurring in text."""
+        found = set()
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if out[state]:
+                found.update(out[state])
+        return found
+
+class SkillIndex:
+    """
+    Precompiled required-skill index over a list of careers.
+
+    A required skill matches a user skill when either contains the other
+    (case-insensitive). Distinct required skills become terms; an
+    Aho-Corasick automaton finds the terms inside each user skill, a scan
+    of all terms joined together finds the terms containing it, and an
+    inverted index from term to careers turns the matched terms into
+    per-career match counts in one pass.
+    """
+
+    def __init__(self, skill_lists):
+        term_ids = {}
+        self.career_terms = []
+        postings = []
+        for position, skills in enumerate(skill_lists):
+            ids = []
+            for skill in skills:
+                term = normalize_skill(skill)
+                term_id = term_ids.get(term)
+                if term_id is None:
+                    term_id = term_ids[term] = len(term_ids)
+                    postings.append([])
+                ids.append(term_id)
+                postings[term_id].append(position)
+            self.career_terms.append(tuple(ids))
+        self.terms = list(term_ids)
+        self.size = len(skill_lists)
+        # A career listing a term twice appears twice, so it counts twice
+        self.postings = [np.asarray(p, dtype=np.int32) for p in postings]
+        self._empty_term = term_ids.get('')
+        self._automaton = AhoCorasick({t: i for t, i in term_ids.items() if t})
+        self._haystack = SEPARATOR.join(self.terms)
+        self._offsets = []
+        offset = 0
+        for term in self.terms:
+            self._offsets.append(offset)
+            offset += len(term) + len(SEPARATOR)
+
+    def _terms_containing(self, skill):
+        if SEPARATOR in skill:
+            return {i for i, term in enumerate(self.terms) if skill in term}
+        found = set()
+        haystack = self._haystack
+        start = haystack.find(skill)
+        while start != -1:
+            term_id = bisect_right(self._offsets, start) - 1
+            found.add(term_id)
+            # Resume at the next term; later hits in this one add nothing
+            next_term = term_id + 1
+            if next_term >= len(self._offsets):
+                break
+            start = haystack.find(skill, self._offsets[next_term])
+        return found
+
+    def matched_terms(self, user_skills):
+        """
+        Ids of the terms matching at least one of the user's skills.
+        """
+        names = {normalize_skill(s) for s in user_skills}
+        if not names:
+            return set()
+        if '' in names:
+            # An empty user skill is contained in every term
+            return set(range(len(self.terms)))
+        matched = set()
+        if self._empty_term is not None:
+            # ...and an empty term in every user skill
+            matched.add(self._empty_term)
+        for name in names:
+            matched |= self._automaton.search(name)
+            matched |= self._terms_containing(name)
+        return matched
+
+    def match_counts(self, matched):
+        """
+        Number of matched required skills per career, as an array.
+        """
+        if not matched:
+            return np.zeros(self.size, dtype=np.int64)
+        hits = np.concatenate([self.postings[term_id] for term_id in matched])
+        return np.bincount(hits, minlength=self.size)
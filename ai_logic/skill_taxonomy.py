@@ -0,0 +1,80 @@
+# Skill taxonomy shared by the career predictor and the CV skill extractor
+
+DOMAIN_SKILLS = {
+    'Engineering': [
+        'programming', 'cad', 'engineering design', 'mechanical', 'electrical', 'civil',
+        'structural analysis', 'thermodynamics', 'circuit design', 'manufacturing',
+        'project management', 'technical documentation', 'solidworks', 'autocad',
+        'matlab', 'simulation', 'prototyping', 'quality control', 'safety standards'
+    ],
+    'Information Technology': [
+        'python', 'javascript', 'java', 'sql', 'react', 'node.js', 'aws', 'docker',
+        'kubernetes', 'linux', 'networking', 'cybersecurity', 'devops', 'ci/cd',
+        'database', 'api', 'web development', 'mobile development', 'cloud computing',
+        'troubleshooting', 'system administration', 'it support'
+    ],
+    'Healthcare': [
+        'patient care', 'medical knowledge', 'healthcare', 'nursing', 'medical terminology',
+        'emergency response', 'medical documentation', 'healthcare administration',
+        'clinical skills', 'patient assessment', 'medication administration',
+        'healthcare regulations', 'medical research', 'laboratory techniques'
+    ],
+    'Education': [
+        'teaching', 'curriculum development', 'classroom management', 'lesson planning',
+        'student assessment', 'educational technology', 'instructional design',
+        'student counseling', 'educational leadership', 'training', 'mentoring',
+        'academic advising', 'education policy'
+    ],
+    'Finance': [
+        'financial analysis', 'accounting', 'excel', 'financial modeling', 'budgeting',
+        'forecasting', 'investment', 'banking', 'taxation', 'auditing', 'risk management',
+        'financial reporting', 'quickbooks', 'sap', 'compliance', 'portfolio management'
+    ],
+    'Marketing': [
+        'digital marketing', 'seo', 'social media', 'content creation', 'brand management',
+        'market research', 'analytics', 'advertising', 'campaign management',
+        'email marketing', 'content strategy', 'public relations', 'customer acquisition',
+        'google analytics', 'marketing automation'
+    ],
+    'Design': [
+        'ui/ux design', 'graphic design', 'adobe creative suite', 'figma', 'sketch',
+        'typography', 'layout design', 'brand identity', 'web design', 'print design',
+        'motion graphics', '3d modeling', 'user research', 'prototyping', 'wireframing'
+    ],
+    'Sales': [
+        'sales', 'negotiation', 'customer relationship', 'account management',
+        'business development', 'lead generation', 'client acquisition', 'presentation',
+        'persuasion', 'closing deals', 'sales strategy', 'territory management',
+        'customer service', 'relationship building'
+    ],
+    'Legal': [
+        'legal research', 'contract law', 'litigation', 'legal writing', 'compliance',
+        'corporate law', 'intellectual property', 'legal documentation', 'case management',
+        'regulatory compliance', 'dispute resolution', 'legal advice', 'paralegal'
+    ],
+    'Operations / Management': [
+        'operations management', 'project management', 'process improvement',
+        'supply chain', 'logistics', 'team leadership', 'strategic planning',
+        'budget management', 'performance management', 'quality assurance',
+        'inventory management', 'six sigma', 'lean manufacturing', 'business operations'
+    ]
+}
+
+SOFT_SKILLS = [
+    'communication', 'leadership', 'teamwork', 'problem solving', 'critical thinking',
+    'creativity', 'adaptability', 'time management', 'project management',
+    'analytical skills', 'research', 'presentation', 'negotiation', 'collaboration'
+]
+
+# Too generic to mean the skill when found in a CV ('training' is also a
+# section heading); they still count when a user enters them
+NOT_EXTRACTED = {'training', 'research', 'presentation', 'sap'}
+
+def all_skills():
+    """Every taxonomy skill once, domain skills first."""
+    skills = [skill for domain in DOMAIN_SKILLS.values() for skill in domain] + SOFT_SKILLS
+    return list(dict.fromkeys(skills))
+
+def extractable_skills():
+    """Taxonomy skills the CV extractor looks for."""
+    return [skill for skill in all_skills() if skill not in NOT_EXTRACTED]
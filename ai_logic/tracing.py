@@ -0,0 +1,178 @@
+import contextvars
+import threading
+import functools
+import time
+import json
+import os
+import logging
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+import numpy as np
+
+logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
+
+_current = contextvars.ContextVar('trace', default=None)
+
+class Span:
+    """
+    One timed stage of a trace. Attributes (document counts, cache hit or
+    miss) can be added while the stage runs with set().
+    """
+    __slots__ = ('record',)
+
+    def __init__(self, record):
+        self.record = record
+
+    def set(self, **attrs):
+        if self.record is not None:
+            self.record.update(attrs)
+
+_NO_SPAN = Span(None)
+
+class Trace:
+    def __init__(self, name, attrs):
+        self.name = name
+        self.attrs = attrs
+        self.spans = []
+        self.depth = 0
+        self.started_at = datetime.utcnow().isoformat(timespec='seconds')
+        self.start = time.perf_counter()
+
+    def to_dict(self, duration_ms):
+        return {'name': self.name, 'started_at': self.started_at, 'ms': duration_ms,
+                'attrs': self.attrs, 'spans': self.spans}
+
+class Tracer:
+    """
+    Keeps the most recent traces in a bounded ring buffer and optionally
+    appends each one as a JSON line to sink_path. Buffers are per process;
+    point every process at the same sink to see them all.
+    """
+
+    def __init__(self, capacity=500, sink_path=None):
+        self.buffer = deque(maxlen=capacity)
+        self.sink_path = sink_path
+        self._lock = threading.Lock()
+        if sink_path:
+            os.makedirs(os.path.dirname(os.path.abspath(sink_path)), exist_ok=True)
+
+    def record(self, trace):
+        with self._lock:
+            self.buffer.append(trace)
+            if self.sink_path:
+                try:
+                    with open(self.sink_path, 'a') as f:
+                        f.write(json.dumps(trace, default=str) + '\n')
+                except OSError as e:
+                    logging.warning(f"Could not write trace: {str(e)}")
+
+    def traces(self, name=None):
+        with self._lock:
+            traces = list(self.buffer)
+        return [t for t in traces if name is None or t['name'] in name]
+
+    def slowest(self, name=None, threshold_ms=0, limit=20):
+        """
+        Slowest recent traces at or above threshold_ms, slowest first.
+        """
+        slow = [t for t in self.traces(name) if t['ms'] >= threshold_ms]
+        return sorted(slow, key=lambda t: t['ms'], reverse=True)[:limit]
+
+    def stage_percentiles(self, name=None):
+        """
+        Per-stage duration percentiles over the buffer:
+        {stage: {'count', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms'}}, plus
+        a 'total' entry for whole traces.
+        """
+        traces = self.traces(name)
+        durations = {}
+        for t in traces:
+            durations.setdefault('total', []).append(t['ms'])
+            for s in t['spans']:
+                durations.setdefault(s['stage'], []).append(s['ms'])
+        stats = {}
+        for stage, values in durations.items():
+            values = np.asarray(values)
+            stats[stage] = {
+                'count': len(values),
+                'p50_ms': round(float(np.percentile(values, 50)), 2),
+                'p95_ms': round(float(np.percentile(values, 95)), 2),
+                'p99_ms': round(float(np.percentile(values, 99)), 2),
+                'max_ms': round(float(values.max()), 2),
+            }
+        return stats
+
+_tracer = Tracer()
+
+def configure_tracing(capacity=500, sink_path=None):
+    global _tracer
+    _tracer = Tracer(capacity=capacity, sink_path=sink_path)
+    return _tracer
+
+def get_tracer():
+    return _tracer
+
+@contextmanager
+def trace(name, **attrs):
+    """
+    Record everything inside the block as one trace. Nested traces are
+    folded into the outer one.
+    """
+    if _current.get() is not None:
+        with span(name, **attrs) as s:
+            yield s
+        return
+    current = Trace(name, attrs)
+    token = _current.set(current)
+    try:
+        yield Span(current.attrs)
+    except BaseException as e:
+        current.attrs['error'] = type(e).__name__
+        raise
+    finally:
+        _current.reset(token)
+        duration_ms = round((time.perf_counter() - current.start) * 1000, 3)
+        _tracer.record(current.to_dict(duration_ms))
+
+def traced(name):
+    """
+    Decorator form of trace().
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with trace(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+@contextmanager
+def span(stage, **attrs):
+    """
+    Time one stage of the current trace. Outside a trace this does nothing,
+    so library code can be instrumented unconditionally.
+    """
+    current = _current.get()
+    if current is None:
+        yield _NO_SPAN
+        return
+    record = {'stage': stage, 'depth': current.depth, **attrs}
+    # Appended up front so spans stay in start order
+    current.spans.append(record)
+    start = time.perf_counter()
+    current.depth += 1
+    try:
+        yield Span(record)
+    finally:
+        current.depth -= 1
+        record['offset_ms'] = round((start - current.start) * 1000, 3)
+        record['ms'] = round((time.perf_counter() - start) * 1000, 3)
+
+def annotate(**attrs):
+    """
+    Attach attributes to the current trace, if any.
+    """
+    current = _current.get()
+    if current is not None:
+        current.attrs.update(attrs)
@@ -0,0 +1,550 @@
+import numpy as np
+import threading
+import fcntl
+import json
+import uuid
+import os
+import logging
+from contextlib import contextmanager
+from .matcher import normalize_rows, normalize_query, top_k, as_matrix
+from .quantize import VectorCodec
+from .tracing import span
+
+logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Approximate scores may overshoot or undershoot the exact ones by roughly
+# this much, so re-ranking shortlists with a lowered threshold
+RERANK_MARGIN = 0.05
+
+# Smallest number of rows reserved when the storage has to grow
+MIN_CAPACITY = 1024
+
+# Row arrays kept in capacity-sized, memory-mapped files
+STORAGE_ARRAYS = ('ids', 'vectors', 'scales')
+
+# Index directories whose lock the current thread holds
+_held = threading.local()
+
+@contextmanager
+def lock_directory(directory):
+    """
+    Exclusive lock on an index directory, across processes and threads.
+    Writers hold it from loading the latest saved copy until their save is
+    published, so concurrent updates cannot overwrite each other.
+    Re-entrant within a thread.
+    """
+    directory = os.path.abspath(directory)
+    held = getattr(_held, 'directories', None)
+    if held is None:
+        held = _held.directories = set()
+    if directory in held:
+        yield
+        return
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, 'lock'), 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        held.add(directory)
+        try:
+            yield
+        finally:
+            held.discard(directory)
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+def holds_lock(directory):
+    return os.path.abspath(directory) in getattr(_held, 'directories', ())
+
+def saved_stamp(directory):
+    """
+    Identifies the copy published in a directory, None if there is none.
+    Every save replaces meta.json with a new file, so its inode and
+    mtime change together.
+    """
+    try:
+        stat = os.stat(os.path.join(directory, 'meta.json'))
+    except FileNotFoundError:
+        return None
+    return (stat.st_ino, stat.st_mtime_ns)
+
+def _saved_files(meta, directory):
+    if 'files' in meta:
+        return meta['files']
+    # Indexes saved before meta.json named its files; the oldest list no arrays
+    names = meta.get('arrays', ['ids', 'vectors', 'scales', 'pca_mean', 'pca_components'])
+    return {name: f'{name}.npy' for name in names if os.path.exists(os.path.join(directory, f'{name}.npy'))}
+
+def _remove_unused(directory, files):
+    # Processes that mapped an older copy keep it: unlinked files live on
+    # until they are unmapped
+    keep = set(files.values())
+    for entry in os.listdir(directory):
+        if (entry.endswith('.npy') and entry not in keep) or entry.endswith('.tmp'):
+            try:
+                os.remove(os.path.join(directory, entry))
+            except FileNotFoundError:
+                pass
+
+def _grow(array, capacity):
+    grown = np.zeros((capacity,) + array.shape[1:], dtype=array.dtype)
+    grown[:len(array)] = array
+    return grown
+
+class FlatIndex:
+    """
+    Brute-force cosine-similarity search. Vectors are stored unit-normalized
+    in a contiguous matrix next to their document ids and names.
+
+    precision/pca_dim select a compact encoding (see VectorCodec). The PCA
+    projection is fitted on the first batch added to an empty index; an
+    index grown from smaller batches is fitted on its stored vectors and
+    re-encoded once it holds pca_dim of them. Compact scores are
+    approximate; pass a rerank callback to search() to re-score the
+    shortlist at full precision.
+
+    Storage is append-only. Rows live in arrays with spare capacity, and
+    removed or replaced rows are only marked in a tombstone bitmap until
+    compact() rewrites them. Saved indexes are opened memory-mapped, so
+    every process on a host shares one copy through the page cache and
+    loading costs next to nothing. Shared files are only written past the
+    rows any saved copy uses, and only under lock_directory().
+    """
+    kind = 'flat'
+
+    def __init__(self, dim, precision='float32', pca_dim=None):
+        self.dim = dim
+        self.codec = VectorCodec(precision, pca_dim)
+        self.count = 0
+        self.ids = np.empty(0, dtype=np.int64)
+        self.vectors = np.empty((0, dim), dtype=self.codec.dtype)
+        self.scales = np.empty(0, dtype=np.float32) if precision == 'int8' else None
+        self.deleted = np.zeros(0, dtype=bool)
+        self.names = []
+        self._rows = {}
+        # Directory and files the storage arrays are mapped from (None: held in memory)
+        self._directory = None
+        self._files = None
+        self._writable = False
+        self._stamp = None
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._rows)
+
+    @property
+    def capacity(self):
+        return len(self.ids)
+
+    @property
+    def stamp(self):
+        """saved_stamp() of the copy this index was loaded from or last saved as."""
+        return self._stamp
+
+    @property
+    def tombstones(self):
+        return self.count - len(self._rows)
+
+    def add(self, ids, vectors, names):
+        """
+        Insert or replace documents. Invalid (zero or non-finite) vectors are skipped.
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        vectors, valid = normalize_rows(np.asarray(vectors, dtype=np.float32).reshape(len(ids), self.dim))
+        names = [name for name, ok in zip(names, valid) if ok]
+        ids, vectors = ids[valid], vectors[valid]
+        with self._lock:
+            self._remove(ids)
+            if len(ids) == 0:
+                return
+            if self.count == 0 and self.codec.pca_dim and self.codec.components is None:
+                self.codec.fit(vectors)
+                self._detach()
+                self.vectors = np.empty((0, self.codec.code_dim(self.dim)), dtype=self.codec.dtype)
+            codes, scales = self.codec.encode(vectors)
+            start, end = self.count, self.count + len(ids)
+            self._reserve(end)
+            self.vectors[start:end] = codes
+            self.ids[start:end] = ids
+            if scales is not None:
+                self.scales[start:end] = scales
+            self.deleted = np.concatenate([self.deleted, np.zeros(len(ids), dtype=bool)])
+            self.names.extend(names)
+            self._rows.update(zip(ids.tolist(), range(start, end)))
+            self.count = end
+            if self._needs_fit():
+                self._fit_stored()
+            else:
+                self._added(start, end)
+
+    def _needs_fit(self):
+        codec = self.codec
+        return bool(codec.pca_dim) and codec.components is None and codec.pca_dim < self.dim \
+            and len(self) >= codec.pca_dim
+
+    def _fit_stored(self):
+        """
+        Fit the PCA projection on the live stored vectors and re-encode
+        them, dropping tombstoned rows on the way.
+        """
+        live = np.flatnonzero(~self.deleted)
+        scales = self.scales[:self.count][live] if self.scales is not None else None
+        vectors = self.codec.decode(self.vectors[:self.count][live], scales)
+        self.codec.fit(vectors)
+        codes, scales = self.codec.encode(vectors)
+        capacity = max(MIN_CAPACITY, len(live) + len(live) // 4)
+        self.ids = _grow(self.ids[:self.count][live], capacity)
+        self.vectors = _grow(codes, capacity)
+        self.scales = _grow(scales, capacity) if scales is not None else None
+        self.names = [self.names[i] for i in live]
+        self.count = len(live)
+        self.deleted = np.zeros(self.count, dtype=bool)
+        self._rows = dict(zip(self.ids[:self.count].tolist(), range(self.count)))
+        self._directory = None
+        self._writable = False
+        self._recoded()
+        logging.debug(f"Fitted PCA on {self.count} stored vectors of {self.kind} index")
+
+    def _reserve(self, needed):
+        """
+        Make room for `needed` rows. No saved copy uses the mapped rows
+        past count, so the lock holder may fill them in place while it works
+        on the latest copy; otherwise we continue on a private copy and the
+        next save() writes fresh files.
+        """
+        if needed <= self.capacity:
+            if self._directory is not None and not self._writable:
+                if holds_lock(self._directory) and self._stamp == saved_stamp(self._directory):
+                    self._map(self._directory, self._files, 'r+')
+                else:
+                    self._detach()
+            return
+        capacity = max(MIN_CAPACITY, 2 * self.capacity, needed)
+        self.ids = _grow(self.ids[:self.count], capacity)
+        self.vectors = _grow(self.vectors[:self.count], capacity)
+        if self.scales is not None:
+            self.scales = _grow(self.scales[:self.count], capacity)
+        self._directory = None
+        self._writable = False
+
+    def _detach(self):
+        # Copy mapped storage into memory before changing it
+        if self._directory is None:
+            return
+        self.ids = np.array(self.ids)
+        self.vectors = np.array(self.vectors)
+        self.scales = np.array(self.scales) if self.scales is not None else None
+        self._directory = None
+        self._writable = False
+
+    def remove(self, ids):
+        with self._lock:
+            self._remove(np.asarray(list(ids), dtype=np.int64))
+
+    def _remove(self, ids):
+        rows = [self._rows.pop(doc_id) for doc_id in ids.tolist() if doc_id in self._rows]
+        if rows:
+            self.deleted[rows] = True
+
+    def compact(self):
+        """
+        Rewrite storage without tombstoned rows.
+        """
+        with self._lock:
+            live = np.flatnonzero(~self.deleted)
+            capacity = max(MIN_CAPACITY, len(live) + len(live) // 4)
+            self.ids = _grow(self.ids[:self.count][live], capacity)
+            self.vectors = _grow(self.vectors[:self.count][live], capacity)
+            if self.scales is not None:
+                self.scales = _grow(self.scales[:self.count][live], capacity)
+            self.names = [self.names[i] for i in live]
+            self.count = len(live)
+            self.deleted = np.zeros(self.count, dtype=bool)
+            self._rows = dict(zip(self.ids[:self.count].tolist(), range(self.count)))
+            self._directory = None
+            self._writable = False
+            self._compacted(live)
+            logging.debug(f"Compacted {self.kind} index to {self.count} rows")
+
+    def _added(self, start, end):
+        pass
+
+    def _compacted(self, live):
+        pass
+
+    def _recoded(self):
+        pass
+
+    def _candidates(self, query):
+        """Row positions worth scoring for this query; None means all rows."""
+        return None
+
+    def search(self, query_embedding, k=None, min_score=None, rerank=None, rerank_factor=4):
+        """
+        Return [(doc_id, name, score)] ordered by descending score.
+
+        With a compact encoding, rerank(ids) may return the full-precision
+        vectors of the given document ids (None for unknown ones); the best
+        k * rerank_factor approximate hits are then re-scored exactly.
+        """
+        query = normalize_query(query_embedding)
+        with self._lock, span('index_search', kind=self.kind, precision=self.codec.precision) as s:
+            if query is None or len(self._rows) == 0:
+                return []
+            code_query = self.codec.project(query)
+            rows = self._candidates(code_query)
+            scales = self.scales[:self.count] if self.scales is not None else None
+            scores = self.codec.score(self.vectors[:self.count], scales, code_query, rows)
+            np.clip(scores, 0.0, 1.0, out=scores)
+            if self.tombstones:
+                # Dead rows sink below every live score and are dropped below
+                scores[self.deleted if rows is None else self.deleted[rows]] = -1.0
+            if rerank is None or self.codec.exact:
+                indices, top_scores = top_k(scores, k=k, min_score=min_score)
+            else:
+                indices, top_scores = top_k(scores, k=k * rerank_factor if k else None,
+                                            min_score=min_score - RERANK_MARGIN if min_score is not None else None)
+            live = top_scores >= 0
+            indices, top_scores = indices[live], top_scores[live]
+            if rows is not None:
+                indices = rows[indices]
+            logging.debug(f"{self.kind} index scored {len(scores)} of {self.count} vectors")
+            hits = [(int(self.ids[i]), self.names[i]) for i in indices]
+            s.set(docs=len(self._rows), scored=len(scores), kept=len(hits))
+
+        if rerank is None or self.codec.exact:
+            return [(doc_id, name, float(s)) for (doc_id, name), s in zip(hits, top_scores)]
+        # Exact scores for the shortlist, outside the lock: rerank may hit the database
+        if not hits:
+            return []
+        with span('rerank', docs=len(hits)) as s:
+            full, valid = normalize_rows(as_matrix(rerank([doc_id for doc_id, _ in hits])))
+            hits = [hit for hit, ok in zip(hits, valid) if ok]
+            if not hits:
+                return []
+            exact = full[valid] @ query
+            np.clip(exact, 0.0, 1.0, out=exact)
+            indices, top_scores = top_k(exact, k=k, min_score=min_score)
+            s.set(kept=len(indices))
+        return [(hits[i][0], hits[i][1], float(s)) for i, s in zip(indices, top_scores)]
+
+    def _meta(self):
+        return {'kind': self.kind, 'dim': self.dim, 'params': self.codec.params()}
+
+    def save(self, directory):
+        """
+        Publish the index. Arrays are written under fresh file names and
+        meta.json, which names them, is replaced last in one atomic step, so
+        readers always see one complete save. Storage arrays mapped from the
+        published copy are flushed and kept instead of rewritten.
+
+        Saving takes lock_directory(), but only holding it from loading the
+        latest copy through save keeps another writer's changes.
+        """
+        with self._lock, lock_directory(directory):
+            arrays = self._arrays()
+            files = {}
+            if self._directory == directory and self._stamp == saved_stamp(directory):
+                for name in STORAGE_ARRAYS:
+                    if name in arrays:
+                        if self._writable:
+                            arrays[name].flush()
+                        files[name] = self._files[name]
+            token = uuid.uuid4().hex[:12]
+            for name, array in arrays.items():
+                if name not in files:
+                    files[name] = f'{name}.{token}.npy'
+                    np.save(os.path.join(directory, files[name]), array)
+            meta = self._meta()
+            meta['names'] = self.names
+            meta['count'] = self.count
+            meta['files'] = files
+            tmp = os.path.join(directory, f'meta.{token}.tmp')
+            with open(tmp, 'w') as f:
+                json.dump(meta, f)
+            os.replace(tmp, os.path.join(directory, 'meta.json'))
+            _remove_unused(directory, files)
+            # Read-only again: the next writer must hold the lock to append
+            self._map(directory, files, 'r')
+            self._stamp = saved_stamp(directory)
+
+    def _arrays(self):
+        arrays = {'ids': self.ids, 'vectors': self.vectors, 'deleted': np.packbits(self.deleted)}
+        if self.scales is not None:
+            arrays['scales'] = self.scales
+        arrays.update(self.codec.arrays())
+        return arrays
+
+    def _map(self, directory, files, mode):
+        def load(name):
+            return np.load(os.path.join(directory, files[name]), mmap_mode=mode)
+
+        self.ids = load('ids')
+        self.vectors = load('vectors')
+        self.scales = load('scales') if self.scales is not None else None
+        self._directory = directory
+        self._files = files
+        self._writable = mode == 'r+'
+
+    def _restore(self, meta, directory):
+        files = _saved_files(meta, directory)
+
+        def load(name):
+            return np.load(os.path.join(directory, files[name])) if name in files else None
+
+        if 'scales' not in files:
+            self.scales = None
+        self._map(directory, files, 'r')
+        self.count = meta.get('count', len(self.ids))
+        deleted = load('deleted')
+        if deleted is None:
+            self.deleted = np.zeros(self.count, dtype=bool)
+        else:
+            self.deleted = np.unpackbits(deleted, count=self.count).astype(bool)
+        self.codec.restore({name: load(name) for name in ('pca_mean', 'pca_components')})
+        self.names = meta['names']
+        live = np.flatnonzero(~self.deleted)
+        self._rows = dict(zip(self.ids[live].tolist(), live.tolist()))
+
+    @staticmethod
+    def load(directory, attempts=3):
+        """
+        Open a saved index of any kind; returns None if nothing is saved there.
+        """
+        for attempt in range(attempts):
+            stamp = saved_stamp(directory)
+            if stamp is None:
+                return None
+            try:
+                with open(os.path.join(directory, 'meta.json')) as f:
+                    meta = json.load(f)
+                index = create_index(meta['kind'], meta['dim'], **meta.get('params', {}))
+                index._restore(meta, directory)
+            except FileNotFoundError:
+                # A newer copy was published and these files removed meanwhile
+                if attempt == attempts - 1:
+                    raise
+                continue
+            index._stamp = stamp
+            return index
+
+class IVFIndex(FlatIndex):
+    """
+    Inverted-file index. Vectors are clustered around nlist k-means
+    centroids; a query only scores the rows of its nprobe closest clusters.
+    Until the index holds train_size vectors it behaves like FlatIndex.
+    Clustering works on the (decoded) compact vectors.
+    """
+    kind = 'ivf'
+
+    def __init__(self, dim, nlist=None, nprobe=8, train_size=4096, seed=0, precision='float32', pca_dim=None):
+        super().__init__(dim, precision=precision, pca_dim=pca_dim)
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.train_size = train_size
+        self.seed = seed
+        self.centroids = None
+        self.assign = np.empty(0, dtype=np.int32)
+        self._trained_on = 0
+        self._order = None
+        self._offsets = None
+
+    def _added(self, start, end):
+        if self.centroids is None:
+            if len(self) >= self.train_size:
+                self.train()
+            return
+        if len(self) > 4 * self._trained_on:
+            self.train()
+            return
+        scales = self.scales[start:end] if self.scales is not None else None
+        self.assign = np.concatenate([self.assign, self._nearest(self.vectors[start:end], scales)])
+        self._order = None
+
+    def _compacted(self, live):
+        if self.centroids is not None:
+            self.assign = self.assign[live]
+            self._order = None
+
+    def _recoded(self):
+        # Centroids live in the old code space
+        self.centroids = None
+        self.assign = np.empty(0, dtype=np.int32)
+        self._trained_on = 0
+        self._order = None
+        if len(self) >= self.train_size:
+            self.train()
+
+    def train(self, iterations=10):
+        """
+        Fit spherical k-means centroids on the live vectors and reassign every row.
+        """
+        with self._lock:
+            live = np.flatnonzero(~self.deleted)
+            n = len(live)
+            if n == 0:
+                return
+            nlist = self.nlist or max(1, int(np.sqrt(n)))
+            nlist = min(nlist, n)
+            rng = np.random.default_rng(self.seed)
+            sample_size = min(n, 256 * nlist)
+            picks = np.sort(live[rng.choice(n, sample_size, replace=False)])
+            sample = self.codec.decode(self.vectors[picks], self.scales[picks] if self.scales is not None else None)
+            centroids = sample[rng.choice(sample_size, nlist, replace=False)].copy()
+            for _ in range(iterations):
+                labels = np.argmax(sample @ centroids.T, axis=1)
+                sums = np.zeros_like(centroids)
+                np.add.at(sums, labels, sample)
+                centroids, valid = normalize_rows(sums)
+                # Empty clusters restart from a random sample point
+                if not valid.all():
+                    centroids[~valid] = sample[rng.choice(sample_size, int((~valid).sum()))]
+            self.centroids = centroids
+            scales = self.scales[:self.count] if self.scales is not None else None
+            self.assign = self._nearest(self.vectors[:self.count], scales)
+            self._trained_on = n
+            self._order = None
+            logging.debug(f"Trained IVF index: {n} vectors, {nlist} lists")
+
+    def _nearest(self, codes, scales, chunk=65536):
+        labels = np.empty(len(codes), dtype=np.int32)
+        for start in range(0, len(codes), chunk):
+            block = self.codec.decode(codes[start:start + chunk],
+                                      scales[start:start + chunk] if scales is not None else None)
+            labels[start:start + chunk] = np.argmax(block @ self.centroids.T, axis=1)
+        return labels
+
+    def _candidates(self, query):
+        if self.centroids is None:
+            return None
+        if self._order is None:
+            self._order = np.argsort(self.assign, kind='stable')
+            self._offsets = np.searchsorted(self.assign[self._order], np.arange(len(self.centroids) + 1))
+        nprobe = min(self.nprobe, len(self.centroids))
+        probe = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+        return np.concatenate([self._order[self._offsets[c]:self._offsets[c + 1]] for c in probe])
+
+    def _meta(self):
+        meta = super()._meta()
+        meta['params'].update({'nlist': self.nlist, 'nprobe': self.nprobe,
+                               'train_size': self.train_size, 'seed': self.seed})
+        meta['trained_on'] = self._trained_on
+        return meta
+
+    def _arrays(self):
+        arrays = super()._arrays()
+        if self.centroids is not None:
+            arrays['centroids'] = self.centroids
+            arrays['assign'] = self.assign
+        return arrays
+
+    def _restore(self, meta, directory):
+        super()._restore(meta, directory)
+        self._trained_on = meta.get('trained_on', 0)
+        if self._trained_on:
+            self.centroids = np.load(os.path.join(directory, self._files['centroids']))
+            self.assign = np.load(os.path.join(directory, self._files['assign']))
+
+INDEX_TYPES = {'flat': FlatIndex, 'ivf': IVFIndex}
+
+def create_index(kind, dim, **params):
+    if kind not in INDEX_TYPES:
+        raise ValueError(f"Unknown vector index kind: {kind}")
+    return INDEX_TYPES[kind](dim, **params)
@@ -1,10 +1,69 @@
-from sentence_transformers import SentenceTransformer
 import numpy as np
+import threading
 import logging
+from .tracing import span
 
 logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
 
-model = SentenceTransformer('all-MiniLM-L6-v2')
+MODEL_NAME = 'all-MiniLM-L6-v2'
+EMBEDDING_DIM = 384
+DEFAULT_BATCH_SIZE = 32
+
+# The model is only built on first use, so importing this module stays
+# cheap for workers that never match documents.
+_model = None
+_model_lock = threading.Lock()
+_settings = {
+    'model_name': MODEL_NAME,
+    'device': None,
+    'num_threads': None,
+    'max_seq_length': None,
+}
+
+def configure(model_name=None, device=None, num_threads=None, max_seq_length=None):
+    """
+    Set model options. The model must produce EMBEDDING_DIM-sized vectors.
+    A model that is already loaded is dropped and rebuilt on next use.
+    """
+    global _model
+    with _model_lock:
+        _settings['model_name'] = model_name or MODEL_NAME
+        _settings['device'] = device
+        _settings['num_threads'] = num_threads
+        _settings['max_seq_length'] = max_seq_length
+        _model = None
+
+def get_model_name():
+    return _settings['model_name']
+
+def get_model():
+    """
+    Return the SentenceTransformer, loading it once in a thread-safe way.
+    """
+    global _model
+    if _model is not None:
+        return _model
+    with _model_lock:
+        if _model is None:
+            with span('model_load', model=_settings['model_name']):
+                from sentence_transformers import SentenceTransformer
+                if _settings['num_threads']:
+                    import torch
+                    torch.set_num_threads(_settings['num_threads'])
+                model = SentenceTransformer(_settings['model_name'], device=_settings['device'])
+                if _settings['max_seq_length']:
+                    model.max_seq_length = _settings['max_seq_length']
+            logging.info(f"Loaded embedding model {_settings['model_name']}")
+            _model = model
+    return _model
+
+def warmup():
+    """
+    Load the model and run one encode so the first real request does not
+    pay for it. Meant for readiness hooks; returns True once ready.
+    """
+    get_model().encode("warmup", convert_to_numpy=True)
+    return True
 
 def get_embedding(text):
     """
@@ -13,14 +72,54 @@ def get_embedding(text):
     """
     if not text.strip():
         logging.warning("Empty text provided for embedding")
-        return np.zeros((384,))
+        return np.zeros((EMBEDDING_DIM,))
     try:
-        embedding = model.encode(text, convert_to_numpy=True)
+        with span('embed', docs=1):
+            embedding = get_model().encode(text, convert_to_numpy=True)
         if not np.isfinite(embedding).all():
             logging.warning("Invalid embedding (non-finite values)")
-            return np.zeros((384,))
+            return np.zeros((EMBEDDING_DIM,))
         logging.debug(f"Embedding shape: {embedding.shape}, sample: {embedding[:5]}")
         return embedding
     except Exception as e:
         logging.error(f"Error generating embedding: {str(e)}")
-        return np.zeros((384,))
\ No newline at end of file
+        return np.zeros((EMBEDDING_DIM,))
+
+def get_embeddings(texts, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Convert many texts into embeddings with batched encode() calls.
+    Texts are grouped by length so each batch pads as little as possible.
+    Returns an (N, 384) float32 array in input order; empty texts and
+    non-finite results become zero vectors, as in get_embedding.
+    """
+    texts = list(texts)
+    embeddings = np.zeros((len(texts), EMBEDDING_DIM), dtype=np.float32)
+
+    order = []
+    for i, text in enumerate(texts):
+        if text.strip():
+            order.append(i)
+        else:
+            logging.warning(f"Empty text provided for embedding (item {i})")
+    order.sort(key=lambda i: len(texts[i]))
+
+    with span('embed', docs=len(order), batch_size=batch_size):
+        for start in range(0, len(order), batch_size):
+            batch = order[start:start + batch_size]
+            try:
+                encoded = get_model().encode([texts[i] for i in batch], batch_size=batch_size, convert_to_numpy=True)
+            except Exception as e:
+                # Isolate the failing item instead of losing the whole batch
+                logging.error(f"Error generating batch embeddings: {str(e)}")
+                encoded = [get_embedding(texts[i]) for i in batch]
+            for i, embedding in zip(batch, encoded):
+                if np.isfinite(embedding).all():
+                    embeddings[i] = embedding
+                else:
+                    logging.warning(f"Invalid embedding (non-finite values) for item {i}")
+
+    logging.debug(f"Embedded {len(order)} of {len(texts)} texts in batches of {batch_size}")
+    return embeddings
+
+# Lets callers holding only get_embedding find the batched variant
+get_embedding.batch = get_embeddings
\ No newline at end of file
@@ -26,6 +26,113 @@ def create_app():
     os.makedirs(app.config['CANDIDATE_UPLOADS'], exist_ok=True)
     os.makedirs(app.config['JOBGIVER_UPLOADS'], exist_ok=True)
     
+    # Derived data (PDF text, vectors) that can always be rebuilt from uploads
+    app.config['CACHE_FOLDER'] = os.path.join(base_dir, '..', 'cache')
+    app.config['EXTRACTION_CACHE_PATH'] = os.path.join(app.config['CACHE_FOLDER'], 'extraction.sqlite3')
+    app.config['EXTRACTION_CACHE_MAX_BYTES'] = 256 * 1024 * 1024
+    
+    # Process pool for parsing many PDFs at once
+    app.config['EXTRACTION_POOL_WORKERS'] = os.cpu_count()
+    app.config['EXTRACTION_POOL_MIN_BATCH'] = 4
+    app.config['EXTRACTION_TIMEOUT'] = 60
+    
+    # Per-domain vector indexes: 'flat' (exact) or 'ivf' (approximate, sublinear)
+    app.config['VECTOR_INDEX_FOLDER'] = os.path.join(app.config['CACHE_FOLDER'], 'indexes')
+    app.config['VECTOR_INDEX_KIND'] = 'flat'
+    app.config['VECTOR_INDEX_PARAMS'] = {'ivf': {'nprobe': 8, 'train_size': 4096}}
+    # Index storage per domain ('default' applies to all others): 'float32',
+    # 'float16' or 'int8', optionally PCA-reduced to pca_dim dimensions.
+    # Compare settings with `flask index-recall` before switching.
+    app.config['VECTOR_INDEX_CODEC'] = {'default': {'precision': 'float32', 'pca_dim': None}}
+    app.config['VECTOR_INDEX_RERANK_FACTOR'] = 4
+    # `flask index-compact` rewrites indexes once this share of rows is deleted
+    app.config['VECTOR_INDEX_COMPACT_THRESHOLD'] = 0.2
+    # Matches shown per request, best first; the results page says when
+    # more passed MIN_MATCH_SCORE. None shows them all
+    app.config['MATCH_TOP_K'] = 100
+    
+    # Background ingestion of uploads (text extraction, embedding, indexing)
+    app.config['INGEST_IN_PROCESS'] = True
+    app.config['INGEST_BATCH_SIZE'] = 16
+    app.config['INGEST_POLL_INTERVAL'] = 5
+    app.config['INGEST_MAX_ATTEMPTS'] = 3
+    app.config['INGEST_RETRY_DELAY'] = 30
+    app.config['INGEST_LEASE_SECONDS'] = 600
+    # Add taxonomy skills found in ingested CVs to their owners' skills
+    app.config['SKILL_EXTRACTION'] = True
+    
+    # Seconds between checks of the career catalog version stamp
+    app.config['CAREER_CATALOG_CHECK_INTERVAL'] = 5
+    
+    # Background deletion of users removed by an admin
+    app.config['DELETION_IN_PROCESS'] = True
+    app.config['DELETION_BATCH_SIZE'] = 500
+    app.config['DELETION_POLL_INTERVAL'] = 5
+    app.config['DELETION_MAX_ATTEMPTS'] = 5
+    app.config['DELETION_RETRY_DELAY'] = 30
+    app.config['DELETION_LEASE_SECONDS'] = 300
+    
+    # Embedding model, loaded lazily on first use (or by `flask warmup`)
+    app.config['EMBEDDING_MODEL_NAME'] = 'all-MiniLM-L6-v2'
+    app.config['EMBEDDING_DEVICE'] = None
+    app.config['EMBEDDING_NUM_THREADS'] = None
+    app.config['EMBEDDING_MAX_SEQ_LENGTH'] = None
+    
+    # Inbox page size; /inbox-data callers may ask for up to the max
+    app.config['INBOX_PAGE_SIZE'] = 50
+    app.config['INBOX_DATA_MAX_LIMIT'] = 100
+    
+    # Live updates (/events SSE, /events/poll long poll). 'local' serves
+    # one process; 'sqlite' shares events between workers on one host.
+    # SSE holds a worker per open tab: use a threaded or async server, or
+    # the long-poll fallback on sync workers.
+    app.config['EVENT_BACKEND'] = 'local'
+    app.config['EVENT_SQLITE_PATH'] = os.path.join(app.config['CACHE_FOLDER'], 'events.sqlite3')
+    app.config['EVENT_BUFFER_SIZE'] = 50
+    app.config['EVENT_KEEPALIVE'] = 15
+    app.config['EVENT_POLL_TIMEOUT'] = 25
+    
+    # Badge counts come from the user_counters table; a TTL (seconds) adds
+    # a per-process cache in front of it
+    app.config['COUNTER_CACHE_TTL'] = 0
+    
+    # Seconds a process buffers dashboard activity counts before writing
+    # them; 0 writes after every commit
+    app.config['ACTIVITY_FLUSH_INTERVAL'] = 10
+    
+    # Notifications are bulk-inserted with the write that caused them.
+    # 'inline' pushes them on commit; 'background' leaves delivery to a
+    # dispatcher thread (or `flask notifications-dispatch`).
+    app.config['NOTIFICATION_DISPATCH'] = 'inline'
+    app.config['NOTIFICATION_DISPATCH_BATCH'] = 500
+    app.config['NOTIFICATION_DISPATCH_INTERVAL'] = 2
+    
+    # Rows per page on the admin dashboard and feedback tables
+    app.config['ADMIN_PAGE_SIZE'] = 25
+    
+    # Match request tracing: recent traces per process, optionally appended
+    # to a JSONL file (e.g. os.path.join(CACHE_FOLDER, 'traces.jsonl'))
+    app.config['TRACE_BUFFER_SIZE'] = 500
+    app.config['TRACE_SINK_PATH'] = None
+    app.config['TRACE_SLOW_MS'] = 1000
+    
+    from ai_logic.extract_text import configure_cache
+    configure_cache(app.config['EXTRACTION_CACHE_PATH'], app.config['EXTRACTION_CACHE_MAX_BYTES'])
+    
+    from ai_logic.extract_pool import configure_pool
+    configure_pool(max_workers=app.config['EXTRACTION_POOL_WORKERS'], timeout=app.config['EXTRACTION_TIMEOUT'])
+    
+    from ai_logic.tracing import configure_tracing
+    configure_tracing(capacity=app.config['TRACE_BUFFER_SIZE'], sink_path=app.config['TRACE_SINK_PATH'])
+    
+    from ai_logic.vectorizer import configure as configure_model
+    configure_model(
+        model_name=app.config['EMBEDDING_MODEL_NAME'],
+        device=app.config['EMBEDDING_DEVICE'],
+        num_threads=app.config['EMBEDDING_NUM_THREADS'],
+        max_seq_length=app.config['EMBEDDING_MAX_SEQ_LENGTH']
+    )
+    
     # Initialize extensions
     db.init_app(app)
     
@@ -54,4 +161,29 @@ def create_app():
     from app.utils.helpers import utility_processor
     app.context_processor(utility_processor)
     
+    from app.utils.counters import init_counters
+    init_counters(app)
+    
+    from app.utils.rollups import init_rollups
+    init_rollups(app)
+    
+    from app.utils.events import init_events
+    init_events(app)
+    
+    from app.utils.notifications import init_notifications
+    init_notifications(app)
+    
+    from app.utils.ingest import init_ingestion
+    init_ingestion(app)
+    
+    from app.utils.deletion import init_deletion
+    init_deletion(app)
+    
+    from app.utils.career_catalog import init_career_catalog
+    init_career_catalog(app)
+    
+    # Maintenance commands (flask <command>)
+    from app.cli import register_commands
+    register_commands(app)
+    
     return app
\ No newline at end of file
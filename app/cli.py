@@ -0,0 +1,173 @@
+import click
+import time
+
+def register_commands(app):
+
+    @app.cli.command('warmup')
+    def warmup_command():
+        """Load the embedding model before serving traffic."""
+        from ai_logic.vectorizer import warmup, get_model_name
+        start = time.time()
+        warmup()
+        click.echo(f"Model {get_model_name()} ready in {time.time() - start:.2f}s")
+
+    @app.cli.command('ingest-worker')
+    @click.option('--once', is_flag=True, help='Drain the queue once and exit.')
+    def ingest_worker_command(once):
+        """Process uploaded CVs and jobs waiting for ingestion."""
+        from app.utils.ingest import process_pending
+        batch_size = app.config['INGEST_BATCH_SIZE']
+        while True:
+            handled = process_pending(batch_size)
+            if handled:
+                click.echo(f"Ingested {handled} documents")
+                continue
+            if once:
+                break
+            time.sleep(app.config['INGEST_POLL_INTERVAL'])
+
+    @app.cli.command('ingest-retry-failed')
+    @click.option('--side', type=click.Choice(['cv', 'job']), default=None)
+    def ingest_retry_failed_command(side):
+        """Queue failed documents for another round of attempts."""
+        from app.utils.ingest import retry_failed
+        click.echo(f"Re-queued {retry_failed(side)} documents")
+
+    @app.cli.command('index-recall')
+    @click.option('--side', type=click.Choice(['cv', 'job']), required=True)
+    @click.option('--domain', required=True)
+    @click.option('-k', default=10, show_default=True)
+    @click.option('--queries', default=100, show_default=True)
+    @click.option('--pca-dim', type=int, multiple=True, help='PCA sizes to try (repeatable).')
+    def index_recall_command(side, domain, k, queries, pca_dim):
+        """Report recall@k of compact index encodings against exact float32 search."""
+        from app.utils.embeddings import DOCUMENT_MODELS, stored_vectors
+        from ai_logic.quantize import VectorCodec, PRECISIONS, recall_at_k
+        model = DOCUMENT_MODELS[side]
+        ids = [doc_id for (doc_id,) in model.query.with_entities(model.id).filter_by(domain=domain, status='ready')]
+        vectors = [v for v in stored_vectors(side, ids) if v is not None]
+        if not vectors:
+            click.echo(f"No stored {side} embeddings for {domain}")
+            return
+        click.echo(f"{len(vectors)} {side} vectors in {domain}, recall@{k} over {queries} queries")
+        for dim in (None,) + pca_dim:
+            for precision in PRECISIONS:
+                report = recall_at_k(vectors, VectorCodec(precision, dim), k=k, queries=queries,
+                                     rerank_factor=app.config['VECTOR_INDEX_RERANK_FACTOR'])
+                click.echo(f"  {precision:8} pca={str(dim or '-'):5} {report['bytes_per_vector']:5d} B/vector  "
+                           f"recall={report['recall']:.3f}  reranked={report['recall_reranked']:.3f}")
+
+    @app.cli.command('index-compact')
+    @click.option('--threshold', type=float, default=None,
+                  help='Deleted share of rows that triggers a rewrite (default: VECTOR_INDEX_COMPACT_THRESHOLD).')
+    def index_compact_command(threshold):
+        """Drop deleted rows from the memory-mapped vector indexes."""
+        from app.utils.vector_indexes import compact_indexes
+        if threshold is None:
+            threshold = app.config['VECTOR_INDEX_COMPACT_THRESHOLD']
+        compacted = compact_indexes(threshold)
+        for directory, live, dropped in compacted:
+            click.echo(f"{directory}: {live} rows kept, {dropped} dropped")
+        click.echo(f"Compacted {len(compacted)} indexes")
+
+    @app.cli.command('db-migrate')
+    @click.option('--dry-run', is_flag=True, help='Print the SQL and query plans without changing anything.')
+    def db_migrate_command(dry_run):
+        """Apply pending schema migrations (indexes, unique constraints)."""
+        from app import db
+        from app.utils.migrations import migrate, preview_migration, explain_hot_queries, MigrationError
+        try:
+            if dry_run:
+                results, before, after = preview_migration()
+            else:
+                results, before, after = migrate(), None, None
+        except MigrationError as e:
+            raise click.ClickException(str(e))
+        for version, name, statements in results:
+            click.echo(f"{'Would apply' if dry_run else 'Applied'} {version:04d} {name}")
+            for sql in statements:
+                click.echo(f"  {sql.strip()};")
+        if not results:
+            click.echo("Schema is up to date")
+
+        def echo_plans(title, plans):
+            click.echo(title)
+            for label, rows in plans:
+                click.echo(f"  {label}")
+                for row in rows:
+                    click.echo("    " + "  ".join(f"{k}={v}" for k, v in row.items() if v is not None))
+
+        if not dry_run:
+            echo_plans("Query plans:", explain_hot_queries())
+        elif not results:
+            echo_plans("Query plans:", before)
+        elif after is None:
+            echo_plans(f"Current query plans, before migrating ({db.engine.dialect.name} cannot roll back DDL, "
+                       "so plans after migrating are not shown):", before)
+        else:
+            echo_plans("Current query plans:", before)
+            echo_plans("Query plans after migrating (applied and rolled back):", after)
+
+    @app.cli.command('counters-reconcile')
+    @click.option('--dry-run', is_flag=True, help='Report drift without fixing it.')
+    @click.option('--batch-size', default=1000, show_default=True)
+    def counters_reconcile_command(dry_run, batch_size):
+        """Recompute per-user badge counters from the source tables, adding missing rows."""
+        from app.utils.counters import reconcile
+        drift = reconcile(batch_size=batch_size, dry_run=dry_run)
+        for user_id, name, stored, actual in drift:
+            click.echo(f"  user {user_id}: {name} {stored} -> {actual}")
+        click.echo(f"{'Found' if dry_run else 'Fixed'} {len(drift)} drifted counters "
+                   f"across {len({d[0] for d in drift})} users")
+
+    @app.cli.command('notifications-dispatch')
+    @click.option('--once', is_flag=True, help='Deliver what is pending and exit.')
+    def notifications_dispatch_command(once):
+        """Deliver notifications queued in 'background' dispatch mode."""
+        from app.utils.notifications import dispatch_pending
+        batch_size = app.config['NOTIFICATION_DISPATCH_BATCH']
+        while True:
+            delivered = dispatch_pending(batch_size)
+            if delivered:
+                click.echo(f"Delivered {delivered} notifications")
+                continue
+            if once:
+                break
+            time.sleep(app.config['NOTIFICATION_DISPATCH_INTERVAL'])
+
+    @app.cli.command('deletion-worker')
+    @click.option('--once', is_flag=True, help='Run the queued deletion jobs and exit.')
+    def deletion_worker_command(once):
+        """Delete users queued for removal by an admin."""
+        from app.utils.deletion import process_pending
+        batch_size = app.config['DELETION_BATCH_SIZE']
+        while True:
+            if process_pending(batch_size):
+                continue
+            if once:
+                break
+            time.sleep(app.config['DELETION_POLL_INTERVAL'])
+
+    @app.cli.command('deletion-retry-failed')
+    def deletion_retry_failed_command():
+        """Queue failed deletion jobs for another round of attempts."""
+        from app.utils.deletion import retry_failed
+        click.echo(f"Re-queued {retry_failed()} deletion jobs")
+
+    @app.cli.command('career-catalog-bump')
+    def career_catalog_bump_command():
+        """Make every process reload the career catalog after editing career_paths by hand."""
+        from app import db
+        from app.utils.career_catalog import bump_version, current_version
+        bump_version()
+        db.session.commit()
+        click.echo(f"Career catalog is now version {current_version()}")
+
+    @app.cli.command('skills-extract')
+    @click.option('--batch-size', default=100, show_default=True)
+    def skills_extract_command(batch_size):
+        """Add taxonomy skills found in every existing CV to their owners' skills."""
+        from app.utils.skills import backfill_cv_skills
+        start = time.time()
+        scanned, added = backfill_cv_skills(batch_size=batch_size)
+        click.echo(f"Scanned {scanned} CVs in {time.time() - start:.1f}s, added {added} skills")
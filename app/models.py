@@ -10,6 +10,11 @@ class User(db.Model):
     address = db.Column(db.Text)
     company_name = db.Column(db.String(100))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Set while the account waits for background deletion
+    locked_at = db.Column(db.DateTime)
+    __table_args__ = (
+        db.UniqueConstraint('username', name='unique_username'),
+    )
 
 class CandidateCV(db.Model):
     __tablename__ = 'candidate_cvs'
@@ -18,7 +23,16 @@ class CandidateCV(db.Model):
     filename = db.Column(db.String(255), nullable=False)
     upload_date = db.Column(db.DateTime, default=datetime.utcnow)
     domain = db.Column(db.String(100))
+    status = db.Column(db.String(20), default='pending', nullable=False)
+    ingest_attempts = db.Column(db.Integer, default=0, nullable=False)
+    ingest_error = db.Column(db.Text)
+    next_attempt_at = db.Column(db.DateTime)
     user = db.relationship('User', backref='cvs')
+    __table_args__ = (
+        db.Index('idx_cvs_domain_status', 'domain', 'status'),
+        db.Index('idx_cvs_filename', 'filename'),
+        db.Index('idx_cvs_ingest', 'status', 'next_attempt_at'),
+    )
 
 class JobRequirement(db.Model):
     __tablename__ = 'job_requirements'
@@ -27,7 +41,16 @@ class JobRequirement(db.Model):
     filename = db.Column(db.String(255), nullable=False)
     upload_date = db.Column(db.DateTime, default=datetime.utcnow)
     domain = db.Column(db.String(100))
+    status = db.Column(db.String(20), default='pending', nullable=False)
+    ingest_attempts = db.Column(db.Integer, default=0, nullable=False)
+    ingest_error = db.Column(db.Text)
+    next_attempt_at = db.Column(db.DateTime)
     user = db.relationship('User', backref='job_requirements')
+    __table_args__ = (
+        db.Index('idx_jobs_domain_status', 'domain', 'status'),
+        db.Index('idx_jobs_filename', 'filename'),
+        db.Index('idx_jobs_ingest', 'status', 'next_attempt_at'),
+    )
 
 class Feedback(db.Model):
     __tablename__ = 'feedback'
@@ -44,6 +67,9 @@ class Application(db.Model):
     job_id = db.Column(db.Integer, db.ForeignKey('job_requirements.id'), nullable=False)
     applied_at = db.Column(db.DateTime, default=datetime.utcnow)
     status = db.Column(db.String(20), default='pending')
+    __table_args__ = (
+        db.UniqueConstraint('candidate_id', 'job_id', name='unique_application'),
+    )
 
 class Message(db.Model):
     __tablename__ = 'messages'
@@ -59,6 +85,12 @@ class Message(db.Model):
 
     sender = db.relationship('User', foreign_keys=[sender_id])
     receiver = db.relationship('User', foreign_keys=[receiver_id])
+    __table_args__ = (
+        db.Index('idx_messages_receiver_read', 'receiver_id', 'is_read'),
+        db.Index('idx_messages_receiver_sent', 'receiver_id', 'sent_at', 'id'),
+        db.Index('idx_messages_sender_sent', 'sender_id', 'sent_at', 'id'),
+        db.Index('idx_messages_sender_file', 'sender_id', 'message_type', 'file_id', 'receiver_id'),
+    )
 
 class Notification(db.Model):
     __tablename__ = 'notifications'
@@ -70,6 +102,49 @@ class Notification(db.Model):
     related_id = db.Column(db.Integer, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     is_read = db.Column(db.Boolean, default=False)
+    delivered_at = db.Column(db.DateTime)
+    __table_args__ = (
+        db.Index('idx_notifications_user_read', 'user_id', 'is_read'),
+        db.Index('idx_notifications_undelivered', 'delivered_at', 'id'),
+    )
+
+class UserCounter(db.Model):
+    __tablename__ = 'user_counters'
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    unread_messages = db.Column(db.Integer, default=0, nullable=False)
+    saved_jobs = db.Column(db.Integer, default=0, nullable=False)
+    shortlisted_cvs = db.Column(db.Integer, default=0, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class ActivityRollup(db.Model):
+    __tablename__ = 'activity_rollups'
+    day = db.Column(db.Date, primary_key=True)
+    metric = db.Column(db.String(50), primary_key=True)
+    count = db.Column(db.Integer, default=0, nullable=False)
+
+class DeletionJob(db.Model):
+    __tablename__ = 'deletion_jobs'
+    id = db.Column(db.Integer, primary_key=True)
+    # No foreign key: the job outlives the user it deletes
+    user_id = db.Column(db.Integer, nullable=False)
+    username = db.Column(db.String(100), nullable=False)
+    role = db.Column(db.String(20))
+    requested_by = db.Column(db.Integer)
+    status = db.Column(db.String(20), default='pending', nullable=False)
+    stage = db.Column(db.String(30))
+    rows_total = db.Column(db.Integer)
+    rows_deleted = db.Column(db.Integer, default=0, nullable=False)
+    files_removed = db.Column(db.Integer, default=0, nullable=False)
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    error = db.Column(db.Text)
+    next_attempt_at = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+    __table_args__ = (
+        db.Index('idx_deletion_jobs_claim', 'status', 'next_attempt_at'),
+        db.Index('idx_deletion_jobs_user', 'user_id'),
+    )
 
 class Shortlist(db.Model):
     __tablename__ = 'shortlists'
@@ -77,6 +152,9 @@ class Shortlist(db.Model):
     jobgiver_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     cv_id = db.Column(db.Integer, db.ForeignKey('candidate_cvs.id'), nullable=False)
     shortlisted_at = db.Column(db.DateTime, default=datetime.utcnow)
+    __table_args__ = (
+        db.UniqueConstraint('jobgiver_id', 'cv_id', name='unique_shortlist'),
+    )
 
 class SavedJob(db.Model):
     __tablename__ = 'saved_jobs'
@@ -84,6 +162,9 @@ class SavedJob(db.Model):
     candidate_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     job_id = db.Column(db.Integer, db.ForeignKey('job_requirements.id'), nullable=False)
     saved_at = db.Column(db.DateTime, default=datetime.utcnow)
+    __table_args__ = (
+        db.UniqueConstraint('candidate_id', 'job_id', name='unique_save'),
+    )
 
 class CareerPath(db.Model):
     __tablename__ = 'career_paths'
@@ -97,6 +178,12 @@ class CareerPath(db.Model):
     experience_level = db.Column(db.String(50))
     domain = db.Column(db.String(100))
 
+class CatalogVersion(db.Model):
+    __tablename__ = 'catalog_versions'
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, default=0, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
 class UserSkills(db.Model):
     __tablename__ = 'user_skills'
     id = db.Column(db.Integer, primary_key=True)
@@ -104,5 +191,26 @@ class UserSkills(db.Model):
     skill_name = db.Column(db.String(100), nullable=False)
     proficiency_level = db.Column(db.String(50))
     years_experience = db.Column(db.Float)
+    # 'manual' when entered by the user, 'cv' when found in one of their CVs
+    source = db.Column(db.String(20), nullable=False, default='manual')
+    # Deleted by the user; the row stays so CV extraction skips the skill
+    suppressed = db.Column(db.Boolean, nullable=False, default=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    user = db.relationship('User', backref='skills')
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'skill_name', name='unique_user_skill'),
+    )
+
+class DocumentEmbedding(db.Model):
+    __tablename__ = 'document_embeddings'
+    id = db.Column(db.Integer, primary_key=True)
+    doc_type = db.Column(db.String(10), nullable=False)
+    doc_id = db.Column(db.Integer, nullable=False)
+    model_name = db.Column(db.String(100), nullable=False)
+    content_hash = db.Column(db.String(64), nullable=False)
+    dim = db.Column(db.Integer, nullable=False)
+    vector = db.Column(db.LargeBinary, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    user = db.relationship('User', backref='skills')
\ No newline at end of file
+    __table_args__ = (
+        db.UniqueConstraint('doc_type', 'doc_id', 'model_name', name='unique_document_embedding'),
+    )
\ No newline at end of file
@@ -1,6 +1,8 @@
 from flask import Blueprint, render_template, request, session, flash, redirect, url_for
 from app import db
 from app.models import User, Feedback
+from app.utils.loaders import current_user
+from app.utils.counters import add_user as add_counters
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -10,7 +12,7 @@ def login():
         username = request.form['username']
         password = request.form['password']
         role = request.form['role']
-        user = User.query.filter_by(username=username, password=password, role=role).first()
+        user = User.query.filter_by(username=username, password=password, role=role, locked_at=None).first()
         if user:
             session['username'] = user.username
             session['role'] = user.role
@@ -47,6 +49,8 @@ def register():
             company_name=company_name
         )
         db.session.add(user)
+        db.session.flush()
+        add_counters(user.id)
         db.session.commit()
         flash("Registration successful! Please log in.", "success")
         return redirect(url_for('auth.login'))
@@ -63,7 +67,7 @@ def contact():
         if not message or not message.strip():
             flash("Feedback message is required!", "error")
             return render_template('contact.html')
-        user = User.query.filter_by(username=session['username']).first()
+        user = current_user()
         if not user:
             flash("User not found. Please log in again.", "error")
             return redirect(url_for('auth.login'))
@@ -78,5 +82,6 @@ def contact():
 def logout():
     session.pop('username', None)
     session.pop('role', None)
+    session.pop('user_id', None)
     flash("Logged out successfully!", "success")
     return redirect(url_for('main.homepage'))
\ No newline at end of file
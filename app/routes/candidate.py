@@ -1,6 +1,12 @@
 from flask import Blueprint, render_template, request, session, flash, redirect, url_for, jsonify, current_app
 from app import db
-from app.models import User, CandidateCV, JobRequirement, SavedJob, Message
+from app.models import User, CandidateCV, JobRequirement, SavedJob, Message, Shortlist
+from app.utils.loaders import current_user
+from app.utils.helpers import publish_counts
+from app.utils.counters import adjust, adjust_grouped
+from app.utils.vector_indexes import unindex_documents
+from app.utils.ingest import enqueue
+from app.utils.deletion import remove_upload_files
 from werkzeug.utils import secure_filename
 import os
 
@@ -34,7 +40,7 @@ def precandidate():
 @candidate_bp.route('/candidate', methods=['GET', 'POST'])
 def candidate():
     if 'role' in session and session['role'] == 'candidate':
-        user = User.query.filter_by(username=session['username']).first()
+        user = current_user()
         jobs = JobRequirement.query.all()
 
         if request.method == 'POST':
@@ -52,6 +58,7 @@ def candidate():
                 new_cv = CandidateCV(user_id=user.id, filename=filename, domain=domain)
                 db.session.add(new_cv)
                 db.session.commit()
+                enqueue('cv', new_cv)
 
                 flash("CV uploaded!", "success")
 
@@ -67,14 +74,16 @@ def candidate():
 @candidate_bp.route('/candidate/delete/<int:cv_id>', methods=['POST'])
 def delete_cv(cv_id):
     if 'role' in session and session['role'] == 'candidate':
-        user = User.query.filter_by(username=session['username']).first()
+        user = current_user()
         cv = CandidateCV.query.filter_by(id=cv_id, user_id=user.id).first()
         if cv:
-            path = os.path.join(current_app.config['CANDIDATE_UPLOADS'], cv.filename)
-            if os.path.exists(path):
-                os.remove(path)
+            unindex_documents('cv', [cv])
+            # Shortlist entries go with the CV (ON DELETE CASCADE)
+            adjust_grouped('shortlisted_cvs', Shortlist.jobgiver_id, Shortlist.cv_id == cv.id)
+            filename = cv.filename
             db.session.delete(cv)
             db.session.commit()
+            remove_upload_files('cv', [filename])
             flash("CV deleted successfully!", "success")
         else:
             flash("CV not found!", "error")
@@ -93,12 +102,14 @@ def save_job():
     except (ValueError, TypeError):
         return jsonify({"error": "Invalid Job ID"}), 400
         
-    user = User.query.filter_by(username=session['username']).first()
+    user = current_user()
         
     if SavedJob.query.filter_by(candidate_id=user.id, job_id=job_id).first():
         return jsonify({"error": "Already saved"}), 400
         
     db.session.add(SavedJob(candidate_id=user.id, job_id=job_id))
+    adjust(user.id, saved_jobs=1)
+    publish_counts(user)
     db.session.commit()
     return jsonify({"success": "Saved!"})
 
@@ -115,13 +126,15 @@ def remove_saved_job():
     except (ValueError, TypeError):
         return jsonify({"error": "Invalid Job ID"}), 400
         
-    user = User.query.filter_by(username=session['username']).first()
+    user = current_user()
         
     item = SavedJob.query.filter_by(candidate_id=user.id, job_id=job_id).first()
     if not item: 
         return jsonify({"error": "Not found"}), 404
         
     db.session.delete(item)
+    adjust(user.id, saved_jobs=-1)
+    publish_counts(user)
     db.session.commit()
     return jsonify({"success": "Removed from saved"})
 
@@ -130,14 +143,12 @@ def saved_jobs():
     if session.get('role') != 'candidate': 
         return redirect(url_for('auth.login'))
         
-    user = User.query.filter_by(username=session['username']).first()
-    saved_jobs = SavedJob.query.filter_by(candidate_id=user.id).all()
-    
-    items = []
-    for saved in saved_jobs:
-        job = JobRequirement.query.get(saved.job_id)
-        if job:
-            job_user = User.query.get(job.user_id)
-            items.append((saved, job, job_user))
+    user = current_user()
+    # Saved rows, their jobs and the job owners in one joined query
+    items = db.session.query(SavedJob, JobRequirement, User).join(
+        JobRequirement, JobRequirement.id == SavedJob.job_id
+    ).outerjoin(
+        User, User.id == JobRequirement.user_id
+    ).filter(SavedJob.candidate_id == user.id).order_by(SavedJob.id).all()
     
     return render_template('saved_jobs.html', items=items)
\ No newline at end of file
@@ -1,6 +1,12 @@
 from flask import Blueprint, render_template, request, session, flash, redirect, url_for, jsonify, current_app
 from app import db
-from app.models import User, JobRequirement, CandidateCV, Shortlist
+from app.models import User, JobRequirement, CandidateCV, Shortlist, SavedJob
+from app.utils.loaders import current_user
+from app.utils.helpers import publish_counts
+from app.utils.counters import adjust, adjust_grouped
+from app.utils.vector_indexes import unindex_documents
+from app.utils.ingest import enqueue
+from app.utils.deletion import remove_upload_files
 from werkzeug.utils import secure_filename
 import os
 
@@ -9,7 +15,7 @@ jobgiver_bp = Blueprint('jobgiver', __name__)
 @jobgiver_bp.route('/jobgiver', methods=['GET', 'POST'])
 def jobgiver():
     if 'role' in session and session['role'] == 'jobgiver':
-        user = User.query.filter_by(username=session['username']).first()
+        user = current_user()
         if request.method == 'POST':
             file = request.files['job_file']
             domain = request.form.get('domain')
@@ -20,6 +26,7 @@ def jobgiver():
                 new_job = JobRequirement(user_id=user.id, filename=filename, domain=domain)
                 db.session.add(new_job)
                 db.session.commit()
+                enqueue('job', new_job)
                 flash("Job uploaded!", "success")
         job_files = JobRequirement.query.filter_by(user_id=user.id).all()
         return render_template('jobgiver.html', job_files=job_files, username=user.username)
@@ -29,21 +36,23 @@ def jobgiver():
 def prejobgiver():
     if 'role' in session and session['role'] == 'jobgiver':
         cvs = CandidateCV.query.all()
-        user = User.query.filter_by(username=session['username']).first()
+        user = current_user()
         return render_template("prejobgiver.html", cvs=cvs, username=user.username)
     return redirect(url_for("auth.login"))
 
 @jobgiver_bp.route('/jobgiver/delete/<int:job_id>', methods=['POST'])
 def delete_job(job_id):
     if 'role' in session and session['role'] == 'jobgiver':
-        user = User.query.filter_by(username=session['username']).first()
+        user = current_user()
         job = JobRequirement.query.filter_by(id=job_id, user_id=user.id).first()
         if job:
-            path = os.path.join(current_app.config['JOBGIVER_UPLOADS'], job.filename)
-            if os.path.exists(path):
-                os.remove(path)
+            unindex_documents('job', [job])
+            # Saved copies go with the job (ON DELETE CASCADE)
+            adjust_grouped('saved_jobs', SavedJob.candidate_id, SavedJob.job_id == job.id)
+            filename = job.filename
             db.session.delete(job)
             db.session.commit()
+            remove_upload_files('job', [filename])
             flash("Job deleted successfully!", "success")
         else:
             flash("Job not found!", "error")
@@ -62,12 +71,14 @@ def shortlist_cv():
     except (ValueError, TypeError):
         return jsonify({"error": "Invalid CV ID"}), 400
     
-    user = User.query.filter_by(username=session['username']).first()
+    user = current_user()
     
     if Shortlist.query.filter_by(jobgiver_id=user.id, cv_id=cv_id).first():
         return jsonify({"error": "Already shortlisted"}), 400
         
     db.session.add(Shortlist(jobgiver_id=user.id, cv_id=cv_id))
+    adjust(user.id, shortlisted_cvs=1)
+    publish_counts(user)
     db.session.commit()
     return jsonify({"success": "Shortlisted!"})
 
@@ -84,13 +95,15 @@ def remove_shortlist():
     except (ValueError, TypeError):
         return jsonify({"error": "Invalid CV ID"}), 400
         
-    user = User.query.filter_by(username=session['username']).first()
+    user = current_user()
         
     item = Shortlist.query.filter_by(jobgiver_id=user.id, cv_id=cv_id).first()
     if not item: 
         return jsonify({"error": "Not found"}), 404
         
     db.session.delete(item)
+    adjust(user.id, shortlisted_cvs=-1)
+    publish_counts(user)
     db.session.commit()
     return jsonify({"success": "Removed from shortlist"})
 
@@ -99,14 +112,12 @@ def shortlisted():
     if session.get('role') != 'jobgiver': 
         return redirect(url_for('auth.login'))
         
-    user = User.query.filter_by(username=session['username']).first()
-    shortlists = Shortlist.query.filter_by(jobgiver_id=user.id).all()
-    
-    items = []
-    for shortlist in shortlists:
-        cv = CandidateCV.query.get(shortlist.cv_id)
-        if cv:
-            cv_user = User.query.get(cv.user_id)
-            items.append((shortlist, cv, cv_user))
+    user = current_user()
+    # Shortlist rows, their CVs and the CV owners in one joined query
+    items = db.session.query(Shortlist, CandidateCV, User).join(
+        CandidateCV, CandidateCV.id == Shortlist.cv_id
+    ).outerjoin(
+        User, User.id == CandidateCV.user_id
+    ).filter(Shortlist.jobgiver_id == user.id).order_by(Shortlist.id).all()
     
     return render_template('shortlisted.html', items=items)
\ No newline at end of file
@@ -1,15 +1,32 @@
 from flask import Blueprint, request, session, flash, redirect, url_for, render_template, current_app
 from app import db
 from app.models import User, CandidateCV, JobRequirement, Shortlist, SavedJob, Message
-from ai_logic.vectorizer import get_embedding
-from ai_logic.matcher import match_documents
-from ai_logic.extract_text import extract_cv_text, extract_job_text, read_pdf_text
-import os
+from app.utils.loaders import current_user
+from app.utils.embeddings import load_embeddings
+from app.utils.vector_indexes import search
+from app.utils.rollups import record_activity
+from ai_logic.tracing import traced, span, annotate
 import logging
 
 matching_bp = Blueprint('matching', __name__)
 
+# Matches at or below this cosine similarity are not shown
+MIN_MATCH_SCORE = 0.3
+
+def _search_capped(side, domain, query_embedding):
+    """
+    Search with the MATCH_TOP_K cap. Returns (hits, limit), limit being
+    the cap when more documents matched than it lets through, else None.
+    """
+    top_k = current_app.config['MATCH_TOP_K']
+    # One extra hit tells whether the cap cut anything off
+    hits = search(side, domain, query_embedding, k=top_k + 1 if top_k else None, min_score=MIN_MATCH_SCORE)
+    if top_k and len(hits) > top_k:
+        return hits[:top_k], top_k
+    return hits, None
+
 @matching_bp.route('/match-candidates', methods=['POST'])
+@traced('match_candidates')
 def match_candidates():
     if 'role' in session and session['role'] == 'jobgiver':
         job_id = request.form.get('job_id')
@@ -17,79 +34,76 @@ def match_candidates():
             flash("Job ID not provided.", "error")
             return redirect(url_for('jobgiver.jobgiver'))
 
-        user = User.query.filter_by(username=session['username']).first()
+        user = current_user()
         job = JobRequirement.query.filter_by(id=job_id, user_id=user.id).first()
         if not job:
             flash("Job not found.", "error")
             return redirect(url_for('jobgiver.jobgiver'))
 
-        job_path = os.path.join(current_app.config['JOBGIVER_UPLOADS'], job.filename)
-        if not os.path.exists(job_path):
-            flash("Job file missing.", "error")
+        if job.status == 'failed':
+            flash(f"This job could not be processed: {job.ingest_error}", "error")
+            return redirect(url_for('jobgiver.jobgiver'))
+        if job.status != 'ready':
+            flash("This job is still being processed. Please try again in a moment.", "error")
             return redirect(url_for('jobgiver.jobgiver'))
 
-        try:
-            raw_text = read_pdf_text(job_path)
-            job_text = extract_job_text(raw_text)
-            logging.debug(f"Extracted job text: {job_text[:200]}...")
-            if not job_text.strip():
-                flash("No relevant text extracted from job.", "error")
-                return redirect(url_for('jobgiver.jobgiver'))
-        except Exception as e:
-            flash(f"Error extracting job text: {str(e)}", "error")
+        annotate(job_id=job.id, domain=job.domain)
+        with span('query_embedding'):
+            job_vectors, _ = load_embeddings('job', [job], current_app.config['JOBGIVER_UPLOADS'])
+        if not job_vectors:
+            flash("No relevant text extracted from job.", "error")
             return redirect(url_for('jobgiver.jobgiver'))
 
-        cvs = CandidateCV.query.filter_by(domain=job.domain).all()
-        cv_texts, cv_names = [], []
-        for cv in cvs:
-            path = os.path.join(current_app.config['CANDIDATE_UPLOADS'], cv.filename)
-            if os.path.exists(path):
-                try:
-                    raw_text = read_pdf_text(path)
-                    cv_text = extract_cv_text(raw_text)
-                    logging.debug(f"Extracted CV text ({cv.filename}): {cv_text[:200]}...")
-                    if cv_text.strip():
-                        cv_texts.append(cv_text)
-                        cv_names.append(cv.filename)
-                except Exception as e:
-                    logging.error(f"Error extracting CV {cv.filename}: {str(e)}")
-
-        if not cv_texts:
+        with span('search') as s:
+            hits, limit = _search_capped('cv', job.domain, job_vectors[0])
+            s.set(results=len(hits))
+        if not hits and not CandidateCV.query.filter_by(domain=job.domain, status='ready').first():
             flash("No CVs available for this domain.", "error")
             return redirect(url_for('jobgiver.jobgiver'))
 
-        results = match_documents(job_text, cv_texts, cv_names, get_embedding)
-        logging.debug(f"Raw similarity scores before scaling: {[(name, score) for name, score in results]}")
+        logging.debug(f"Raw similarity scores before scaling: {[(name, score) for _, name, score in hits]}")
         
-        results = [(name, min(round(max(score, 0.0) * 100, 2), 100.0), job.domain) for name, score in results if score > 0.3]
-        logging.debug(f"Final percentage scores: {[(name, score) for name, score, _ in results]}")
-
-        matched_cvs = []
-        for cv_file, score, domain in results:
-            cv = CandidateCV.query.filter_by(filename=cv_file).first()
-            matched_cvs.append((cv_file, score, domain, int(cv.id) if cv else 0))
-
-        cv_ids = [c[3] for c in matched_cvs if c[3] is not None]
-       
-        shortlist_map = {s.cv_id: True for s in Shortlist.query.filter_by(jobgiver_id=user.id).all()}
-
-        invite_map = {m.file_id: True for m in Message.query.filter_by(sender_id=user.id, message_type='invite').all()}
-
-        return render_template(
-            'match_results.html',
-            results=matched_cvs,
-            job_file=job.filename,
-            cv_ids=cv_ids,
-            shortlist_map=shortlist_map,
-            invite_map=invite_map
-        )
+        results = [(doc_id, min(round(max(score, 0.0) * 100, 2), 100.0)) for doc_id, _, score in hits]
+        logging.debug(f"Final percentage scores: {results}")
+
+        with span('hydrate', results=len(results)):
+            # Hits carry document ids, so each lookup is one IN query.
+            # CVs deleted since they were indexed drop out here.
+            cv_ids = [doc_id for doc_id, _ in results]
+            cvs = {cv.id: cv for cv in CandidateCV.query.filter(CandidateCV.id.in_(cv_ids)).all()} if cv_ids else {}
+            matched_cvs = [(cvs[cv_id].filename, score, job.domain, cv_id) for cv_id, score in results if cv_id in cvs]
+            cv_ids = [c[3] for c in matched_cvs]
+
+            shortlist_map = {cv_id: True for (cv_id,) in Shortlist.query.with_entities(Shortlist.cv_id).filter(
+                Shortlist.jobgiver_id == user.id, Shortlist.cv_id.in_(cv_ids)
+            )} if cv_ids else {}
+
+            invite_map = {file_id: True for (file_id,) in Message.query.with_entities(Message.file_id).filter(
+                Message.sender_id == user.id, Message.message_type == 'invite', Message.file_id.in_(cv_ids)
+            )} if cv_ids else {}
+
+        with span('render'):
+            html = render_template(
+                'match_results.html',
+                results=matched_cvs,
+                job_file=job.filename,
+                cv_ids=cv_ids,
+                shortlist_map=shortlist_map,
+                invite_map=invite_map,
+                limit=limit
+            )
+        # Committed after rendering so the loaded rows are not expired
+        record_activity('match_candidates')
+        db.session.commit()
+        return html
 
     return redirect(url_for('auth.login'))
 
 @matching_bp.route('/match-jobs', methods=['POST'])
+@traced('match_jobs')
 def match_jobs():
     if 'role' in session and session['role'] == 'candidate':
-        user = User.query.filter_by(username=session['username']).first()
+        user = current_user()
         cv_id = request.form.get('cv_id')
         if not cv_id:
             flash("CV ID not provided.", "error")
@@ -100,62 +114,54 @@ def match_jobs():
             flash("CV not found.", "error")
             return redirect(url_for('candidate.candidate'))
 
-        cv_path = os.path.join(current_app.config['CANDIDATE_UPLOADS'], cv.filename)
-        if not os.path.exists(cv_path):
-            flash("CV file missing.", "error")
+        if cv.status == 'failed':
+            flash(f"This CV could not be processed: {cv.ingest_error}", "error")
+            return redirect(url_for('candidate.candidate'))
+        if cv.status != 'ready':
+            flash("This CV is still being processed. Please try again in a moment.", "error")
             return redirect(url_for('candidate.candidate'))
 
-        try:
-            raw_text = read_pdf_text(cv_path)
-            cv_text = extract_cv_text(raw_text)
-            logging.debug(f"Extracted CV text: {cv_text[:200]}...")
-            if not cv_text.strip():
-                flash("No relevant text extracted from CV.", "error")
-                return redirect(url_for('candidate.candidate'))
-        except Exception as e:
-            flash(f"Error extracting CV text: {str(e)}", "error")
+        annotate(cv_id=cv.id, domain=cv.domain)
+        with span('query_embedding'):
+            cv_vectors, _ = load_embeddings('cv', [cv], current_app.config['CANDIDATE_UPLOADS'])
+        if not cv_vectors:
+            flash("No relevant text extracted from CV.", "error")
             return redirect(url_for('candidate.candidate'))
 
-        jobs = JobRequirement.query.filter_by(domain=cv.domain).all()
-        job_texts, job_files = [], []
-        for job in jobs:
-            path = os.path.join(current_app.config['JOBGIVER_UPLOADS'], job.filename)
-            if os.path.exists(path):
-                try:
-                    raw_text = read_pdf_text(path)
-                    job_text = extract_job_text(raw_text)
-                    logging.debug(f"Extracted job text ({job.filename}): {job_text[:200]}...")
-                    if job_text.strip():
-                        job_texts.append(job_text)
-                        job_files.append(job.filename)
-                except Exception as e:
-                    logging.error(f"Error extracting job {job.filename}: {str(e)}")
-
-        if not job_texts:
+        with span('search') as s:
+            hits, limit = _search_capped('job', cv.domain, cv_vectors[0])
+            s.set(results=len(hits))
+        if not hits and not JobRequirement.query.filter_by(domain=cv.domain, status='ready').first():
             flash("No jobs available for this domain.", "error")
             return redirect(url_for('candidate.candidate'))
 
-        results = match_documents(cv_text, job_texts, job_files, get_embedding)
-        logging.debug(f"Raw similarity scores before scaling: {[(name, score) for name, score in results]}")
+        logging.debug(f"Raw similarity scores before scaling: {[(name, score) for _, name, score in hits]}")
         
-        results = [(name, min(round(max(score, 0.0) * 100, 2), 100.0), cv.domain) for name, score in results if score > 0.3]
-        logging.debug(f"Final percentage scores: {[(name, score) for name, score, _ in results]}")
-
-        matched_jobs = []
-        for job_file, score, domain in results:
-            job = JobRequirement.query.filter_by(filename=job_file).first()
-            matched_jobs.append((job_file, score, domain, int(job.id) if job else 0))
-
-        job_ids = [j[3] for j in matched_jobs if j[3] is not None]
-       
-        saved_map = {s.job_id: True for s in SavedJob.query.filter_by(candidate_id=user.id).all()}
-
-        return render_template(
-            'job_matches.html',
-            results=matched_jobs,
-            cv_file=cv.filename,
-            job_ids=job_ids,
-            saved_map=saved_map         
-        )
+        results = [(doc_id, min(round(max(score, 0.0) * 100, 2), 100.0)) for doc_id, _, score in hits]
+        logging.debug(f"Final percentage scores: {results}")
+
+        with span('hydrate', results=len(results)):
+            # Same as match_candidates: one IN query, deleted jobs drop out
+            job_ids = [doc_id for doc_id, _ in results]
+            jobs = {j.id: j for j in JobRequirement.query.filter(JobRequirement.id.in_(job_ids)).all()} if job_ids else {}
+            matched_jobs = [(jobs[job_id].filename, score, cv.domain, job_id) for job_id, score in results if job_id in jobs]
+            job_ids = [j[3] for j in matched_jobs]
+
+            saved_map = {job_id: True for (job_id,) in SavedJob.query.with_entities(SavedJob.job_id).filter(
+                SavedJob.candidate_id == user.id, SavedJob.job_id.in_(job_ids)
+            )} if job_ids else {}
+
+        with span('render'):
+            html = render_template(
+                'job_matches.html',
+                results=matched_jobs,
+                cv_file=cv.filename,
+                job_ids=job_ids,
+                saved_map=saved_map,
+                limit=limit
+            )
+        record_activity('match_jobs')
+        db.session.commit()
+        return html
 
     return redirect(url_for('auth.login'))
\ No newline at end of file
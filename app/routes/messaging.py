@@ -1,7 +1,14 @@
-from flask import Blueprint, request, session, jsonify, render_template, redirect, url_for
+from flask import Blueprint, request, session, jsonify, render_template, redirect, url_for, current_app, Response
 from app import db
+from sqlalchemy.orm import selectinload
 from app.models import User, Message, Application, Notification, Shortlist, SavedJob, CandidateCV, JobRequirement
-from app.utils.helpers import notify
+from app.utils.loaders import current_user, prefetch_messages
+from app.utils.helpers import notify, user_counts, publish_counts
+from app.utils.events import publish, get_bus
+from app.utils.counters import adjust, get_counts
+from app.utils.rollups import record_activity
+from app.utils.pagination import encode_cursor, decode_cursor, keyset_page
+import json
 
 messaging_bp = Blueprint('messaging', __name__)
 
@@ -10,41 +17,96 @@ def inbox():
     if 'username' not in session:
         return redirect(url_for('auth.login'))
     
-    user = User.query.filter_by(username=session['username']).first()
+    user = current_user()
+    before = decode_cursor(request.args.get('before'))
     
-    messages = Message.query.filter(
-        Message.receiver_id == user.id
-    ).order_by(Message.sent_at.desc()).all()
+    # Senders and their documents are rendered for every message
+    sender = selectinload(Message.sender)
+    query = Message.query.options(
+        sender.selectinload(User.cvs),
+        sender.selectinload(User.job_requirements)
+    ).filter(Message.receiver_id == user.id)
+    messages, has_more = keyset_page(query, Message.sent_at, Message.id,
+                                     current_app.config['INBOX_PAGE_SIZE'], before=before)
+    prefetch_messages(messages)
     
-    unread_count = Message.query.filter_by(receiver_id=user.id, is_read=False).count()
+    unread_count = get_counts(user.id)['unread_messages']
     
-    return render_template('inbox.html', messages=messages, unread_count=unread_count, current_user=user)
+    older_cursor = encode_cursor(messages[-1].sent_at, messages[-1].id) if has_more else None
+    return render_template('inbox.html', messages=messages, unread_count=unread_count, current_user=user,
+                           older_cursor=older_cursor, paged=before is not None)
+
+def _conversation_page(user, limit, before, since):
+    """
+    Messages sent or received by user, one keyset page per direction so
+    each uses its own index, merged into a single page.
+    """
+    pages = [
+        keyset_page(Message.query.filter(Message.receiver_id == user.id), Message.sent_at, Message.id,
+                    limit, before=before, since=since),
+        keyset_page(Message.query.filter(Message.sender_id == user.id), Message.sent_at, Message.id,
+                    limit, before=before, since=since),
+    ]
+    # Messages to oneself show up in both pages
+    rows = list({m.id: m for page, _ in pages for m in page}.values())
+    has_more = any(more for _, more in pages) or len(rows) > limit
+    if since is not None:
+        rows = sorted(rows, key=lambda m: (m.sent_at, m.id))[:limit]
+    return sorted(rows, key=lambda m: (m.sent_at, m.id), reverse=True)[:limit], has_more
+
+def _message_dict(m):
+    return {
+        'id': m.id,
+        'sender': m.sender.username,
+        'receiver': m.receiver.username,
+        'message': m.message,
+        'message_type': m.message_type,
+        'time': m.sent_at.strftime('%Y-%m-%d %H:%M'),
+        'is_read': m.is_read,
+        'cursor': encode_cursor(m.sent_at, m.id)
+    }
 
 @messaging_bp.route('/inbox-data')
 def inbox_data():
     if 'username' not in session:
         return jsonify({'unread': 0, 'messages': []})
     
-    user = User.query.filter_by(username=session['username']).first()
+    user = current_user()
+    before = since = None
+    if request.args.get('before'):
+        before = decode_cursor(request.args['before'])
+        if before is None:
+            return jsonify({"error": "Invalid cursor"}), 400
+    if request.args.get('since'):
+        since = decode_cursor(request.args['since'])
+        if since is None:
+            return jsonify({"error": "Invalid cursor"}), 400
+    limit = min(request.args.get('limit', 20, type=int) or 20, current_app.config['INBOX_DATA_MAX_LIMIT'])
     
-    messages = Message.query.filter(
-        (Message.receiver_id == user.id) | (Message.sender_id == user.id)
-    ).order_by(Message.sent_at.desc()).limit(20).all()
+    messages, has_more = _conversation_page(user, max(limit, 1), before, since)
+    # One query for every participant; m.sender / m.receiver then come
+    # from the session instead of a lazy load per message
+    participant_ids = {m.sender_id for m in messages} | {m.receiver_id for m in messages}
+    if participant_ids:
+        User.query.filter(User.id.in_(participant_ids)).all()
 
-    msg_list = []
-    for m in messages:
-        msg_list.append({
-            'id': m.id,
-            'sender': m.sender.username,
-            'receiver': m.receiver.username,
-            'message': m.message,
-            'message_type': m.message_type,
-            'time': m.sent_at.strftime('%Y-%m-%d %H:%M'),
-            'is_read': m.is_read
-        })
+    msg_list = [_message_dict(m) for m in messages]
 
-    unread_count = Message.query.filter_by(receiver_id=user.id, is_read=False).count()
-    return jsonify({'unread': unread_count, 'messages': msg_list})
+    # cursor: pass back as ?since= to get only newer messages (has_more
+    # then means more are waiting). next_cursor: pass as ?before= for the
+    # next older page.
+    cursor = encode_cursor(messages[0].sent_at, messages[0].id) if messages else request.args.get('since')
+    next_cursor = None
+    if messages and has_more and since is None:
+        next_cursor = encode_cursor(messages[-1].sent_at, messages[-1].id)
+    unread_count = get_counts(user.id)['unread_messages']
+    return jsonify({
+        'unread': unread_count,
+        'messages': msg_list,
+        'cursor': cursor,
+        'next_cursor': next_cursor,
+        'has_more': has_more
+    })
 
 @messaging_bp.route('/mark-message-read', methods=['POST'])
 def mark_message_read():
@@ -59,13 +121,16 @@ def mark_message_read():
     except (ValueError, TypeError):
         return jsonify({"error": "Invalid Message ID"}), 400
         
-    user = User.query.filter_by(username=session['username']).first()
+    user = current_user()
     message = Message.query.filter_by(id=message_id, receiver_id=user.id).first()
     
     if not message:
         return jsonify({"error": "Message not found"}), 404
         
-    message.is_read = True
+    if not message.is_read:
+        message.is_read = True
+        adjust(user.id, unread_messages=-1)
+    publish_counts(user)
     db.session.commit()
     
     return jsonify({"success": "Message marked as read"})
@@ -83,7 +148,7 @@ def apply_now():
     except (ValueError, TypeError):
         return jsonify({"error": "Invalid Job ID"}), 400
     
-    user = User.query.filter_by(username=session['username']).first()
+    user = current_user()
     job = JobRequirement.query.get(job_id)
 
     if not job:
@@ -105,9 +170,16 @@ def apply_now():
         message_type='application'
     )
     db.session.add(msg)
+    # Flushed first so the event carries the message id and timestamp
+    db.session.flush()
+    adjust(job.user_id, unread_messages=1)
+    publish(job.user_id, 'message', _message_dict(msg))
+    publish_counts(job.user)
+    notify(job.user_id, "New Application", f"{user.username} applied to your job", 'application', app.id)
+    record_activity('application')
     
+    # Application, message, counters and notification in one commit
     db.session.commit()
-    notify(job.user_id, "New Application", f"{user.username} applied to your job", 'application', app.id)
 
     return jsonify({'success': 'Applied successfully!'})
 
@@ -124,7 +196,7 @@ def send_invite():
     except (ValueError, TypeError):
         return jsonify({"error": "Invalid CV ID"}), 400
 
-    jobgiver = User.query.filter_by(username=session['username']).first()
+    jobgiver = current_user()
     cv = CandidateCV.query.get(cv_id)
     
     if not cv:
@@ -148,8 +220,13 @@ def send_invite():
         message_type='invite'
     )
     db.session.add(msg)
-    db.session.commit()
+    db.session.flush()
+    adjust(candidate_user.id, unread_messages=1)
+    publish(candidate_user.id, 'message', _message_dict(msg))
+    publish_counts(candidate_user)
     notify(candidate_user.id, "Interview Invite", f"{jobgiver.username} invited you", 'invite', msg.id)
+    record_activity('invite')
+    db.session.commit()
 
     return jsonify({'success': 'Invite sent successfully!'})
 
@@ -158,10 +235,60 @@ def api_counts():
     if 'username' not in session: 
         return jsonify({})
         
-    user = User.query.filter_by(username=session['username']).first()
-    out = {}
-    if session['role'] == 'jobgiver':
-        out['shortlist'] = Shortlist.query.filter_by(jobgiver_id=user.id).count()
-    elif session['role'] == 'candidate':
-        out['saved'] = SavedJob.query.filter_by(candidate_id=user.id).count()
-    return jsonify(out)
\ No newline at end of file
+    return jsonify(user_counts(current_user()))
+
+def _stream_start():
+    # Resume after Last-Event-ID (SSE reconnects) or ?after= (long poll);
+    # a fresh client starts from now
+    after = request.headers.get('Last-Event-ID') or request.args.get('after')
+    try:
+        return int(after)
+    except (TypeError, ValueError):
+        return get_bus().last_id()
+
+@messaging_bp.route('/events')
+def events():
+    if 'username' not in session:
+        return jsonify({"error": "Unauthorized"}), 403
+    
+    user = current_user()
+    user_id = user.id
+    after = _stream_start()
+    counts = user_counts(user)
+    keepalive = current_app.config['EVENT_KEEPALIVE']
+    bus = get_bus()
+    
+    # Runs after the request context is gone, so no database access here
+    def stream():
+        yield f"retry: 5000\nevent: counts\ndata: {json.dumps(counts)}\n\n"
+        last = after
+        while True:
+            events = bus.wait(user_id, last, keepalive)
+            if not events:
+                yield ": keepalive\n\n"
+                continue
+            for event in events:
+                last = event['id']
+                yield f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event['data'], default=str)}\n\n"
+    
+    return Response(stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@messaging_bp.route('/events/poll')
+def events_poll():
+    """
+    Long-poll fallback for clients or servers that cannot hold an SSE
+    stream open: waits up to EVENT_POLL_TIMEOUT seconds for new events.
+    """
+    if 'username' not in session:
+        return jsonify({"error": "Unauthorized"}), 403
+    
+    user_id = current_user().id
+    after = _stream_start()
+    if 'after' not in request.args:
+        # First poll: hand out the current position without waiting
+        return jsonify({'last_id': after, 'events': []})
+    # Release the database connection while waiting
+    db.session.remove()
+    events = get_bus().wait(user_id, after, current_app.config['EVENT_POLL_TIMEOUT'])
+    return jsonify({'last_id': events[-1]['id'] if events else after, 'events': events})
@@ -0,0 +1,151 @@
+from app import db
+from app.models import CareerPath, CatalogVersion
+from ai_logic.skill_index import SkillIndex
+from datetime import datetime
+import threading
+import logging
+import json
+import time
+
+CATALOG = 'career_paths'
+
+def parse_required_skills(value):
+    """
+    required_skills as a list: JSON arrays come back as lists already,
+    strings are parsed as JSON or, failing that, split on commas.
+    """
+    if not value:
+        return []
+    if isinstance(value, str):
+        try:
+            return json.loads(value)
+        except ValueError:
+            return [s.strip() for s in value.split(',')]
+    return value if isinstance(value, list) else list(value)
+
+class CareerCatalog:
+    """
+    Read-only snapshot of the career paths: the dicts analyze returns,
+    with required_skills already parsed, grouped by domain, plus the
+    domain list and a SkillIndex per domain. Shared by every request until
+    the version changes.
+    """
+
+    def __init__(self, version, paths):
+        self.version = version
+        self.paths = paths
+        self.by_domain = {}
+        for career in paths:
+            self.by_domain.setdefault(career['domain'], []).append(career)
+        self.domains = list(self.by_domain)
+        self._indexes = {None: SkillIndex([c['required_skills'] for c in paths])}
+
+    def _key(self, domain):
+        return domain if domain and domain != '-- All Domains --' else None
+
+    def careers(self, domain=None):
+        key = self._key(domain)
+        return self.paths if key is None else self.by_domain.get(key, [])
+
+    def skill_index(self, domain=None):
+        """
+        SkillIndex over careers(domain), in the same order. Domain indexes
+        are built on first use and kept with this snapshot.
+        """
+        key = self._key(domain)
+        index = self._indexes.get(key)
+        if index is None:
+            index = self._indexes[key] = SkillIndex([c['required_skills'] for c in self.careers(key)])
+        return index
+
+def _career_dict(path):
+    return {
+        'id': path.id,
+        'title': path.title,
+        'description': path.description,
+        'required_skills': parse_required_skills(path.required_skills),
+        'average_salary_min': path.average_salary_min,
+        'average_salary_max': path.average_salary_max,
+        'growth_outlook': path.growth_outlook,
+        'experience_level': path.experience_level,
+        'domain': path.domain
+    }
+
+_catalog = None
+_checked_at = 0.0
+_lock = threading.Lock()
+_check_interval = 5
+
+def configure_catalog(check_interval=5):
+    global _check_interval
+    _check_interval = check_interval
+    invalidate()
+
+def invalidate():
+    global _catalog
+    with _lock:
+        _catalog = None
+
+def current_version():
+    row = db.session.get(CatalogVersion, CATALOG, populate_existing=True)
+    return row.version if row else 0
+
+def get_catalog():
+    """
+    The career catalog, loaded once per process. The version stamp is
+    read at most every CAREER_CATALOG_CHECK_INTERVAL seconds and the
+    catalog reloaded only when it changed, so requests in between do no
+    catalog I/O at all.
+    """
+    global _catalog, _checked_at
+    catalog = _catalog
+    now = time.monotonic()
+    if catalog is not None and now - _checked_at < _check_interval:
+        return catalog
+    # Read the version first: a change landing during the load only
+    # causes one more reload
+    version = current_version()
+    if catalog is None or catalog.version != version:
+        paths = [_career_dict(p) for p in CareerPath.query.order_by(CareerPath.id)]
+        catalog = CareerCatalog(version, paths)
+        logging.debug(f"Loaded career catalog version {version} ({len(paths)} paths)")
+    with _lock:
+        _catalog = catalog
+        _checked_at = now
+    return catalog
+
+def bump_version():
+    """
+    Mark the catalog changed in the current transaction. Done
+    automatically for CareerPath rows flushed through the ORM; call it (or
+    `flask career-catalog-bump`) after editing career_paths by other means.
+    """
+    now = datetime.utcnow()
+    values = {CatalogVersion.version: CatalogVersion.version + 1, CatalogVersion.updated_at: now}
+    if not CatalogVersion.query.filter_by(name=CATALOG).update(values, synchronize_session=False):
+        # schema.sql seeds the row; this only runs on databases without it
+        db.session.add(CatalogVersion(name=CATALOG, version=1, updated_at=now))
+    db.session().info['catalog_changed'] = True
+
+def _bump_on_flush(session, flush_context, instances):
+    if session.info.get('catalog_changed'):
+        return
+    if any(isinstance(obj, CareerPath) for obj in (*session.new, *session.dirty, *session.deleted)):
+        bump_version()
+
+def _drop_local(session):
+    # Other processes notice the new version on their next check
+    if session.info.pop('catalog_changed', False):
+        invalidate()
+
+def _discard_flag(session, previous_transaction):
+    if not previous_transaction.nested:
+        session.info.pop('catalog_changed', None)
+
+def init_career_catalog(app):
+    configure_catalog(check_interval=app.config['CAREER_CATALOG_CHECK_INTERVAL'])
+    from sqlalchemy import event
+    if not event.contains(db.session, 'before_flush', _bump_on_flush):
+        event.listen(db.session, 'before_flush', _bump_on_flush)
+        event.listen(db.session, 'after_commit', _drop_local)
+        event.listen(db.session, 'after_soft_rollback', _discard_flag)
@@ -0,0 +1,166 @@
+from app import db
+from app.models import UserCounter, Message, SavedJob, Shortlist
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+import threading
+import time
+
+COUNTERS = ('unread_messages', 'saved_jobs', 'shortlisted_cvs')
+
+# Source of truth for each counter: (owner column, extra criteria)
+SOURCES = {
+    'unread_messages': (Message.receiver_id, (Message.is_read == False,)),
+    'saved_jobs': (SavedJob.candidate_id, ()),
+    'shortlisted_cvs': (Shortlist.jobgiver_id, ()),
+}
+
+# Optional per-process read cache: {user_id: (expires_at, counts)}
+_cache = {}
+_cache_lock = threading.Lock()
+_cache_ttl = 0
+
+def configure_counters(cache_ttl=0):
+    global _cache_ttl
+    _cache_ttl = cache_ttl
+    with _cache_lock:
+        _cache.clear()
+
+def _invalidate(user_id):
+    with _cache_lock:
+        _cache.pop(user_id, None)
+    # Dropped again after commit, in case a reader cached the old row meanwhile
+    db.session().info.setdefault('dirty_counters', set()).add(user_id)
+
+def compute(user_ids):
+    """
+    Counts recomputed from the source tables: {user_id: {counter: n}}.
+    """
+    user_ids = list(user_ids)
+    counts = {user_id: dict.fromkeys(COUNTERS, 0) for user_id in user_ids}
+    for name, (owner, criteria) in SOURCES.items():
+        rows = db.session.query(owner, func.count()).filter(owner.in_(user_ids), *criteria).group_by(owner)
+        for user_id, n in rows:
+            counts[user_id][name] = n
+    return counts
+
+def _create(user_id):
+    counter = UserCounter(user_id=user_id, **compute([user_id])[user_id])
+    try:
+        with db.session.begin_nested():
+            db.session.add(counter)
+        return True
+    except IntegrityError:
+        # Another request created the row first
+        return False
+
+def add_user(user_id):
+    """
+    Add the row of a user created in the current transaction; a new user
+    has nothing to count yet.
+    """
+    db.session.add(UserCounter(user_id=user_id, **dict.fromkeys(COUNTERS, 0)))
+
+def adjust(user_id, **deltas):
+    """
+    Apply counter deltas in the current transaction, e.g.
+    adjust(user.id, saved_jobs=1). Call after adding the change itself:
+    a user without a row yet gets one computed from the source tables,
+    which already include that change.
+    """
+    values = {getattr(UserCounter, name): getattr(UserCounter, name) + delta for name, delta in deltas.items() if delta}
+    if not values:
+        return
+    updated = UserCounter.query.filter_by(user_id=user_id).update(values, synchronize_session=False)
+    if not updated and not _create(user_id):
+        UserCounter.query.filter_by(user_id=user_id).update(values, synchronize_session=False)
+    _invalidate(user_id)
+
+def adjust_grouped(name, owner, *criteria, sign=-1):
+    """
+    Adjust one counter for every owner of the rows matching criteria, by
+    their number of rows. Used before bulk deletes, e.g. everyone who
+    shortlisted a CV that is about to go.
+    """
+    rows = db.session.query(owner, func.count()).filter(*criteria).group_by(owner).all()
+    for user_id, n in rows:
+        adjust(user_id, **{name: sign * n})
+
+def get_counts(user_id):
+    """
+    {counter: n} for one user: a primary-key read, or the cache when
+    COUNTER_CACHE_TTL is set. Rows are created at registration and by
+    reconcile(); for a user still without one the counts are computed,
+    but not stored, since read paths never commit.
+    """
+    if _cache_ttl:
+        with _cache_lock:
+            cached = _cache.get(user_id)
+        if cached and cached[0] > time.monotonic():
+            return dict(cached[1])
+    counter = db.session.get(UserCounter, user_id, populate_existing=True)
+    if counter is None:
+        counts = compute([user_id])[user_id]
+    else:
+        # Drift can push a counter below zero until the next reconcile
+        counts = {name: max(getattr(counter, name), 0) for name in COUNTERS}
+    if _cache_ttl:
+        with _cache_lock:
+            _cache[user_id] = (time.monotonic() + _cache_ttl, counts)
+    return dict(counts)
+
+def remove(user_id):
+    UserCounter.query.filter_by(user_id=user_id).delete(synchronize_session=False)
+    _invalidate(user_id)
+
+def reconcile(batch_size=1000, dry_run=False):
+    """
+    Recompute every user's counters from the source tables, in batches
+    of users, and fix the ones that drifted. Users registered before the
+    counters existed get their rows here. Returns
+    [(user_id, counter, stored, actual)]; a missing row is reported with
+    stored None.
+    """
+    from app.models import User
+    drift = []
+    last_id = 0
+    while True:
+        user_ids = [uid for (uid,) in User.query.with_entities(User.id).filter(User.id > last_id)
+                    .order_by(User.id).limit(batch_size)]
+        if not user_ids:
+            break
+        last_id = user_ids[-1]
+        actual = compute(user_ids)
+        stored = {c.user_id: c for c in UserCounter.query.filter(UserCounter.user_id.in_(user_ids))}
+        for user_id in user_ids:
+            counter = stored.get(user_id)
+            for name in COUNTERS:
+                current = getattr(counter, name) if counter else None
+                if current != actual[user_id][name]:
+                    drift.append((user_id, name, current, actual[user_id][name]))
+                    if not dry_run:
+                        if counter is None:
+                            counter = UserCounter(user_id=user_id)
+                            db.session.add(counter)
+                        setattr(counter, name, actual[user_id][name])
+                        _invalidate(user_id)
+        if not dry_run:
+            db.session.commit()
+    return drift
+
+def _drop_cached(session):
+    user_ids = session.info.pop('dirty_counters', ())
+    with _cache_lock:
+        for user_id in user_ids:
+            _cache.pop(user_id, None)
+
+def _discard_dirty(session, previous_transaction):
+    # A reader in this transaction may have cached values that never committed
+    if not previous_transaction.nested:
+        _drop_cached(session)
+
+def init_counters(app):
+    configure_counters(cache_ttl=app.config['COUNTER_CACHE_TTL'])
+    from sqlalchemy import event
+    if not event.contains(db.session, 'after_commit', _drop_cached):
+        event.listen(db.session, 'after_commit', _drop_cached)
+        event.listen(db.session, 'after_soft_rollback', _discard_dirty)
@@ -0,0 +1,308 @@
+from flask import current_app
+from app import db
+from app.models import (User, DeletionJob, CandidateCV, JobRequirement, Application, SavedJob, Shortlist,
+                        Message, Notification, Feedback, UserSkills)
+from app.utils.embeddings import DOCUMENT_MODELS
+from app.utils.vector_indexes import unindex_documents, UPLOAD_FOLDERS
+from app.utils.counters import adjust_grouped, remove as remove_counters
+from ai_logic.extract_text import file_sha256, get_cache
+from sqlalchemy import or_, and_, func
+from sqlalchemy.exc import IntegrityError
+from datetime import datetime, timedelta
+import threading
+import logging
+import os
+
+ACTIVE = ('pending', 'processing')
+
+def _owned(model, user_id):
+    return db.session.query(model.id).filter(model.user_id == user_id)
+
+# What deleting a user removes, in order: (stage, model, rows of the user,
+# counter other users keep over those rows as (name, owner, *criteria)).
+# Rows pointing at the user's documents go before the documents.
+STAGES = (
+    ('shortlists_of_cvs', Shortlist, lambda uid: Shortlist.cv_id.in_(_owned(CandidateCV, uid)),
+     ('shortlisted_cvs', Shortlist.jobgiver_id)),
+    ('saved_jobs_of_jobs', SavedJob, lambda uid: SavedJob.job_id.in_(_owned(JobRequirement, uid)),
+     ('saved_jobs', SavedJob.candidate_id)),
+    ('applications_to_jobs', Application, lambda uid: Application.job_id.in_(_owned(JobRequirement, uid)), None),
+    ('applications', Application, lambda uid: Application.candidate_id == uid, None),
+    ('saved_jobs', SavedJob, lambda uid: SavedJob.candidate_id == uid, None),
+    ('shortlists', Shortlist, lambda uid: Shortlist.jobgiver_id == uid, None),
+    ('messages_sent', Message, lambda uid: Message.sender_id == uid,
+     ('unread_messages', Message.receiver_id, Message.is_read == False)),
+    ('messages_received', Message, lambda uid: Message.receiver_id == uid, None),
+    ('notifications', Notification, lambda uid: Notification.user_id == uid, None),
+    ('feedback', Feedback, lambda uid: Feedback.user_id == uid, None),
+    ('skills', UserSkills, lambda uid: UserSkills.user_id == uid, None),
+    ('cvs', CandidateCV, lambda uid: CandidateCV.user_id == uid, None),
+    ('jobs', JobRequirement, lambda uid: JobRequirement.user_id == uid, None),
+)
+
+SIDES_BY_MODEL = {model: side for side, model in DOCUMENT_MODELS.items()}
+
+def remove_upload_files(side, filenames):
+    """
+    Delete uploaded PDFs, and their cached text, once no document row
+    points at them any more. Uploads are stored by filename, so several
+    rows can share one file. Call after the delete has committed.
+    Returns how many files were removed.
+    """
+    filenames = set(filenames)
+    if not filenames:
+        return 0
+    model = DOCUMENT_MODELS[side]
+    in_use = {f for (f,) in db.session.query(model.filename).filter(model.filename.in_(filenames)).distinct()}
+    upload_dir = current_app.config[UPLOAD_FOLDERS[side]]
+    cache = get_cache()
+    removed = 0
+    for filename in filenames - in_use:
+        path = os.path.join(upload_dir, filename)
+        if not os.path.exists(path):
+            continue
+        try:
+            if cache is not None:
+                cache.delete(file_sha256(path))
+            os.remove(path)
+            removed += 1
+        except Exception as e:
+            logging.warning(f"Could not remove {path}: {str(e)}")
+    return removed
+
+def enqueue_user_deletion(user, requested_by=None):
+    """
+    Queue a user for background deletion in the current transaction and
+    lock the account, so it can no longer log in while the job runs. Its
+    CVs and jobs leave the match indexes right away. Returns the (possibly
+    already queued) job.
+    """
+    job = DeletionJob.query.filter(DeletionJob.user_id == user.id, DeletionJob.status.in_(ACTIVE)).first()
+    if job is not None:
+        return job
+    job = DeletionJob(user_id=user.id, username=user.username, role=user.role, requested_by=requested_by)
+    db.session.add(job)
+    user.locked_at = datetime.utcnow()
+    for side, model in DOCUMENT_MODELS.items():
+        unindex_documents(side, model.query.filter_by(user_id=user.id).all())
+    return job
+
+def wake_worker():
+    """
+    Signal that a committed deletion job is waiting.
+    """
+    worker = current_app.extensions.get('deletion_worker')
+    if worker is not None and current_app.config['DELETION_IN_PROCESS']:
+        worker.start()
+        worker.wake()
+
+def progress(job):
+    """
+    JSON-friendly state of a job for the admin pages.
+    """
+    percent = None
+    if job.status == 'done':
+        percent = 100
+    elif job.rows_total:
+        percent = min(99, int(100 * job.rows_deleted / job.rows_total))
+    return {
+        'id': job.id,
+        'user_id': job.user_id,
+        'username': job.username,
+        'status': job.status,
+        'stage': job.stage,
+        'rows_total': job.rows_total,
+        'rows_deleted': job.rows_deleted,
+        'files_removed': job.files_removed,
+        'percent': percent,
+        'error': job.error,
+        'created_at': job.created_at.isoformat() if job.created_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+def count_rows(user_id):
+    """
+    Rows deleting user_id will remove, the user row included.
+    """
+    total = 1
+    for _, model, criteria, _ in STAGES:
+        total += db.session.query(func.count(model.id)).filter(criteria(user_id)).scalar()
+    return total
+
+def _claimable(now):
+    # Same lease scheme as ingestion: a processing job whose lease expired
+    # belonged to a worker that died
+    return or_(
+        and_(DeletionJob.status == 'pending',
+             or_(DeletionJob.next_attempt_at.is_(None), DeletionJob.next_attempt_at <= now)),
+        and_(DeletionJob.status == 'processing', DeletionJob.next_attempt_at <= now)
+    )
+
+def _lease():
+    return datetime.utcnow() + timedelta(seconds=current_app.config['DELETION_LEASE_SECONDS'])
+
+def claim_job():
+    """
+    Claim the oldest runnable job with a conditional UPDATE, so two
+    workers never run the same job. Returns None when there is none.
+    """
+    now = datetime.utcnow()
+    candidates = DeletionJob.query.with_entities(DeletionJob.id).filter(_claimable(now)).order_by(DeletionJob.id).limit(5).all()
+    for (job_id,) in candidates:
+        claimed = DeletionJob.query.filter(DeletionJob.id == job_id, _claimable(now)).update(
+            {'status': 'processing', 'next_attempt_at': _lease()}, synchronize_session=False
+        )
+        db.session.commit()
+        if claimed:
+            return db.session.get(DeletionJob, job_id)
+    return None
+
+def _delete_batch(job, model, criteria, counter, limit):
+    ids = [row_id for (row_id,) in db.session.query(model.id).filter(criteria(job.user_id)).order_by(model.id).limit(limit)]
+    if not ids:
+        return 0, []
+    if counter is not None:
+        name, owner, *extra = counter
+        adjust_grouped(name, owner, model.id.in_(ids), *extra)
+    filenames = []
+    side = SIDES_BY_MODEL.get(model)
+    if side is not None:
+        docs = model.query.filter(model.id.in_(ids)).all()
+        filenames = [d.filename for d in docs]
+        unindex_documents(side, docs)
+    model.query.filter(model.id.in_(ids)).delete(synchronize_session=False)
+    return len(ids), filenames
+
+def run_step(job, limit):
+    """
+    Delete one batch of at most `limit` rows of the job's current stage
+    and commit, so no transaction holds locks for long. Stages that are
+    already empty are skipped; when all are, the user row goes and the job
+    is done. Returns True once the job is finished.
+    """
+    if job.rows_total is None:
+        job.rows_total = count_rows(job.user_id)
+    names = [stage[0] for stage in STAGES]
+    start = names.index(job.stage) if job.stage in names else 0
+    for name, model, criteria, counter in STAGES[start:]:
+        deleted, filenames = _delete_batch(job, model, criteria, counter, limit)
+        if deleted:
+            job.stage = name
+            job.rows_deleted += deleted
+            job.updated_at = datetime.utcnow()
+            job.next_attempt_at = _lease()
+            db.session.commit()
+            if filenames:
+                job.files_removed += remove_upload_files(SIDES_BY_MODEL[model], filenames)
+                db.session.commit()
+            return False
+
+    remove_counters(job.user_id)
+    job.rows_deleted += User.query.filter_by(id=job.user_id).delete(synchronize_session=False)
+    job.status = 'done'
+    job.stage = 'done'
+    job.next_attempt_at = None
+    job.finished_at = job.updated_at = datetime.utcnow()
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Something was written for the user after its stage had passed:
+        # start again from the first stage, as a failed attempt with the
+        # usual backoff and attempt limit
+        db.session.rollback()
+        job.stage = names[0]
+        db.session.commit()
+        raise
+    return True
+
+def _record_failure(job_id, error):
+    try:
+        job = db.session.get(DeletionJob, job_id)
+        job.attempts += 1
+        job.error = str(error)[:1000]
+        job.updated_at = datetime.utcnow()
+        if job.attempts >= current_app.config['DELETION_MAX_ATTEMPTS']:
+            job.status = 'failed'
+            job.next_attempt_at = None
+        else:
+            # Finished batches stay deleted; the retry resumes at job.stage
+            delay = current_app.config['DELETION_RETRY_DELAY'] * 2 ** (job.attempts - 1)
+            job.status = 'pending'
+            job.next_attempt_at = datetime.utcnow() + timedelta(seconds=delay)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logging.warning(f"Could not record deletion failure: {str(e)}")
+
+def process_pending(limit):
+    """
+    Claim one job and run it to the end, batch by batch. Returns how many
+    jobs were handled (0 or 1).
+    """
+    job = claim_job()
+    if job is None:
+        return 0
+    job_id = job.id
+    try:
+        while not run_step(job, limit):
+            pass
+        logging.info(f"Deleted user {job.user_id} ({job.rows_deleted} rows, {job.files_removed} files)")
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"Deletion job {job_id} failed: {str(e)}")
+        _record_failure(job_id, e)
+    return 1
+
+def retry_failed():
+    """
+    Put failed jobs back in the queue with a fresh attempt budget.
+    """
+    count = DeletionJob.query.filter_by(status='failed').update(
+        {'status': 'pending', 'attempts': 0, 'error': None, 'next_attempt_at': None}, synchronize_session=False
+    )
+    db.session.commit()
+    return count
+
+class DeletionWorker:
+    """
+    Background thread running queued deletion jobs, woken when an admin
+    deletes a user.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._wake = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self.run, name='deletion-worker', daemon=True)
+                self._thread.start()
+
+    def wake(self):
+        self._wake.set()
+
+    def run(self):
+        while True:
+            try:
+                with self.app.app_context():
+                    handled = process_pending(self.app.config['DELETION_BATCH_SIZE'])
+            except Exception as e:
+                logging.error(f"Deletion worker error: {str(e)}")
+                handled = 0
+            if not handled:
+                self._wake.wait(self.app.config['DELETION_POLL_INTERVAL'])
+                self._wake.clear()
+
+def init_deletion(app):
+    """
+    Attach the in-process worker; it starts with the first request. Set
+    DELETION_IN_PROCESS to False when `flask deletion-worker` runs instead.
+    """
+    worker = DeletionWorker(app)
+    app.extensions['deletion_worker'] = worker
+    if app.config['DELETION_IN_PROCESS']:
+        app.before_request(worker.start)
+    return worker
@@ -0,0 +1,157 @@
+from flask import current_app
+from app import db
+from app.models import CandidateCV, JobRequirement, DocumentEmbedding
+from ai_logic.vectorizer import get_embedding, get_embeddings, get_model_name
+from ai_logic.extract_text import extract_document_text
+from ai_logic.extract_pool import extract_many
+import numpy as np
+import hashlib
+import logging
+import os
+
+DOCUMENT_MODELS = {'cv': CandidateCV, 'job': JobRequirement}
+
+def content_hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+def document_text(doc_type, path):
+    """
+    Read a PDF and return the keyword-weighted text that gets embedded.
+    """
+    return extract_document_text(path, doc_type)
+
+def extract_documents(doc_type, docs, upload_dir):
+    """
+    Extract the text of many documents. Batches of EXTRACTION_POOL_MIN_BATCH
+    or more go through the process pool. Returns ({doc_id: text}, {doc_id: error}).
+    """
+    items = [(d.id, os.path.join(upload_dir, d.filename), doc_type) for d in docs]
+    texts, errors = {}, {}
+    if len(items) >= current_app.config['EXTRACTION_POOL_MIN_BATCH']:
+        results = extract_many(items, timeout=current_app.config['EXTRACTION_TIMEOUT'])
+        for result in results:
+            if result.error is None:
+                texts[result.key] = result.text
+            else:
+                errors[result.key] = result.error
+    else:
+        for doc_id, path, kind in items:
+            try:
+                texts[doc_id] = document_text(kind, path)
+            except Exception as e:
+                errors[doc_id] = str(e)
+    for doc_id, error in errors.items():
+        logging.error(f"Error extracting {doc_type} {doc_id}: {error}")
+    return texts, errors
+
+def decode_vector(row):
+    return np.frombuffer(row.vector, dtype=np.float32, count=row.dim)
+
+def save_embedding(doc_type, doc_id, text, embedding):
+    """
+    Insert or refresh the stored vector of a document. The caller commits.
+    Returns None if the embedding is unusable (zero or non-finite).
+    """
+    vector = np.asarray(embedding, dtype=np.float32)
+    if not np.isfinite(vector).all() or np.linalg.norm(vector) == 0:
+        logging.warning(f"Not storing invalid embedding for {doc_type} {doc_id}")
+        return None
+
+    row = DocumentEmbedding.query.filter_by(doc_type=doc_type, doc_id=doc_id, model_name=get_model_name()).first()
+    if row is None:
+        row = DocumentEmbedding(doc_type=doc_type, doc_id=doc_id, model_name=get_model_name())
+        db.session.add(row)
+    row.content_hash = content_hash(text)
+    row.dim = int(vector.shape[0])
+    row.vector = vector.tobytes()
+    return row
+
+def delete_embeddings(doc_type, doc_ids):
+    """
+    Drop stored vectors for the given documents. The caller commits.
+    """
+    doc_ids = list(doc_ids)
+    if doc_ids:
+        DocumentEmbedding.query.filter(
+            DocumentEmbedding.doc_type == doc_type,
+            DocumentEmbedding.doc_id.in_(doc_ids)
+        ).delete(synchronize_session=False)
+
+def stored_vectors(doc_type, doc_ids):
+    """
+    Full-precision stored vectors for doc_ids, in order; None where missing.
+    """
+    doc_ids = list(doc_ids)
+    if not doc_ids:
+        return []
+    rows = DocumentEmbedding.query.filter(
+        DocumentEmbedding.doc_type == doc_type,
+        DocumentEmbedding.model_name == get_model_name(),
+        DocumentEmbedding.doc_id.in_(doc_ids)
+    ).all()
+    by_id = {row.doc_id: decode_vector(row) for row in rows}
+    return [by_id.get(doc_id) for doc_id in doc_ids]
+
+def embed_document(doc_type, doc, path, text=None):
+    """
+    Embed an uploaded document and persist its vector.
+    Uploads are saved by filename, so every row pointing at the same file
+    gets the new vector too. Returns (docs, vector); vector is None when
+    nothing usable could be embedded. Errors propagate to the caller.
+    Pass text when it was already extracted.
+    """
+    model = DOCUMENT_MODELS[doc_type]
+    docs = model.query.filter(model.filename == doc.filename).all()
+    if text is None:
+        text = document_text(doc_type, path)
+    if not text.strip():
+        logging.warning(f"No text extracted from {doc_type} {doc.filename}, skipping embedding")
+        delete_embeddings(doc_type, [d.id for d in docs])
+        db.session.commit()
+        return docs, None
+    vector = np.asarray(get_embedding(text), dtype=np.float32)
+    rows = [save_embedding(doc_type, d.id, text, vector) for d in docs]
+    if any(row is None for row in rows):
+        delete_embeddings(doc_type, [d.id for d in docs])
+        vector = None
+    db.session.commit()
+    return docs, vector
+
+def load_embeddings(doc_type, docs, upload_dir):
+    """
+    Return (vectors, docs) for every document that has a usable embedding.
+    Stored vectors are read in one query; documents uploaded before the store
+    existed are embedded once here and persisted.
+    """
+    if not docs:
+        return [], []
+
+    rows = DocumentEmbedding.query.filter(
+        DocumentEmbedding.doc_type == doc_type,
+        DocumentEmbedding.model_name == get_model_name(),
+        DocumentEmbedding.doc_id.in_([d.id for d in docs])
+    ).all()
+    by_id = {row.doc_id: decode_vector(row) for row in rows}
+
+    # Documents without a stored vector are extracted first and embedded in one batch
+    to_extract = [d for d in docs if d.id not in by_id and os.path.exists(os.path.join(upload_dir, d.filename))]
+    texts, _ = extract_documents(doc_type, to_extract, upload_dir)
+    missing = [d for d in to_extract if texts.get(d.id, '').strip()]
+    missing_texts = [texts[d.id] for d in missing]
+
+    if missing:
+        for doc, text, embedding in zip(missing, missing_texts, get_embeddings(missing_texts)):
+            row = save_embedding(doc_type, doc.id, text, embedding)
+            if row is not None:
+                by_id[doc.id] = decode_vector(row)
+        db.session.commit()
+
+    vectors, kept = [], []
+    for doc in docs:
+        vector = by_id.get(doc.id)
+        if vector is not None:
+            vectors.append(vector)
+            kept.append(doc)
+
+    logging.debug(f"Loaded {len(vectors)} {doc_type} embeddings ({len(missing)} backfilled)")
+    return vectors, kept
@@ -0,0 +1,181 @@
+from app import db
+from collections import deque, OrderedDict
+from datetime import datetime, timedelta
+import threading
+import sqlite3
+import logging
+import json
+import time
+import os
+
+class EventBus:
+    """
+    Per-process fan-out of user events. Each user keeps a short buffer of
+    recent events with increasing ids, so an SSE client reconnecting with
+    Last-Event-ID, or a long-poll client passing its last id, gets
+    whatever it missed in between.
+    """
+
+    def __init__(self, buffer_size=50, max_users=10000):
+        self.buffer_size = buffer_size
+        self.max_users = max_users
+        self._buffers = OrderedDict()
+        self._last_id = 0
+        self._cond = threading.Condition()
+
+    def deliver(self, user_id, event, event_id=None):
+        with self._cond:
+            self._last_id = event_id if event_id is not None else self._last_id + 1
+            buffer = self._buffers.get(user_id)
+            if buffer is None:
+                buffer = self._buffers[user_id] = deque(maxlen=self.buffer_size)
+                if len(self._buffers) > self.max_users:
+                    self._buffers.popitem(last=False)
+            self._buffers.move_to_end(user_id)
+            buffer.append({'id': self._last_id, **event})
+            self._cond.notify_all()
+
+    def last_id(self):
+        with self._cond:
+            return self._last_id
+
+    def wait(self, user_id, after, timeout):
+        """
+        Events for user_id newer than `after`, waiting up to timeout
+        seconds for the first one. Returns [] on timeout.
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                events = [e for e in self._buffers.get(user_id, ()) if e['id'] > after]
+                remaining = deadline - time.monotonic()
+                if events or remaining <= 0:
+                    return events
+                self._cond.wait(remaining)
+
+class LocalBackend:
+    """
+    Single-process backend: events go straight to this process's bus.
+    Any object with start(deliver) and publish(user_id, event) can replace
+    it, e.g. one built on Redis pub/sub.
+    """
+
+    def start(self, deliver):
+        self.deliver = deliver
+
+    def publish(self, user_id, event):
+        self.deliver(user_id, event)
+
+class SQLiteBackend:
+    """
+    Cross-process channel through a SQLite file shared by every worker on
+    one host: publish() appends a row and a thread in each process tails
+    the table. Row ids double as event ids, so they agree across processes.
+    """
+
+    def __init__(self, path, poll_interval=0.5, retention_seconds=3600):
+        self.path = path
+        self.poll_interval = poll_interval
+        self.retention_seconds = retention_seconds
+        self._pid = None
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS events ("
+                         "id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER NOT NULL, "
+                         "payload TEXT NOT NULL, created_at TEXT NOT NULL)")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def start(self, deliver):
+        self.deliver = deliver
+        self._ensure_listener()
+
+    def _ensure_listener(self):
+        # Threads do not survive a fork, so each worker starts its own
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            with self._connect() as conn:
+                last = conn.execute("SELECT COALESCE(MAX(id), 0) FROM events").fetchone()[0]
+            threading.Thread(target=self._listen, args=(last,), name='event-listener', daemon=True).start()
+
+    def _listen(self, last):
+        while True:
+            try:
+                with self._connect() as conn:
+                    rows = conn.execute("SELECT id, user_id, payload FROM events WHERE id > ? ORDER BY id",
+                                        (last,)).fetchall()
+                for event_id, user_id, payload in rows:
+                    self.deliver(user_id, json.loads(payload), event_id)
+                    last = event_id
+            except sqlite3.Error as e:
+                logging.warning(f"Event listener error: {str(e)}")
+            time.sleep(self.poll_interval)
+
+    def publish(self, user_id, event):
+        self._ensure_listener()
+        now = datetime.utcnow()
+        with self._connect() as conn:
+            conn.execute("INSERT INTO events (user_id, payload, created_at) VALUES (?, ?, ?)",
+                         (user_id, json.dumps(event, default=str), now.isoformat()))
+            conn.execute("DELETE FROM events WHERE created_at < ?",
+                         ((now - timedelta(seconds=self.retention_seconds)).isoformat(),))
+
+_bus = EventBus()
+_backend = LocalBackend()
+_backend.start(_bus.deliver)
+
+def configure_events(backend='local', sqlite_path=None, buffer_size=50):
+    global _bus, _backend
+    _bus = EventBus(buffer_size=buffer_size)
+    if backend == 'sqlite':
+        _backend = SQLiteBackend(sqlite_path)
+    elif backend == 'local':
+        _backend = LocalBackend()
+    else:
+        _backend = backend
+    _backend.start(_bus.deliver)
+    return _bus
+
+def get_bus():
+    return _bus
+
+def publish(user_id, type_, data):
+    """
+    Send an event to user_id once the current transaction commits, so
+    clients never hear about writes that were rolled back.
+    """
+    # Tie the event to a transaction so a rollback discards it
+    session = db.session()
+    if not session.in_transaction():
+        session.begin()
+    session.info.setdefault('pending_events', []).append((user_id, {'type': type_, 'data': data}))
+
+def _send_pending(session):
+    for user_id, event in session.info.pop('pending_events', []):
+        try:
+            _backend.publish(user_id, event)
+        except Exception as e:
+            # The write already succeeded; clients catch up on reconnect
+            logging.warning(f"Could not publish event to user {user_id}: {str(e)}")
+
+def _drop_pending(session, previous_transaction):
+    # A rolled-back savepoint leaves the outer transaction's events pending
+    if not previous_transaction.nested:
+        session.info.pop('pending_events', None)
+
+def init_events(app):
+    configure_events(
+        backend=app.config['EVENT_BACKEND'],
+        sqlite_path=app.config['EVENT_SQLITE_PATH'],
+        buffer_size=app.config['EVENT_BUFFER_SIZE']
+    )
+    from sqlalchemy import event
+    if not event.contains(db.session, 'after_commit', _send_pending):
+        event.listen(db.session, 'after_commit', _send_pending)
+        event.listen(db.session, 'after_soft_rollback', _drop_pending)
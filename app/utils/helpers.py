@@ -1,24 +1,30 @@
 from flask import url_for
 from app.models import CandidateCV, JobRequirement, Message, User
+from app.utils.loaders import lookups
+from app.utils.events import publish
+from app.utils.counters import get_counts
+# notify() lives with the notification outbox; re-exported for callers
+from app.utils.notifications import notify, notify_many
 from app import db
 
+# Lookups go through the request's LookupCache, so repeated calls from a
+# template cost nothing and routes can prefetch them in bulk
+
 def get_cv_filename(cv_id):
-    cv = CandidateCV.query.get(cv_id)
+    cv = lookups().get(CandidateCV, cv_id)
     return cv.filename if cv else "unknown.pdf"
 
 def get_job_filename(job_id):
-    job = JobRequirement.query.get(job_id)
+    job = lookups().get(JobRequirement, job_id)
     return job.filename if job else "unknown.pdf"
 
 def get_filename_from_message(message):
     if message.message_type == 'application':
         if message.file_type == 'job':
-            job = JobRequirement.query.get(message.file_id)
-            return job.filename if job else "unknown.pdf"
+            return get_job_filename(message.file_id)
     elif message.message_type == 'invite':
         if message.file_type == 'cv':
-            cv = CandidateCV.query.get(message.file_id)
-            return cv.filename if cv else "unknown.pdf"
+            return get_cv_filename(message.file_id)
     return "unknown.pdf"
 
 def get_file_url_from_message(message):
@@ -34,22 +40,32 @@ def get_file_url_from_message(message):
     return "#"
 
 def get_sender_cv_filename(sender_id):
-    sender = User.query.get(sender_id)
-    if sender and sender.cvs:
-        return sender.cvs[0].filename
-    return "unknown.pdf"
+    cv = lookups().first(CandidateCV, sender_id)
+    return cv.filename if cv else "unknown.pdf"
 
 def get_sender_job_filename(sender_id):
-    sender = User.query.get(sender_id)
-    if sender and sender.job_requirements:
-        return sender.job_requirements[0].filename
-    return "unknown.pdf"
+    job = lookups().first(JobRequirement, sender_id)
+    return job.filename if job else "unknown.pdf"
+
+def user_counts(user):
+    """
+    Badge counts for a user: unread messages, plus shortlisted CVs for job
+    givers or saved jobs for candidates.
+    """
+    stored = get_counts(user.id)
+    counts = {'unread': stored['unread_messages']}
+    if user.role == 'jobgiver':
+        counts['shortlist'] = stored['shortlisted_cvs']
+    elif user.role == 'candidate':
+        counts['saved'] = stored['saved_jobs']
+    return counts
 
-def notify(user_id, title, body, type_, related_id):
-    from app.models import Notification
-    n = Notification(user_id=user_id, title=title, body=body, type=type_, related_id=related_id)
-    db.session.add(n)
-    db.session.commit()
+def publish_counts(user):
+    """
+    Push the user's counts after a write that changed them. Call before
+    the commit; the pending changes are flushed into the counts.
+    """
+    publish(user.id, 'counts', user_counts(user))
 
 def utility_processor():
     return dict(
@@ -0,0 +1,201 @@
+from flask import current_app
+from app import db
+from app.utils.embeddings import DOCUMENT_MODELS, extract_documents, document_text
+from app.utils.skills import record_cv_skills
+from app.utils.vector_indexes import index_document, UPLOAD_FOLDERS
+from sqlalchemy import or_, and_
+from datetime import datetime, timedelta
+import threading
+import logging
+import os
+
+SIDES = ('cv', 'job')
+
+class PermanentIngestError(Exception):
+    """A document that retrying cannot fix (missing file, no extractable text)."""
+
+def _claimable(model, now):
+    # Pending rows whose retry delay has passed, plus rows whose worker
+    # lease expired (the worker died mid-document)
+    return or_(
+        and_(model.status == 'pending', or_(model.next_attempt_at.is_(None), model.next_attempt_at <= now)),
+        and_(model.status == 'processing', model.next_attempt_at <= now)
+    )
+
+def claim_batch(side, limit):
+    """
+    Claim up to `limit` documents for this worker. Each claim is a
+    conditional UPDATE, so concurrent workers never share a document.
+    """
+    model = DOCUMENT_MODELS[side]
+    now = datetime.utcnow()
+    lease_until = now + timedelta(seconds=current_app.config['INGEST_LEASE_SECONDS'])
+    candidates = model.query.with_entities(model.id).filter(_claimable(model, now)).order_by(model.id).limit(limit).all()
+
+    claimed = []
+    for (doc_id,) in candidates:
+        updated = model.query.filter(model.id == doc_id, _claimable(model, now)).update(
+            {'status': 'processing', 'next_attempt_at': lease_until}, synchronize_session=False
+        )
+        if updated:
+            claimed.append(doc_id)
+    db.session.commit()
+    if not claimed:
+        return []
+    return model.query.filter(model.id.in_(claimed)).order_by(model.id).all()
+
+def ingest_document(side, doc, text=None, extract_error=None):
+    """
+    Extract, embed and index one claimed document, then record the outcome.
+    text/extract_error carry the result of an earlier batch extraction.
+    Returns True when the document became ready.
+    """
+    doc_id = doc.id
+    path = os.path.join(current_app.config[UPLOAD_FOLDERS[side]], doc.filename)
+    try:
+        if not os.path.exists(path):
+            raise PermanentIngestError("Uploaded file is missing")
+        if extract_error is not None:
+            raise ValueError(extract_error)
+        if index_document(side, doc, path, text=text) is None:
+            raise PermanentIngestError("No text could be extracted from the PDF")
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"Ingestion of {side} {doc_id} failed: {str(e)}")
+        _record_failure(doc, e)
+        return False
+
+    if side == 'cv':
+        _record_skills(doc, path, text)
+
+    doc.status = 'ready'
+    doc.ingest_error = None
+    doc.next_attempt_at = None
+    _commit_status(doc)
+    return True
+
+def _record_skills(doc, path, text):
+    # Detected skills are a bonus; failing here does not fail ingestion
+    try:
+        record_cv_skills(doc, text if text is not None else document_text('cv', path))
+    except Exception as e:
+        db.session.rollback()
+        logging.warning(f"Skill extraction for cv {doc.id} failed: {str(e)}")
+
+def _record_failure(doc, error):
+    try:
+        doc.ingest_attempts = (doc.ingest_attempts or 0) + 1
+        doc.ingest_error = str(error)[:1000]
+        if isinstance(error, PermanentIngestError) or doc.ingest_attempts >= current_app.config['INGEST_MAX_ATTEMPTS']:
+            doc.status = 'failed'
+            doc.next_attempt_at = None
+        else:
+            # Exponential backoff between attempts
+            delay = current_app.config['INGEST_RETRY_DELAY'] * 2 ** (doc.ingest_attempts - 1)
+            doc.status = 'pending'
+            doc.next_attempt_at = datetime.utcnow() + timedelta(seconds=delay)
+        db.session.commit()
+    except Exception as e:
+        # Most likely deleted while we were working on it
+        db.session.rollback()
+        logging.warning(f"Could not record ingestion failure: {str(e)}")
+
+def _commit_status(doc):
+    try:
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logging.warning(f"Could not record ingestion status: {str(e)}")
+
+def process_pending(limit):
+    """
+    Ingest up to `limit` claimable documents per side. Returns how many were handled.
+    """
+    handled = 0
+    for side in SIDES:
+        docs = claim_batch(side, limit)
+        if not docs:
+            continue
+        # Parse the whole batch in parallel before embedding
+        upload_dir = current_app.config[UPLOAD_FOLDERS[side]]
+        present = [d for d in docs if os.path.exists(os.path.join(upload_dir, d.filename))]
+        texts, errors = extract_documents(side, present, upload_dir)
+        for doc in docs:
+            ingest_document(side, doc, text=texts.get(doc.id), extract_error=errors.get(doc.id))
+            handled += 1
+    return handled
+
+def retry_failed(side=None):
+    """
+    Put failed documents back in the queue with a fresh attempt budget.
+    """
+    count = 0
+    for s in ([side] if side else SIDES):
+        model = DOCUMENT_MODELS[s]
+        count += model.query.filter_by(status='failed').update(
+            {'status': 'pending', 'ingest_attempts': 0, 'ingest_error': None, 'next_attempt_at': None},
+            synchronize_session=False
+        )
+    db.session.commit()
+    return count
+
+class IngestWorker:
+    """
+    Background thread that drains the ingestion queue. It sleeps between
+    polls and is woken immediately when an upload is enqueued.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self.run, name='ingest-worker', daemon=True)
+                self._thread.start()
+
+    def wake(self):
+        self._wake.set()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def run(self):
+        while not self._stop.is_set():
+            try:
+                with self.app.app_context():
+                    handled = process_pending(self.app.config['INGEST_BATCH_SIZE'])
+            except Exception as e:
+                logging.error(f"Ingest worker error: {str(e)}")
+                handled = 0
+            if not handled:
+                self._wake.wait(self.app.config['INGEST_POLL_INTERVAL'])
+                self._wake.clear()
+
+def init_ingestion(app):
+    """
+    Attach the in-process worker. It starts with the first request, so
+    CLI commands do not spawn it; set INGEST_IN_PROCESS to False when a
+    dedicated `flask ingest-worker` process drains the queue instead.
+    """
+    worker = IngestWorker(app)
+    app.extensions['ingest_worker'] = worker
+    if app.config['INGEST_IN_PROCESS']:
+        app.before_request(worker.start)
+    return worker
+
+def enqueue(side, doc):
+    """
+    Signal that a committed document (status 'pending') awaits ingestion.
+    """
+    worker = current_app.extensions.get('ingest_worker')
+    if worker is not None and current_app.config['INGEST_IN_PROCESS']:
+        worker.start()
+        worker.wake()
+    logging.debug(f"Queued {side} {doc.id} for ingestion")
@@ -0,0 +1,80 @@
+from flask import g, session
+from app import db
+from app.models import User, CandidateCV, JobRequirement
+from sqlalchemy import func
+
+def current_user():
+    """
+    The logged-in User, loaded once per request; None when logged out.
+    """
+    if 'current_user' not in g:
+        g.current_user = _load_current_user()
+    return g.current_user
+
+def _load_current_user():
+    if 'username' not in session:
+        return None
+    user_id = session.get('user_id')
+    user = db.session.get(User, user_id) if user_id is not None else None
+    # Sessions from before user_id was stored, or pointing at a deleted
+    # account, fall back to the username
+    if user is None or user.username != session['username']:
+        user = User.query.filter_by(username=session['username']).first()
+        if user is not None:
+            session['user_id'] = user.id
+    return user
+
+class LookupCache:
+    """
+    Per-request memo for template helper lookups. prefetch() loads many
+    ids with one IN query; get() loads whatever was not prefetched.
+    Missing rows are remembered as None so they are not queried again.
+    """
+
+    def __init__(self):
+        self._rows = {}
+        self._first = {}
+
+    def prefetch(self, model, ids):
+        missing = {i for i in ids if i is not None and (model, i) not in self._rows}
+        if not missing:
+            return
+        for row in model.query.filter(model.id.in_(missing)).all():
+            self._rows[(model, row.id)] = row
+        for i in missing:
+            self._rows.setdefault((model, i), None)
+
+    def get(self, model, id_):
+        self.prefetch(model, [id_])
+        return self._rows.get((model, id_))
+
+    def prefetch_first(self, model, user_ids):
+        """
+        Load the first (lowest id) document of each user.
+        """
+        missing = {i for i in user_ids if i is not None and (model, i) not in self._first}
+        if not missing:
+            return
+        first_ids = db.session.query(func.min(model.id)).filter(model.user_id.in_(missing)).group_by(model.user_id)
+        for row in model.query.filter(model.id.in_(first_ids)).all():
+            self._first[(model, row.user_id)] = row
+        for i in missing:
+            self._first.setdefault((model, i), None)
+
+    def first(self, model, user_id):
+        self.prefetch_first(model, [user_id])
+        return self._first.get((model, user_id))
+
+def lookups():
+    if 'lookups' not in g:
+        g.lookups = LookupCache()
+    return g.lookups
+
+def prefetch_messages(messages):
+    """
+    Warm the lookup cache with every file referenced by the messages
+    about to be rendered.
+    """
+    cache = lookups()
+    cache.prefetch(CandidateCV, [m.file_id for m in messages if m.file_type == 'cv'])
+    cache.prefetch(JobRequirement, [m.file_id for m in messages if m.file_type == 'job'])
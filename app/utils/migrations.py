@@ -0,0 +1,319 @@
+from app import db
+from sqlalchemy import inspect, text, Table, Column, Integer, String, Text, Date, DateTime, MetaData, Index, ForeignKey, func
+from sqlalchemy.schema import CreateIndex, CreateTable
+from datetime import datetime
+import logging
+
+class MigrationError(Exception):
+    """A migration that cannot be applied without manual cleanup."""
+
+# Applied versions are recorded here; schema.sql creates it for new installs
+_meta = MetaData()
+schema_migrations = Table(
+    'schema_migrations', _meta,
+    Column('version', Integer, primary_key=True),
+    Column('name', String(200), nullable=False),
+    Column('applied_at', DateTime, nullable=False),
+)
+
+# Tables created by migrations, declared here as they shipped rather than
+# taken from the models, so a migration always creates the same table.
+# users is only declared for foreign keys to point at.
+Table('users', _meta, Column('id', Integer, primary_key=True))
+
+user_counters = Table(
+    'user_counters', _meta,
+    Column('user_id', Integer, ForeignKey('users.id', ondelete='CASCADE'), primary_key=True, autoincrement=False),
+    Column('unread_messages', Integer, nullable=False, server_default='0'),
+    Column('saved_jobs', Integer, nullable=False, server_default='0'),
+    Column('shortlisted_cvs', Integer, nullable=False, server_default='0'),
+    Column('updated_at', DateTime),
+)
+
+activity_rollups = Table(
+    'activity_rollups', _meta,
+    Column('day', Date, primary_key=True),
+    Column('metric', String(50), primary_key=True),
+    Column('count', Integer, nullable=False, server_default='0'),
+)
+
+deletion_jobs = Table(
+    'deletion_jobs', _meta,
+    Column('id', Integer, primary_key=True),
+    Column('user_id', Integer, nullable=False),
+    Column('username', String(100), nullable=False),
+    Column('role', String(20)),
+    Column('requested_by', Integer),
+    Column('status', String(20), nullable=False, server_default='pending'),
+    Column('stage', String(30)),
+    Column('rows_total', Integer),
+    Column('rows_deleted', Integer, nullable=False, server_default='0'),
+    Column('files_removed', Integer, nullable=False, server_default='0'),
+    Column('attempts', Integer, nullable=False, server_default='0'),
+    Column('error', Text),
+    Column('next_attempt_at', DateTime),
+    Column('created_at', DateTime, server_default=func.current_timestamp()),
+    Column('updated_at', DateTime, server_default=func.current_timestamp()),
+    Column('finished_at', DateTime),
+    Index('idx_deletion_jobs_claim', 'status', 'next_attempt_at'),
+    Index('idx_deletion_jobs_user', 'user_id'),
+)
+
+catalog_versions = Table(
+    'catalog_versions', _meta,
+    Column('name', String(50), primary_key=True),
+    Column('version', Integer, nullable=False, server_default='0'),
+    Column('updated_at', DateTime, server_default=func.current_timestamp()),
+)
+
+def index(table, name, columns, unique=False, dedupe=False):
+    """
+    Step: create an index unless one over the same columns already exists.
+    A unique index over duplicated rows either deletes the extras (keeping
+    the lowest id, the row `.first()` used to return) when dedupe is set,
+    or stops with a MigrationError listing them.
+    """
+    return {'table': table, 'name': name, 'columns': list(columns), 'unique': unique, 'dedupe': dedupe}
+
+def table(table):
+    """
+    Step: create a table, with its indexes, unless it exists.
+    """
+    return {'table': table.name, 'create': table}
+
+def seed(table, row, key):
+    """
+    Step: insert row unless the table already has a row with its key
+    column value.
+    """
+    return {'table': table.name, 'seed': table, 'row': row, 'key': key}
+
+def column(table, name, ddl, backfill=None):
+    """
+    Step: add a column unless it exists, then run the optional backfill
+    statement once.
+    """
+    return {'table': table, 'column': name, 'ddl': ddl, 'backfill': backfill}
+
+# Versioned, append-only: never edit a migration that has shipped
+MIGRATIONS = [
+    (1, 'Indexes and uniqueness for hot query paths', [
+        index('users', 'unique_username', ['username'], unique=True),
+        index('candidate_cvs', 'idx_cvs_domain_status', ['domain', 'status']),
+        index('candidate_cvs', 'idx_cvs_filename', ['filename']),
+        index('candidate_cvs', 'idx_cvs_ingest', ['status', 'next_attempt_at']),
+        index('job_requirements', 'idx_jobs_domain_status', ['domain', 'status']),
+        index('job_requirements', 'idx_jobs_filename', ['filename']),
+        index('job_requirements', 'idx_jobs_ingest', ['status', 'next_attempt_at']),
+        index('messages', 'idx_messages_receiver_read', ['receiver_id', 'is_read']),
+        index('messages', 'idx_messages_receiver_sent', ['receiver_id', 'sent_at', 'id']),
+        index('messages', 'idx_messages_sender_sent', ['sender_id', 'sent_at', 'id']),
+        index('messages', 'idx_messages_sender_file', ['sender_id', 'message_type', 'file_id', 'receiver_id']),
+        index('notifications', 'idx_notifications_user_read', ['user_id', 'is_read']),
+        index('applications', 'unique_application', ['candidate_id', 'job_id'], unique=True, dedupe=True),
+        index('shortlists', 'unique_shortlist', ['jobgiver_id', 'cv_id'], unique=True, dedupe=True),
+        index('saved_jobs', 'unique_save', ['candidate_id', 'job_id'], unique=True, dedupe=True),
+        index('user_skills', 'unique_user_skill', ['user_id', 'skill_name'], unique=True, dedupe=True),
+    ]),
+    (2, 'Notification delivery state for the background dispatcher', [
+        # Existing notifications count as delivered
+        column('notifications', 'delivered_at', 'DATETIME NULL',
+               backfill="UPDATE notifications SET delivered_at = created_at WHERE delivered_at IS NULL"),
+        index('notifications', 'idx_notifications_undelivered', ['delivered_at', 'id']),
+    ]),
+    (3, 'Mark skills found in CVs', [
+        # Existing skills were all entered by hand
+        column('user_skills', 'source', "VARCHAR(20) NOT NULL DEFAULT 'manual'"),
+    ]),
+    # Rows are created at registration; `flask counters-reconcile` adds
+    # them for existing users
+    (4, 'Per-user badge counters', [
+        table(user_counters),
+    ]),
+    (5, 'Daily activity counts for the admin dashboard', [
+        table(activity_rollups),
+    ]),
+    (6, 'Background user deletion', [
+        table(deletion_jobs),
+    ]),
+    (7, 'Version stamps for cached catalogs', [
+        table(catalog_versions),
+        seed(catalog_versions, {'name': 'career_paths', 'version': 1}, 'name'),
+    ]),
+    (8, 'Lock accounts waiting for deletion', [
+        # Accounts already queued were locked by setting their role
+        column('users', 'locked_at', 'DATETIME NULL',
+               backfill="UPDATE users SET locked_at = CURRENT_TIMESTAMP, role = COALESCE("
+                        "(SELECT MAX(role) FROM deletion_jobs WHERE deletion_jobs.user_id = users.id), role) "
+                        "WHERE role = 'deleted'"),
+    ]),
+    (9, 'Remember skills users deleted', [
+        column('user_skills', 'suppressed', 'BOOLEAN NOT NULL DEFAULT FALSE'),
+    ]),
+]
+
+# DDL in these can be rolled back, so a dry run can show the plans the
+# migration would produce; MySQL commits every DDL statement
+TRANSACTIONAL_DDL = ('sqlite', 'postgresql')
+
+# Queries every request path depends on, checked with EXPLAIN
+HOT_QUERIES = [
+    ('login', "SELECT id FROM users WHERE username = :username", {'username': 'x'}),
+    ('inbox', "SELECT id, sent_at FROM messages WHERE receiver_id = :user_id ORDER BY sent_at DESC, id DESC",
+     {'user_id': 1}),
+    ('inbox unread count', "SELECT COUNT(*) FROM messages WHERE receiver_id = :user_id AND is_read = :is_read",
+     {'user_id': 1, 'is_read': False}),
+    ('invite check', "SELECT id FROM messages WHERE sender_id = :user_id AND receiver_id = :other_id "
+     "AND message_type = 'invite' AND file_id = :file_id", {'user_id': 1, 'other_id': 2, 'file_id': 1}),
+    ('unread notifications', "SELECT COUNT(*) FROM notifications WHERE user_id = :user_id AND is_read = :is_read",
+     {'user_id': 1, 'is_read': False}),
+    ('match cvs', "SELECT id FROM candidate_cvs WHERE domain = :domain AND status = 'ready'", {'domain': 'x'}),
+    ('match jobs', "SELECT id FROM job_requirements WHERE domain = :domain AND status = 'ready'", {'domain': 'x'}),
+    ('cv by filename', "SELECT id FROM candidate_cvs WHERE filename = :filename", {'filename': 'x'}),
+    ('job by filename', "SELECT id FROM job_requirements WHERE filename = :filename", {'filename': 'x'}),
+]
+
+def applied_versions(connection):
+    if not inspect(connection).has_table('schema_migrations'):
+        return set()
+    return {row.version for row in connection.execute(schema_migrations.select())}
+
+def pending_migrations(connection):
+    applied = applied_versions(connection)
+    return [m for m in MIGRATIONS if m[0] not in applied]
+
+def _existing_indexes(connection, table):
+    inspector = inspect(connection)
+    indexes = [(ix['column_names'], ix.get('unique', False)) for ix in inspector.get_indexes(table)]
+    indexes += [(uc['column_names'], True) for uc in inspector.get_unique_constraints(table)]
+    return indexes
+
+def _covered(connection, step):
+    for columns, unique in _existing_indexes(connection, step['table']):
+        if columns == step['columns'] and (unique or not step['unique']):
+            return True
+    return False
+
+def _duplicate_groups(connection, step):
+    columns = ', '.join(step['columns'])
+    return connection.execute(text(
+        f"SELECT {columns}, COUNT(*) AS n FROM {step['table']} GROUP BY {columns} HAVING COUNT(*) > 1"
+    )).fetchall()
+
+def _dedupe_sql(step):
+    columns = ', '.join(step['columns'])
+    # The derived table lets MySQL delete from the table it reads
+    return (f"DELETE FROM {step['table']} WHERE id NOT IN "
+            f"(SELECT keep FROM (SELECT MIN(id) AS keep FROM {step['table']} GROUP BY {columns}) AS keepers)")
+
+def _create_sql(connection, step):
+    table = Table(step['table'], MetaData(), *(Column(c) for c in step['columns']))
+    ix = Index(step['name'], *(table.c[c] for c in step['columns']), unique=step['unique'])
+    return str(CreateIndex(ix).compile(dialect=connection.dialect))
+
+def plan_step(connection, step):
+    """
+    SQL statements this step would run against the current database.
+    """
+    if 'create' in step:
+        if inspect(connection).has_table(step['table']):
+            return []
+        create = step['create']
+        indexes = sorted(create.indexes, key=lambda ix: ix.name)
+        return [str(CreateTable(create).compile(dialect=connection.dialect))] + \
+            [str(CreateIndex(ix).compile(dialect=connection.dialect)) for ix in indexes]
+    if 'seed' in step:
+        seeded, key = step['seed'], step['key']
+        # A dry run may not have created the table yet
+        if inspect(connection).has_table(step['table']) and connection.execute(
+                seeded.select().where(seeded.c[key] == step['row'][key])).first():
+            return []
+        insert = seeded.insert().values(**step['row'])
+        return [str(insert.compile(dialect=connection.dialect, compile_kwargs={'literal_binds': True}))]
+    if 'column' in step:
+        if step['column'] in {c['name'] for c in inspect(connection).get_columns(step['table'])}:
+            return []
+        statements = [f"ALTER TABLE {step['table']} ADD COLUMN {step['column']} {step['ddl']}"]
+        return statements + ([step['backfill']] if step['backfill'] else [])
+    if _covered(connection, step):
+        return []
+    statements = []
+    if step['unique']:
+        duplicates = _duplicate_groups(connection, step)
+        if duplicates and not step['dedupe']:
+            raise MigrationError(
+                f"{step['table']} has duplicate {', '.join(step['columns'])} values; "
+                f"resolve them before adding {step['name']}: {[tuple(row) for row in duplicates[:10]]}"
+            )
+        if duplicates:
+            statements.append(_dedupe_sql(step))
+    statements.append(_create_sql(connection, step))
+    return statements
+
+def migrate(dry_run=False):
+    """
+    Apply pending migrations in version order. Returns [(version, name,
+    statements)]. Steps are idempotent, so a run interrupted halfway
+    (MySQL commits every DDL statement) can simply be repeated.
+    """
+    results = []
+    with db.engine.connect() as connection:
+        if not dry_run:
+            schema_migrations.create(connection, checkfirst=True)
+            connection.commit()
+        for version, name, steps in pending_migrations(connection):
+            statements = []
+            for step in steps:
+                step_statements = plan_step(connection, step)
+                statements.extend(step_statements)
+                if dry_run:
+                    continue
+                for sql in step_statements:
+                    logging.info(f"Migration {version}: {sql}")
+                    connection.execute(text(sql))
+                connection.commit()
+            if not dry_run:
+                connection.execute(schema_migrations.insert().values(
+                    version=version, name=name, applied_at=datetime.utcnow()))
+                connection.commit()
+            results.append((version, name, statements))
+    return results
+
+def _explain(connection):
+    prefix = 'EXPLAIN QUERY PLAN ' if connection.dialect.name == 'sqlite' else 'EXPLAIN '
+    plans = []
+    for label, sql, params in HOT_QUERIES:
+        rows = connection.execute(text(prefix + sql), params).mappings().all()
+        plans.append((label, [dict(row) for row in rows]))
+    return plans
+
+def explain_hot_queries():
+    """
+    [(label, [plan row dicts])] for HOT_QUERIES on the current database.
+    """
+    with db.engine.connect() as connection:
+        return _explain(connection)
+
+def preview_migration():
+    """
+    Dry run of migrate() that also shows what it does to the hot queries:
+    (results, plans now, plans after migrating). Where DDL is
+    transactional the pending statements are applied inside a savepoint,
+    explained and rolled back; elsewhere plans after migrating is None.
+    """
+    results = migrate(dry_run=True)
+    before = explain_hot_queries()
+    if not results or db.engine.dialect.name not in TRANSACTIONAL_DDL:
+        return results, before, None
+    with db.engine.connect() as connection:
+        connection.exec_driver_sql('SAVEPOINT migration_preview')
+        try:
+            for version, name, steps in pending_migrations(connection):
+                for step in steps:
+                    for sql in plan_step(connection, step):
+                        connection.execute(text(sql))
+            after = _explain(connection)
+        finally:
+            connection.exec_driver_sql('ROLLBACK TO SAVEPOINT migration_preview')
+            connection.rollback()
+    return results, before, after
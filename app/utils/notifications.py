@@ -0,0 +1,154 @@
+from flask import current_app
+from app import db
+from app.models import Notification
+from app.utils.events import publish
+from sqlalchemy import insert
+from datetime import datetime
+import threading
+import logging
+import atexit
+
+# Notifications are collected on the session and written in one bulk
+# INSERT when the caller commits, together with the write that caused them
+
+def notify(user_id, title, body, type_, related_id):
+    """
+    Queue a notification in the current transaction. Nothing is written
+    until the caller commits; a rollback discards it.
+    """
+    notify_many([user_id], title, body, type_, related_id)
+
+def notify_many(user_ids, title, body, type_, related_id):
+    """
+    Queue the same notification for several users; still one INSERT.
+    """
+    session = db.session()
+    if not session.in_transaction():
+        session.begin()
+    outbox = session.info.setdefault('notification_outbox', [])
+    for user_id in user_ids:
+        outbox.append({'user_id': user_id, 'title': title, 'body': body, 'type': type_, 'related_id': related_id})
+
+def _event(row):
+    return {'title': row['title'], 'body': row['body'], 'type': row['type'], 'related_id': row['related_id']}
+
+def _write_outbox(session):
+    outbox = session.info.pop('notification_outbox', None)
+    if not outbox:
+        return
+    now = datetime.utcnow()
+    background = current_app.config['NOTIFICATION_DISPATCH'] == 'background'
+    for row in outbox:
+        row['created_at'] = now
+        row['is_read'] = False
+        # Background mode leaves delivery to the dispatcher
+        row['delivered_at'] = None if background else now
+    session.execute(insert(Notification), outbox)
+    if background:
+        session.info['wake_dispatcher'] = True
+    else:
+        for row in outbox:
+            publish(row['user_id'], 'notification', _event(row))
+
+def _discard_outbox(session, previous_transaction):
+    if not previous_transaction.nested:
+        session.info.pop('notification_outbox', None)
+
+def _after_commit(session):
+    if session.info.pop('wake_dispatcher', False):
+        dispatcher = current_app.extensions.get('notification_dispatcher')
+        if dispatcher is not None:
+            dispatcher.start()
+            dispatcher.wake()
+
+def dispatch_pending(limit):
+    """
+    Deliver up to `limit` undelivered notifications. The batch is claimed
+    with one conditional UPDATE, so concurrent dispatchers never deliver
+    the same row twice; rows they hold locked are skipped where the
+    database supports it. Returns how many were delivered.
+    """
+    pending = Notification.query.filter(Notification.delivered_at.is_(None)).order_by(Notification.id).limit(
+        limit).with_for_update(skip_locked=True).all()
+    if not pending:
+        db.session.commit()
+        return 0
+    ids = [n.id for n in pending]
+    now = datetime.utcnow()
+    claimed = Notification.query.filter(Notification.id.in_(ids), Notification.delivered_at.is_(None)).update(
+        {'delivered_at': now}, synchronize_session=False
+    )
+    if claimed < len(ids):
+        # Another dispatcher claimed some first (no SKIP LOCKED, e.g. SQLite)
+        ours = {row_id for (row_id,) in db.session.query(Notification.id).filter(
+            Notification.id.in_(ids), Notification.delivered_at == now)}
+        pending = [n for n in pending if n.id in ours]
+    events = [(n.user_id, {'title': n.title, 'body': n.body, 'type': n.type, 'related_id': n.related_id}) for n in pending]
+    db.session.commit()
+    for user_id, event in events:
+        publish(user_id, 'notification', event)
+    return len(events)
+
+class NotificationDispatcher:
+    """
+    Background thread delivering notifications written in 'background'
+    dispatch mode. Woken when such a notification commits.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self.run, name='notification-dispatcher', daemon=True)
+                self._thread.start()
+
+    def wake(self):
+        self._wake.set()
+
+    def stop(self, timeout=None):
+        """
+        Stop after the current batch; waits up to `timeout` seconds for it.
+        """
+        self._stop.set()
+        self._wake.set()
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout)
+
+    def run(self):
+        while not self._stop.is_set():
+            try:
+                with self.app.app_context():
+                    handled = dispatch_pending(self.app.config['NOTIFICATION_DISPATCH_BATCH'])
+            except Exception as e:
+                logging.error(f"Notification dispatcher error: {str(e)}")
+                handled = 0
+            if not handled:
+                self._wake.wait(self.app.config['NOTIFICATION_DISPATCH_INTERVAL'])
+                self._wake.clear()
+
+def init_notifications(app):
+    """
+    Hook the outbox into commits. With NOTIFICATION_DISPATCH set to
+    'background' an in-process dispatcher starts with the first request
+    (or run `flask notifications-dispatch` instead).
+    """
+    from sqlalchemy import event
+    if not event.contains(db.session, 'before_commit', _write_outbox):
+        event.listen(db.session, 'before_commit', _write_outbox)
+        event.listen(db.session, 'after_soft_rollback', _discard_outbox)
+        event.listen(db.session, 'after_commit', _after_commit)
+    dispatcher = NotificationDispatcher(app)
+    app.extensions['notification_dispatcher'] = dispatcher
+    if app.config['NOTIFICATION_DISPATCH'] == 'background':
+        app.before_request(dispatcher.start)
+        # Lets a batch being delivered at exit finish its commit
+        atexit.register(dispatcher.stop, app.config['NOTIFICATION_DISPATCH_INTERVAL'])
+    return dispatcher
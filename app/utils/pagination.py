@@ -0,0 +1,45 @@
+from sqlalchemy import or_, and_
+from datetime import datetime
+
+# Keyset pagination on (timestamp, id): each page starts where the last
+# one ended, so deep pages cost the same as the first one
+
+def encode_cursor(timestamp, id_):
+    return f"{timestamp.strftime('%Y-%m-%dT%H:%M:%S.%f')}_{id_}"
+
+def decode_cursor(value):
+    """
+    (timestamp, id) from encode_cursor(), or None if value is not a cursor.
+    """
+    try:
+        timestamp, id_ = value.rsplit('_', 1)
+        return datetime.fromisoformat(timestamp), int(id_)
+    except (AttributeError, ValueError):
+        return None
+
+def keyset_filter(time_column, id_column, cursor, newer=False):
+    """
+    Rows strictly before (or after, when newer is set) the cursor position
+    in (time_column, id_column) order. Spelled out instead of a row-value
+    comparison so MySQL can use the composite index as a range.
+    """
+    timestamp, id_ = cursor
+    if newer:
+        return or_(time_column > timestamp, and_(time_column == timestamp, id_column > id_))
+    return or_(time_column < timestamp, and_(time_column == timestamp, id_column < id_))
+
+def keyset_page(query, time_column, id_column, limit, before=None, since=None):
+    """
+    Up to `limit` rows newest first, older than `before` or newer than
+    `since` (decoded cursors). Returns (rows, has_more); with `since` the
+    rows closest to the cursor come back, so repeating the call with the
+    newest row's cursor walks forward without gaps.
+    """
+    if since is not None:
+        query = query.filter(keyset_filter(time_column, id_column, since, newer=True))
+        rows = query.order_by(time_column.asc(), id_column.asc()).limit(limit + 1).all()
+        return list(reversed(rows[:limit])), len(rows) > limit
+    if before is not None:
+        query = query.filter(keyset_filter(time_column, id_column, before))
+    rows = query.order_by(time_column.desc(), id_column.desc()).limit(limit + 1).all()
+    return rows[:limit], len(rows) > limit
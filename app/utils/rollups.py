@@ -0,0 +1,111 @@
+from app import db
+from app.models import ActivityRollup
+from sqlalchemy import func, update, insert
+from sqlalchemy.exc import IntegrityError
+from collections import Counter
+from datetime import datetime, timedelta
+import threading
+import logging
+import atexit
+import time
+
+# Counts committed in this process but not written yet: {(day, metric): n}.
+# They are written at most every ACTIVITY_FLUSH_INTERVAL seconds, so a busy
+# metric costs one UPDATE per process per interval instead of one inside
+# every request's transaction
+_pending = Counter()
+_pending_lock = threading.Lock()
+_flushed_at = time.monotonic()
+_flush_interval = 0
+
+def configure_rollups(flush_interval=0):
+    global _flush_interval
+    _flush_interval = flush_interval
+
+def record_activity(metric, n=1):
+    """
+    Add n to today's count of metric once the current transaction commits.
+    """
+    day = datetime.utcnow().date()
+    session = db.session()
+    # Begun now, so a rollback before any query still drops the count
+    if not session.in_transaction():
+        session.begin()
+    session.info.setdefault('activity', Counter())[(day, metric)] += n
+
+def _write(connection, day, metric, n):
+    table = ActivityRollup.__table__
+    values = {'count': table.c.count + n}
+    where = (table.c.day == day, table.c.metric == metric)
+    if connection.execute(update(table).where(*where).values(values)).rowcount:
+        return
+    try:
+        with connection.begin_nested():
+            connection.execute(insert(table).values(day=day, metric=metric, count=n))
+    except IntegrityError:
+        # First of the day was written concurrently
+        connection.execute(update(table).where(*where).values(values))
+
+def flush():
+    """
+    Write this process's pending counts in one short transaction of its
+    own. On failure they are kept for the next flush.
+    """
+    global _flushed_at
+    with _pending_lock:
+        counts = dict(_pending)
+        _pending.clear()
+        _flushed_at = time.monotonic()
+    if not counts:
+        return
+    try:
+        with db.engine.begin() as connection:
+            for (day, metric), n in sorted(counts.items()):
+                _write(connection, day, metric, n)
+    except Exception as e:
+        logging.warning(f"Could not write activity counts: {str(e)}")
+        with _pending_lock:
+            _pending.update(counts)
+
+def _merge_committed(session):
+    counts = session.info.pop('activity', None)
+    if not counts:
+        return
+    with _pending_lock:
+        _pending.update(counts)
+        due = time.monotonic() - _flushed_at >= _flush_interval
+    if due:
+        flush()
+
+def _discard(session, previous_transaction):
+    if not previous_transaction.nested:
+        session.info.pop('activity', None)
+
+def _flush_at_exit(app):
+    with app.app_context():
+        flush()
+
+def activity_totals(days):
+    """
+    {metric: total} over the last `days` days, today included. Counts
+    this process has not flushed yet are included; other processes'
+    show up within ACTIVITY_FLUSH_INTERVAL.
+    """
+    since = datetime.utcnow().date() - timedelta(days=days - 1)
+    rows = db.session.query(ActivityRollup.metric, func.sum(ActivityRollup.count)).filter(
+        ActivityRollup.day >= since
+    ).group_by(ActivityRollup.metric)
+    totals = Counter({metric: int(total) for metric, total in rows})
+    with _pending_lock:
+        for (day, metric), n in _pending.items():
+            if day >= since:
+                totals[metric] += n
+    return dict(totals)
+
+def init_rollups(app):
+    configure_rollups(flush_interval=app.config['ACTIVITY_FLUSH_INTERVAL'])
+    from sqlalchemy import event
+    if not event.contains(db.session, 'after_commit', _merge_committed):
+        event.listen(db.session, 'after_commit', _merge_committed)
+        event.listen(db.session, 'after_soft_rollback', _discard)
+    atexit.register(_flush_at_exit, app)
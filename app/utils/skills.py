@@ -0,0 +1,73 @@
+from flask import current_app
+from app import db
+from app.models import UserSkills, CandidateCV
+from app.utils.embeddings import extract_documents
+from ai_logic.skill_extractor import get_extractor
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from datetime import datetime
+import os
+
+def add_detected_skills(user_id, skills):
+    """
+    Add skills found in a CV to the user's skills with one INSERT in the
+    current transaction, marked source='cv'. Skills the user already has,
+    in any case, are left alone, so hand-entered proficiency and
+    experience are kept; so are skills the user deleted, which stay
+    deleted. Returns the names added.
+    """
+    skills = list(dict.fromkeys(skills))
+    # A second pass covers skills added concurrently, e.g. by hand
+    for _ in range(2):
+        existing = {name.lower() for (name,) in db.session.query(UserSkills.skill_name).filter_by(user_id=user_id)}
+        new = [skill for skill in skills if skill.lower() not in existing]
+        if not new:
+            return []
+        now = datetime.utcnow()
+        rows = [{'user_id': user_id, 'skill_name': skill, 'proficiency_level': None, 'years_experience': 0,
+                 'source': 'cv', 'created_at': now} for skill in new]
+        try:
+            with db.session.begin_nested():
+                db.session.execute(insert(UserSkills), rows)
+            return new
+        except IntegrityError:
+            continue
+    return []
+
+def record_cv_skills(cv, text):
+    """
+    Extract taxonomy skills from a CV's text and add them to its owner.
+    Called by ingestion; does nothing when SKILL_EXTRACTION is off.
+    """
+    if cv.user_id is None or not current_app.config['SKILL_EXTRACTION']:
+        return []
+    return add_detected_skills(cv.user_id, get_extractor().extract(text))
+
+def backfill_cv_skills(batch_size=100):
+    """
+    Run the extractor over every existing CV, batch by batch, with one
+    commit per batch. Text comes through the extraction pool and cache,
+    as in ingestion. Returns (CVs scanned, skills added).
+    """
+    upload_dir = current_app.config['CANDIDATE_UPLOADS']
+    extractor = get_extractor()
+    scanned = added = 0
+    last_id = 0
+    while True:
+        cvs = CandidateCV.query.filter(CandidateCV.id > last_id, CandidateCV.user_id.isnot(None)).order_by(
+            CandidateCV.id).limit(batch_size).all()
+        if not cvs:
+            break
+        last_id = cvs[-1].id
+        present = [cv for cv in cvs if os.path.exists(os.path.join(upload_dir, cv.filename))]
+        texts, _ = extract_documents('cv', present, upload_dir)
+        # One upsert per user, however many CVs they have in the batch
+        by_user = {}
+        for cv in present:
+            if cv.id in texts:
+                by_user.setdefault(cv.user_id, []).extend(extractor.extract(texts[cv.id]))
+                scanned += 1
+        for user_id, skills in by_user.items():
+            added += len(add_detected_skills(user_id, skills))
+        db.session.commit()
+    return scanned, added
@@ -0,0 +1,193 @@
+from flask import current_app
+from app.models import User
+from app.utils.embeddings import DOCUMENT_MODELS, embed_document, delete_embeddings, load_embeddings, stored_vectors
+from ai_logic.vector_index import FlatIndex, create_index, lock_directory, saved_stamp
+from ai_logic.vectorizer import EMBEDDING_DIM, get_model_name
+from collections import defaultdict
+from contextlib import contextmanager
+import threading
+import hashlib
+import logging
+import os
+import re
+
+UPLOAD_FOLDERS = {'cv': 'CANDIDATE_UPLOADS', 'job': 'JOBGIVER_UPLOADS'}
+
+# One index per (side, domain), shared by every request of this process
+_indexes = {}
+_loaded_at = {}
+_lock = threading.Lock()
+
+def _domain_slug(domain):
+    # Readable part plus a hash of the exact value, so domains that read
+    # the same ('C++' and 'C', 'IT/Ops' and 'IT Ops') get their own indexes
+    readable = re.sub(r'[^a-z0-9]+', '-', (domain or 'none').lower()).strip('-') or 'none'
+    return f"{readable}-{hashlib.sha256(repr(domain).encode('utf-8')).hexdigest()[:8]}"
+
+def index_dir(side, domain):
+    return os.path.join(current_app.config['VECTOR_INDEX_FOLDER'], get_model_name(), side, _domain_slug(domain))
+
+def codec_params(domain):
+    """
+    Storage precision and PCA size for a domain's index (VECTOR_INDEX_CODEC).
+    """
+    codecs = current_app.config['VECTOR_INDEX_CODEC']
+    params = dict(codecs.get('default', {}))
+    params.update(codecs.get(domain, {}))
+    return {'precision': params.get('precision', 'float32'), 'pca_dim': params.get('pca_dim')}
+
+def _new_index(domain):
+    kind = current_app.config['VECTOR_INDEX_KIND']
+    params = current_app.config['VECTOR_INDEX_PARAMS'].get(kind, {})
+    return create_index(kind, EMBEDDING_DIM, **params, **codec_params(domain))
+
+def _build_index(side, domain):
+    """
+    Build an index from the embedding store for one domain.
+    """
+    model = DOCUMENT_MODELS[side]
+    # Documents of accounts waiting for deletion stay out
+    docs = model.query.filter_by(domain=domain, status='ready').filter(
+        ~model.user.has(User.locked_at.isnot(None))).all()
+    vectors, kept = load_embeddings(side, docs, current_app.config[UPLOAD_FOLDERS[side]])
+    index = _new_index(domain)
+    if kept:
+        index.add([d.id for d in kept], vectors, [d.filename for d in kept])
+    logging.debug(f"Built {index.kind} index for {side}/{domain} with {len(index)} vectors")
+    return index
+
+def get_index(side, domain, build=True):
+    """
+    Return the index for a side ('cv' or 'job') and domain, mapping it from
+    disk or building it from stored embeddings on first use. A copy saved
+    by another worker since we loaded is picked up automatically.
+    With build=False, returns None instead of building a missing index.
+    """
+    key = (side, domain)
+    directory = index_dir(side, domain)
+    stamp = saved_stamp(directory)
+    with _lock:
+        index = _indexes.get(key)
+        if index is not None and (stamp is None or _loaded_at.get(key) == stamp):
+            return index
+    if stamp is not None:
+        index = FlatIndex.load(directory)
+        # Otherwise storage settings changed since this copy was saved
+        if index is not None and index.codec.params() == codec_params(domain):
+            return _remember(key, index)
+    if not build:
+        return None
+    # Built under the lock, so a document another worker indexes meanwhile
+    # is not overwritten; whoever waited uses the copy just built
+    with lock_directory(directory):
+        index = FlatIndex.load(directory)
+        if index is None or index.codec.params() != codec_params(domain):
+            index = _build_index(side, domain)
+            index.save(directory)
+        return _remember(key, index)
+
+def _remember(key, index):
+    with _lock:
+        _indexes[key] = index
+        _loaded_at[key] = index.stamp
+    return index
+
+@contextmanager
+def _updating(side, domain, build=True):
+    """
+    The latest copy of a domain index, locked against every other writer
+    until the changes made in the block are saved. Yields None when there
+    is no index and build is False.
+    """
+    key = (side, domain)
+    directory = index_dir(side, domain)
+    with lock_directory(directory):
+        index = get_index(side, domain, build=build)
+        try:
+            yield index
+            if index is not None:
+                index.save(directory)
+                _remember(key, index)
+        except Exception:
+            # Changes may be half applied; reload on next use
+            with _lock:
+                _indexes.pop(key, None)
+            raise
+
+def search(side, domain, query_embedding, k=None, min_score=None):
+    """
+    Top-k documents of a domain for a query embedding: [(doc_id, filename, score)].
+    Compact indexes re-rank their shortlist with the stored full-precision vectors.
+    """
+    return get_index(side, domain).search(
+        query_embedding, k=k, min_score=min_score,
+        rerank=lambda ids: stored_vectors(side, ids),
+        rerank_factor=current_app.config['VECTOR_INDEX_RERANK_FACTOR']
+    )
+
+def index_document(side, doc, path, text=None):
+    """
+    Embed a document and add it (and any older row sharing its file) to
+    the domain index. Returns the vector, or None if nothing could be
+    embedded. Embedding errors propagate; index errors are only logged
+    since the index can always be rebuilt from the store.
+    """
+    docs, vector = embed_document(side, doc, path, text=text)
+    by_domain = defaultdict(list)
+    for d in docs:
+        # Rows still waiting for ingestion join the index when they become ready
+        if d.id == doc.id or d.status == 'ready' or vector is None:
+            by_domain[d.domain].append(d)
+    for domain, domain_docs in by_domain.items():
+        try:
+            with _updating(side, domain) as index:
+                if vector is None:
+                    index.remove([d.id for d in domain_docs])
+                else:
+                    index.add([d.id for d in domain_docs], [vector] * len(domain_docs),
+                              [d.filename for d in domain_docs])
+        except Exception as e:
+            logging.error(f"Error updating {side} index for {domain}: {str(e)}")
+    return vector
+
+def unindex_documents(side, docs):
+    """
+    Remove documents from their domain indexes and drop their stored
+    embeddings. The caller commits the database session.
+    """
+    docs = list(docs)
+    by_domain = defaultdict(list)
+    for d in docs:
+        by_domain[d.domain].append(d.id)
+    for domain, ids in by_domain.items():
+        try:
+            # An index that was never built will be built without these documents
+            with _updating(side, domain, build=False) as index:
+                if index is not None:
+                    index.remove(ids)
+        except Exception as e:
+            logging.error(f"Error updating {side} index for {domain}: {str(e)}")
+    delete_embeddings(side, [d.id for d in docs])
+
+def compact_indexes(threshold):
+    """
+    Rewrite every saved index of the current model whose tombstoned rows
+    exceed `threshold` (a fraction of all rows). Returns [(directory, live, dropped)].
+    """
+    root = os.path.join(current_app.config['VECTOR_INDEX_FOLDER'], get_model_name())
+    compacted = []
+    for side in UPLOAD_FOLDERS:
+        side_dir = os.path.join(root, side)
+        if not os.path.isdir(side_dir):
+            continue
+        for slug in sorted(os.listdir(side_dir)):
+            directory = os.path.join(side_dir, slug)
+            with lock_directory(directory):
+                index = FlatIndex.load(directory)
+                if index is None or not index.count or index.tombstones / index.count <= threshold:
+                    continue
+                dropped = index.tombstones
+                index.compact()
+                index.save(directory)
+            compacted.append((directory, len(index), dropped))
+    return compacted
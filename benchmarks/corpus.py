@@ -0,0 +1,101 @@
+import numpy as np
+import logging
+import os
+import re
+from ai_logic.extract_text import read_pdf_text
+from .pdf_writer import write_pdf
+
+# Upload file names end in a domain code: John_cv_it.pdf, Honda-job-it.pdf
+SEED_DOMAINS = {
+    'it': 'Information Technology', 'er': 'Engineering', 'h': 'Healthcare', 'e': 'Education',
+    'f': 'Finance', 'm': 'Marketing', 'mar': 'Marketing', 'd': 'Design', 's': 'Sales',
+    'l': 'Legal', 'o': 'Operations / Management',
+}
+
+SEED_FOLDERS = {'cv': 'cvs', 'job': 'jobs'}
+
+# Share of a synthetic document's lines borrowed from other seeds of its domain
+MIX_RATIO = 0.3
+
+def seed_domain(filename):
+    code = re.split(r'[-_]', os.path.splitext(filename)[0])[-1].lower()
+    return SEED_DOMAINS.get(code)
+
+def load_seeds(upload_dir):
+    """
+    Read the sample uploads. Returns {(kind, domain): [list of lines per document]}.
+    Files without text or a recognizable domain code are skipped.
+    """
+    seeds = {}
+    for kind, folder in SEED_FOLDERS.items():
+        directory = os.path.join(upload_dir, folder)
+        if not os.path.isdir(directory):
+            continue
+        for filename in sorted(os.listdir(directory)):
+            domain = seed_domain(filename)
+            if domain is None or not filename.lower().endswith('.pdf'):
+                continue
+            try:
+                text = read_pdf_text(os.path.join(directory, filename))
+            except ValueError as e:
+                logging.warning(f"Skipping seed {filename}: {str(e)}")
+                continue
+            lines = [line for line in text.splitlines() if line.strip()]
+            if lines:
+                seeds.setdefault((kind, domain), []).append(lines)
+    return seeds
+
+def parse_mix(spec, seeds):
+    """
+    Parse "Domain=weight,Domain=weight" into normalized weights. An empty
+    spec weighs every seeded domain equally.
+    """
+    if spec:
+        weights = {}
+        for part in spec.split(','):
+            domain, _, weight = part.rpartition('=')
+            weights[domain.strip()] = float(weight)
+    else:
+        weights = {domain: 1.0 for _, domain in seeds}
+    total = sum(weights.values())
+    if total <= 0:
+        raise ValueError("Domain mix weights must add up to more than zero")
+    return {domain: weight / total for domain, weight in weights.items()}
+
+def generate(seeds, kind, size, mix, seed=0):
+    """
+    Synthesize `size` documents of a kind as [(name, domain, text)].
+    Each one follows a seed document of its domain, with MIX_RATIO of its
+    lines swapped for lines of other seeds and a small length jitter, so
+    documents stay realistic but are not duplicates.
+    """
+    rng = np.random.default_rng(seed)
+    domains = list(mix)
+    fallback = [doc for (k, _), docs in seeds.items() if k == kind for doc in docs]
+    if not fallback:
+        raise ValueError(f"No {kind} seed documents found")
+    pools = {}
+    for domain in domains:
+        docs = seeds.get((kind, domain)) or fallback
+        pools[domain] = (docs, [line for doc in docs for line in doc])
+
+    picks = rng.choice(len(domains), size=size, p=[mix[d] for d in domains])
+    corpus = []
+    for i, pick in enumerate(picks):
+        domain = domains[pick]
+        docs, lines = pools[domain]
+        base = docs[rng.integers(len(docs))]
+        length = max(1, int(len(base) * rng.uniform(0.7, 1.3)))
+        out = [base[j % len(base)] for j in range(length)]
+        for j in np.flatnonzero(rng.random(length) < MIX_RATIO):
+            out[j] = lines[rng.integers(len(lines))]
+        out.append(f"Reference: {kind.upper()}-{i:06d}")
+        corpus.append((f"{kind}-{i:06d}.pdf", domain, "\n".join(out)))
+    return corpus
+
+def write_pdfs(corpus, directory):
+    """
+    Write documents as PDFs; returns their paths.
+    """
+    os.makedirs(directory, exist_ok=True)
+    return [write_pdf(os.path.join(directory, name), text) for name, _, text in corpus]
@@ -0,0 +1,172 @@
+"""
+Benchmark the matching pipeline on synthetic corpora.
+
+    python -m benchmarks.run --sizes 1000 10000 100000 --stub-embedder --output bench.json
+
+Each stage is timed on its own: PDF parsing (on a sample of generated
+PDFs), keyword extraction, embedding, brute-force matching and vector
+index build/search. Results are printed as a table and written as JSON,
+so runs on different commits can be compared.
+"""
+import argparse
+import json
+import logging
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import os
+import numpy as np
+from ai_logic.extract_text import read_pdf_text, extract_cv_text, extract_job_text
+from ai_logic.matcher import match_embeddings, as_matrix
+from ai_logic.vector_index import create_index
+from ai_logic.vectorizer import EMBEDDING_DIM, get_embeddings, get_model_name
+from .corpus import load_seeds, parse_mix, generate, write_pdfs
+from .stub_embedder import stub_embeddings
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def peak_rss_mb():
+    """Peak resident memory of the whole process so far."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+class Stage:
+    """
+    Collects per-item latencies of one stage. items counts the documents
+    covered, which differs from the number of timings for batched stages.
+    Memory is reported as the process peak after the stage and how much
+    the stage raised it; a stage that stays under an earlier peak shows 0.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.latencies = []
+        self.items = 0
+        self.total = 0.0
+        self.peak_before = self.peak_after = peak_rss_mb()
+
+    def time(self, func, *args, items=1, **kwargs):
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        elapsed = time.perf_counter() - start
+        self.latencies.append(elapsed)
+        self.items += items
+        self.total += elapsed
+        self.peak_after = peak_rss_mb()
+        return result
+
+    def report(self):
+        latencies = np.asarray(self.latencies) * 1000
+        return {
+            'calls': len(self.latencies),
+            'items': self.items,
+            'total_s': round(self.total, 4),
+            'throughput_per_s': round(self.items / self.total, 2) if self.total else None,
+            'p50_ms': round(float(np.percentile(latencies, 50)), 4) if len(latencies) else None,
+            'p95_ms': round(float(np.percentile(latencies, 95)), 4) if len(latencies) else None,
+            'process_peak_rss_mb': round(self.peak_after, 1),
+            'peak_rss_growth_mb': round(self.peak_after - self.peak_before, 1),
+        }
+
+def run_size(args, seeds, mix, size, workdir):
+    cvs = generate(seeds, 'cv', size, mix, seed=args.seed)
+    jobs = generate(seeds, 'job', args.queries, mix, seed=args.seed + 1)
+    stages = {}
+
+    stage = stages['pdf_parse'] = Stage('pdf_parse')
+    sample = cvs[:args.pdf_sample]
+    for path in write_pdfs(sample, os.path.join(workdir, f'pdf-{size}')):
+        stage.time(read_pdf_text, path)
+
+    stage = stages['extract'] = Stage('extract')
+    cv_texts = [stage.time(extract_cv_text, text) for _, _, text in cvs]
+    job_texts = [stage.time(extract_job_text, text) for _, _, text in jobs]
+
+    embed = stub_embeddings if args.stub_embedder else get_embeddings
+    stage = stages['embed'] = Stage('embed')
+    batches = []
+    for start in range(0, len(cv_texts), args.batch_size):
+        batch = cv_texts[start:start + args.batch_size]
+        batches.append(stage.time(embed, batch, items=len(batch)))
+    cv_matrix = as_matrix(np.vstack(batches))
+    job_vectors = stage.time(embed, job_texts, items=len(job_texts))
+
+    names = [name for name, _, _ in cvs]
+    stage = stages['match'] = Stage('match')
+    for query in job_vectors:
+        stage.time(match_embeddings, query, cv_matrix, names, k=args.k)
+
+    params = {'precision': args.precision, 'pca_dim': args.pca_dim}
+    index = create_index(args.index_kind, EMBEDDING_DIM, **params)
+    stage = stages['index_build'] = Stage('index_build')
+    stage.time(index.add, np.arange(size), cv_matrix, names, items=size)
+    stage = stages['index_search'] = Stage('index_search')
+    for query in job_vectors:
+        stage.time(index.search, query, k=args.k)
+
+    return {'size': size, 'queries': len(jobs), 'stages': {name: s.report() for name, s in stages.items()}}
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=REPO_ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def print_table(results, out):
+    for run in results['runs']:
+        print(f"size={run['size']} queries={run['queries']}", file=out)
+        for name, s in run['stages'].items():
+            print(f"  {name:13} {s['items']:8d} items  {s['throughput_per_s'] or 0:12.1f}/s  "
+                  f"p50={s['p50_ms'] or 0:9.3f}ms  p95={s['p95_ms'] or 0:9.3f}ms  "
+                  f"process peak rss={s['process_peak_rss_mb']}MB (+{s['peak_rss_growth_mb']}MB)", file=out)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the ai_logic matching pipeline.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--mix', default='', help='Domain weights, e.g. "Information Technology=2,Healthcare=1".')
+    parser.add_argument('--queries', type=int, default=100, help='Job descriptions matched per corpus.')
+    parser.add_argument('--pdf-sample', type=int, default=200, help='Generated PDFs parsed per corpus.')
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('-k', type=int, default=100)
+    parser.add_argument('--index-kind', default='flat', choices=['flat', 'ivf'])
+    parser.add_argument('--precision', default='float32', choices=['float32', 'float16', 'int8'])
+    parser.add_argument('--pca-dim', type=int, default=None)
+    parser.add_argument('--stub-embedder', action='store_true', help='Hashing embedder instead of the model.')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--uploads', default=os.path.join(REPO_ROOT, 'uploads'))
+    parser.add_argument('--output', help='Write JSON results here (default: stdout).')
+    args = parser.parse_args(argv)
+
+    # ai_logic logs every embedding at DEBUG level
+    logging.getLogger().setLevel(logging.WARNING)
+
+    seeds = load_seeds(args.uploads)
+    mix = parse_mix(args.mix, seeds)
+    results = {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'embedder': 'stub' if args.stub_embedder else get_model_name(),
+        'config': {k: v for k, v in vars(args).items() if k not in ('output', 'uploads')},
+        'mix': mix,
+        'runs': [],
+    }
+    with tempfile.TemporaryDirectory() as workdir:
+        for size in args.sizes:
+            results['runs'].append(run_size(args, seeds, mix, size, workdir))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print_table(results, sys.stdout)
+    else:
+        print_table(results, sys.stderr)
+        json.dump(results, sys.stdout, indent=2)
+
+if __name__ == '__main__':
+    main()
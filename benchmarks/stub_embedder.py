@@ -0,0 +1,32 @@
+import numpy as np
+import re
+import zlib
+from ai_logic.vectorizer import EMBEDDING_DIM
+
+_TOKEN = re.compile(r'[a-z0-9]+')
+_buckets = {}
+
+def _bucket(token):
+    bucket = _buckets.get(token)
+    if bucket is None:
+        h = zlib.crc32(token.encode('utf-8'))
+        bucket = _buckets[token] = (h % EMBEDDING_DIM, 1.0 if h & 0x80000000 else -1.0)
+    return bucket
+
+def stub_embedding(text):
+    """
+    Deterministic bag-of-words hashing embedding with the model's shape.
+    Documents sharing vocabulary score higher, which keeps ranking work
+    realistic without loading the model.
+    """
+    vector = np.zeros(EMBEDDING_DIM, dtype=np.float32)
+    tokens = _TOKEN.findall(text.lower())
+    if tokens:
+        index, sign = zip(*(_bucket(t) for t in tokens))
+        np.add.at(vector, np.asarray(index), np.asarray(sign, dtype=np.float32))
+    return vector
+
+def stub_embeddings(texts, batch_size=None):
+    return np.vstack([stub_embedding(t) for t in texts]) if texts else np.zeros((0, EMBEDDING_DIM), dtype=np.float32)
+
+stub_embedding.batch = stub_embeddings
@@ -1,30 +1,43 @@
 from flask import Blueprint, render_template, request, flash, redirect, url_for, current_app, session, jsonify
 from app import db
-from app.models import User, UserSkills, CareerPath
+from app.models import User, UserSkills
+from app.utils.loaders import current_user
+from app.utils.career_catalog import get_catalog, parse_required_skills
+from ai_logic.skill_index import SkillIndex
+from sqlalchemy import func
 import os
 import logging
-import json
 
 career_bp = Blueprint('career', __name__, url_prefix='/career')
 
 class CareerPathPredictor:
     def __init__(self):
         self.career_paths = []
+        self.skill_index = None
     
-    def load_career_paths(self, career_paths_data):
-        """Load career paths data"""
+    def load_career_paths(self, career_paths_data, skill_index=None):
+        """Load career paths data, with a SkillIndex over the same list if one is prebuilt"""
         self.career_paths = career_paths_data
+        self.skill_index = skill_index
     
     def predict_career_paths(self, user_skills, target_domain=None):
         """Predict suitable career paths based on skills"""
-        recommendations = []
+        if self.skill_index is None:
+            self.skill_index = SkillIndex([parse_required_skills(c.get('required_skills')) for c in self.career_paths])
+        index = self.skill_index
+        
+        # Every career is scored from one pass over the user's skills
+        matched = index.matched_terms(skill['name'] for skill in user_skills)
+        counts = index.match_counts(matched)
         
-        for career in self.career_paths:
+        recommendations = []
+        for position, career in enumerate(self.career_paths):
             if target_domain and target_domain != '-- All Domains --' and career['domain'] != target_domain:
                 continue
             
-            # Calculate match score
-            match_score, matching_skills, missing_skills = self.calculate_match_score(user_skills, career)
+            match_score, matching_skills, missing_skills = self.score_career(
+                career, index.career_terms[position], matched, int(counts[position])
+            )
             
             # Always show results, even with low match
             recommendations.append({
@@ -41,46 +54,24 @@ class CareerPathPredictor:
 
     def calculate_match_score(self, user_skills, career):
         """Calculate how well user skills match career requirements"""
-        # Parse required_skills from JSON string to list
-        required_skills = []
-        if career.get('required_skills'):
-            if isinstance(career['required_skills'], str):
-                try:
-                    required_skills = json.loads(career['required_skills'])
-                except:
-                    # If JSON parsing fails, treat as comma-separated
-                    required_skills = [s.strip() for s in career['required_skills'].split(',')]
-            else:
-                required_skills = career['required_skills']
-        
-        # Get user skill names (lowercase for comparison)
-        user_skill_names = [skill['name'].lower() for skill in user_skills]
-        
-        matched_skills = 0
-        matching_skills_list = []
-        missing_skills_list = []
-        
-        for req_skill in required_skills:
-            req_skill_lower = req_skill.lower()
-            found = False
-            
-            # Check if any user skill matches the required skill
-            for user_skill in user_skill_names:
-                if req_skill_lower in user_skill or user_skill in req_skill_lower:
-                    matched_skills += 1
-                    matching_skills_list.append(req_skill)
-                    found = True
-                    break
-            
-            if not found:
-                missing_skills_list.append(req_skill)
-        
-        # Calculate match percentage
-        if required_skills:
-            match_score = int((matched_skills / len(required_skills)) * 100)
-        else:
-            match_score = 50  # Default score if no requirements
+        index = SkillIndex([parse_required_skills(career.get('required_skills'))])
+        matched = index.matched_terms(skill['name'] for skill in user_skills)
+        return self.score_career(career, index.career_terms[0], matched, int(index.match_counts(matched)[0]))
+    
+    def score_career(self, career, term_ids, matched, matched_count):
+        """Score one career from its required-skill term ids and the user's matched terms"""
+        # A required skill matches when it and a user skill contain one another
+        required_skills = parse_required_skills(career.get('required_skills'))
+        if not required_skills:
+            return 50, [], []  # Default score if no requirements
+        if matched_count == 0:
+            return 0, [], list(required_skills)
+        if matched_count == len(required_skills):
+            return 100, list(required_skills), []
         
+        matching_skills_list = [s for s, t in zip(required_skills, term_ids) if t in matched]
+        missing_skills_list = [s for s, t in zip(required_skills, term_ids) if t not in matched]
+        match_score = int((matched_count / len(required_skills)) * 100)
         return match_score, matching_skills_list, missing_skills_list
     
     def get_suitability_level(self, match_score):
@@ -100,12 +91,11 @@ def career_predictor():
         flash('Please login to use career predictor', 'error')
         return redirect(url_for('auth.login'))  # Changed from 'login' to 'auth.login'
     
-    user = User.query.filter_by(username=session['username']).first()
-    user_skills = UserSkills.query.filter_by(user_id=user.id).all()
+    user = current_user()
+    user_skills = UserSkills.query.filter_by(user_id=user.id, suppressed=False).all()
     
     # Get all available domains from career paths
-    career_domains = db.session.query(CareerPath.domain).distinct().all()
-    user_domains = [domain[0] for domain in career_domains]
+    user_domains = get_catalog().domains
     
     return render_template('career/predictor.html', 
                          user_skills=user_skills, 
@@ -116,49 +106,32 @@ def analyze_career():
     if 'username' not in session:
         return jsonify({'error': 'Please login first'}), 401
     
-    user = User.query.filter_by(username=session['username']).first()
+    user = current_user()
     data = request.get_json()
     selected_domain = data.get('domain')
     
-    # Get user's manually added skills
-    manual_skills = UserSkills.query.filter_by(user_id=user.id).all()
+    # Get user's skills, added by hand or found in their CVs
+    user_skills = UserSkills.query.filter_by(user_id=user.id, suppressed=False).all()
     all_skills = []
     
-    # Add manual skills
-    for skill in manual_skills:
+    for skill in user_skills:
         all_skills.append({
             'name': skill.skill_name,
-            'type': 'manual',
+            'type': skill.source,
             'proficiency': skill.proficiency_level,
             'domain': 'General'
         })
     
-    # Get career paths for the selected domain
-    if selected_domain and selected_domain != '-- All Domains --':
-        career_paths = CareerPath.query.filter_by(domain=selected_domain).all()
-    else:
-        career_paths = CareerPath.query.all()
-    
-    # Convert career paths to dictionary format
-    career_paths_data = []
-    for path in career_paths:
-        career_paths_data.append({
-            'id': path.id,
-            'title': path.title,
-            'description': path.description,
-            'required_skills': path.required_skills,
-            'average_salary_min': path.average_salary_min,
-            'average_salary_max': path.average_salary_max,
-            'growth_outlook': path.growth_outlook,
-            'experience_level': path.experience_level,
-            'domain': path.domain
-        })
+    # Career paths for the selected domain, from the process-wide catalog
+    catalog = get_catalog()
     
     # Get predictions
     predictor = CareerPathPredictor()
-    predictor.load_career_paths(career_paths_data)
+    predictor.load_career_paths(catalog.careers(selected_domain), catalog.skill_index(selected_domain))
     
     # Calculate average experience from manual skills - FIXED
+    # (skills found in CVs carry no experience)
+    manual_skills = [skill for skill in user_skills if skill.source == 'manual']
     total_experience = 0
     if manual_skills:
         total_experience = sum([skill.years_experience for skill in manual_skills]) / len(manual_skills)
@@ -180,22 +153,25 @@ def manage_skills():
     if 'username' not in session:
         return redirect(url_for('auth.login'))  # Changed from 'login' to 'auth.login'
     
-    user = User.query.filter_by(username=session['username']).first()
+    user = current_user()
     
     if request.method == 'POST':
         skill_name = request.form.get('skill_name')
         proficiency = request.form.get('proficiency_level')
         years_exp = request.form.get('years_experience', 0)
         
-        # Check if skill already exists
-        existing_skill = UserSkills.query.filter_by(
-            user_id=user.id, 
-            skill_name=skill_name
+        # Check if skill already exists, deleted ones included
+        existing_skill = UserSkills.query.filter(
+            UserSkills.user_id == user.id,
+            func.lower(UserSkills.skill_name) == (skill_name or '').lower()
         ).first()
         
         if existing_skill:
             existing_skill.proficiency_level = proficiency
             existing_skill.years_experience = years_exp
+            # Confirmed by hand, even if first found in a CV
+            existing_skill.source = 'manual'
+            existing_skill.suppressed = False
             flash('Skill updated successfully!', 'success')
         else:
             new_skill = UserSkills(
@@ -210,7 +186,7 @@ def manage_skills():
         db.session.commit()
         return redirect(url_for('career.manage_skills'))
     
-    user_skills = UserSkills.query.filter_by(user_id=user.id).all()
+    user_skills = UserSkills.query.filter_by(user_id=user.id, suppressed=False).all()
     return render_template('career/skills.html', skills=user_skills)
 
 @career_bp.route('/career-predictor/skills/delete/<int:skill_id>')
@@ -218,14 +194,15 @@ def delete_skill(skill_id):
     if 'username' not in session:
         return redirect(url_for('auth.login'))  # Changed from 'login' to 'auth.login'
     
-    user = User.query.filter_by(username=session['username']).first()
+    user = current_user()
     skill = UserSkills.query.get_or_404(skill_id)
     
     if skill.user_id != user.id:
         flash('Unauthorized action', 'error')
         return redirect(url_for('career.manage_skills'))
     
-    db.session.delete(skill)
+    # Kept as suppressed, so CV extraction does not add it back
+    skill.suppressed = True
     db.session.commit()
     flash('Skill deleted successfully', 'success')
     return redirect(url_for('career.manage_skills'))
@@ -235,20 +212,18 @@ def get_domains():
     if 'username' not in session:
         return jsonify({'error': 'Please login first'}), 401
         
-    domains = db.session.query(CareerPath.domain).distinct().all()
-    domain_list = [domain[0] for domain in domains]
-    return jsonify({'domains': domain_list})
+    return jsonify({'domains': get_catalog().domains})
 
 @career_bp.route('/career-predictor/skills/clear', methods=['POST'])
 def clear_all_skills():
     if 'username' not in session:
         return jsonify({'error': 'Please login first'}), 401
     
-    user = User.query.filter_by(username=session['username']).first()
+    user = current_user()
     
     try:
-        # Delete all user skills
-        UserSkills.query.filter_by(user_id=user.id).delete()
+        # Delete all user skills; suppressed, as in delete_skill
+        UserSkills.query.filter_by(user_id=user.id).update({'suppressed': True})
         db.session.commit()
         return jsonify({'success': True, 'message': 'All skills cleared successfully'})
     except Exception as e:
@@ -290,6 +290,16 @@ CREATE TABLE IF NOT EXISTS career_paths (
     domain VARCHAR(100)
 );
 
+-- Bumped whenever a cached catalog (career_paths) changes, so every
+-- process reloads its copy
+CREATE TABLE IF NOT EXISTS catalog_versions (
+    name VARCHAR(50) PRIMARY KEY,
+    version INT NOT NULL DEFAULT 0,
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+
+INSERT IGNORE INTO catalog_versions (name, version) VALUES ('career_paths', 1);
+
 CREATE TABLE IF NOT EXISTS user_skills (
     id INT AUTO_INCREMENT PRIMARY KEY,
     user_id INT NOT NULL,
@@ -352,4 +362,81 @@ INSERT INTO career_paths (title, description, required_skills, average_salary_mi
 -- Operations / Management Domain
 ('Operations Manager', 'Oversee daily business operations and efficiency', '["Process Improvement", "Team Management", "Budgeting", "Strategic Planning", "Supply Chain"]', 65000, 120000, 'High', 'Mid', 'Operations / Management'),
 ('Project Manager', 'Plan and execute projects to achieve business goals', '["Project Planning", "Risk Management", "Stakeholder Management", "Agile Methodology", "Leadership"]', 70000, 130000, 'High', 'Mid', 'Operations / Management'),
-('Business Analyst', 'Analyze business processes and recommend improvements', '["Requirements Gathering", "Data Analysis", "Process Mapping", "Stakeholder Communication", "Problem Solving"]', 60000, 105000, 'High', 'Mid', 'Operations / Management');
\ No newline at end of file
+('Business Analyst', 'Analyze business processes and recommend improvements', '["Requirements Gathering", "Data Analysis", "Process Mapping", "Stakeholder Communication", "Problem Solving"]', 60000, 105000, 'High', 'Mid', 'Operations / Management');
+
+-- Stored document embeddings (filled on upload, read by matching)
+CREATE TABLE IF NOT EXISTS document_embeddings (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    doc_type ENUM('cv', 'job') NOT NULL,
+    doc_id INT NOT NULL,
+    model_name VARCHAR(100) NOT NULL,
+    content_hash CHAR(64) NOT NULL,
+    dim INT NOT NULL,
+    vector BLOB NOT NULL,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE KEY unique_document_embedding (doc_type, doc_id, model_name)
+);
+
+-- Background ingestion state (pending -> processing -> ready / failed)
+ALTER TABLE candidate_cvs
+ADD COLUMN IF NOT EXISTS status ENUM('pending', 'processing', 'ready', 'failed') NOT NULL DEFAULT 'pending',
+ADD COLUMN IF NOT EXISTS ingest_attempts INT NOT NULL DEFAULT 0,
+ADD COLUMN IF NOT EXISTS ingest_error TEXT NULL,
+ADD COLUMN IF NOT EXISTS next_attempt_at DATETIME NULL;
+
+ALTER TABLE job_requirements
+ADD COLUMN IF NOT EXISTS status ENUM('pending', 'processing', 'ready', 'failed') NOT NULL DEFAULT 'pending',
+ADD COLUMN IF NOT EXISTS ingest_attempts INT NOT NULL DEFAULT 0,
+ADD COLUMN IF NOT EXISTS ingest_error TEXT NULL,
+ADD COLUMN IF NOT EXISTS next_attempt_at DATETIME NULL;
+
+-- Versioned migrations applied by `flask db-migrate` (indexes for the hot
+-- query paths, unique usernames and skills). Run it after this file;
+-- `flask db-migrate --dry-run` shows the SQL and query plans first.
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    version INT PRIMARY KEY,
+    name VARCHAR(200) NOT NULL,
+    applied_at DATETIME NOT NULL
+);
+
+-- Materialized per-user counts, kept in step by the write paths;
+-- `flask counters-reconcile` repairs drift
+CREATE TABLE IF NOT EXISTS user_counters (
+    user_id INT PRIMARY KEY,
+    unread_messages INT NOT NULL DEFAULT 0,
+    saved_jobs INT NOT NULL DEFAULT 0,
+    shortlisted_cvs INT NOT NULL DEFAULT 0,
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+);
+
+-- Per-day activity counts (match requests, applications, invites) for
+-- the admin dashboard
+CREATE TABLE IF NOT EXISTS activity_rollups (
+    day DATE NOT NULL,
+    metric VARCHAR(50) NOT NULL,
+    count INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, metric)
+);
+
+-- Background deletion of users, one row per admin request
+CREATE TABLE IF NOT EXISTS deletion_jobs (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    user_id INT NOT NULL,
+    username VARCHAR(100) NOT NULL,
+    role VARCHAR(20),
+    requested_by INT,
+    status VARCHAR(20) NOT NULL DEFAULT 'pending',
+    stage VARCHAR(30),
+    rows_total INT,
+    rows_deleted INT NOT NULL DEFAULT 0,
+    files_removed INT NOT NULL DEFAULT 0,
+    attempts INT NOT NULL DEFAULT 0,
+    error TEXT,
+    next_attempt_at DATETIME,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    finished_at DATETIME,
+    INDEX idx_deletion_jobs_claim (status, next_attempt_at),
+    INDEX idx_deletion_jobs_user (user_id)
+);